@@ -0,0 +1,131 @@
+"""
+Load-adaptive inference tiers.
+
+A tier is a (model, input size) pair, ordered from the most accurate to the
+cheapest, e.g. ``yolov8s@640 → yolov8s@480 → yolov8n@416``. Under a traffic
+spike the policy moves one tier down whenever the admission queue or the
+recent end-to-end latency crosses its high threshold, so requests get
+cheaper instead of timing out; it moves back up only after both signals
+stayed below their low thresholds for ``hold_seconds`` (hysteresis, so the
+tier does not flap around a threshold).
+
+Latency is an EWMA of queue wait + service time as recorded by the caller.
+"""
+import time
+from typing import Any, Dict, List, Optional
+
+
+class Tier:
+    def __init__(self, name: str, model_path: str, imgsz: int):
+        self.name = name
+        self.model_path = model_path
+        self.imgsz = imgsz
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"name": self.name, "model": self.model_path, "imgsz": self.imgsz}
+
+
+def parse_tiers(spec: str, default_model: str) -> List[Tier]:
+    """
+    Parse ``name=path@imgsz,...`` (most accurate first). ``path`` may be
+    empty for the default model: ``full=@640,small=@480,nano=models/yolov8n.pt@416``.
+    """
+    tiers = []
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        try:
+            name, rest = item.split("=", 1)
+            path, imgsz = rest.rsplit("@", 1)
+            tier = Tier(name.strip(), path.strip() or default_model, int(imgsz))
+        except ValueError:
+            raise ValueError(f"Invalid tier '{item}' (expected name=path@imgsz)") from None
+        if not tier.name or tier.imgsz <= 0:
+            raise ValueError(f"Invalid tier '{item}' (expected name=path@imgsz)")
+        tiers.append(tier)
+    if not tiers:
+        raise ValueError("No inference tiers configured")
+    return tiers
+
+
+class AdaptivePolicy:
+    def __init__(self, tiers: List[Tier], queue_high: int, queue_low: int = 0,
+                 latency_high: float = 2.0, latency_low: float = 0.8, hold_seconds: float = 10.0,
+                 step_seconds: float = 1.0, ewma_alpha: float = 0.2, enabled: bool = True):
+        self.tiers = list(tiers)
+        self.queue_high = max(1, queue_high)
+        self.queue_low = max(0, queue_low)
+        self.latency_high = latency_high
+        self.latency_low = latency_low
+        self.hold_seconds = hold_seconds
+        self.step_seconds = step_seconds
+        self.ewma_alpha = ewma_alpha
+        self.enabled = enabled and len(self.tiers) > 1
+        self.level = 0
+        self.latency = 0.0
+        self.switches = 0
+        self.served: Dict[str, int] = {}
+        self._changed_at = float("-inf")
+        self._calm_since: Optional[float] = None
+
+    def tier(self, name: str) -> Optional[Tier]:
+        for tier in self.tiers:
+            if tier.name == name:
+                return tier
+        return None
+
+    def drop_tier(self, name: str) -> None:
+        """Remove a tier that cannot be served (e.g. its model failed to load)."""
+        if len(self.tiers) > 1:
+            self.tiers = [t for t in self.tiers if t.name != name]
+            self.level = min(self.level, len(self.tiers) - 1)
+            self.enabled = self.enabled and len(self.tiers) > 1
+
+    def record(self, latency_seconds: float) -> None:
+        """End-to-end latency (queue wait + service) of a finished request."""
+        if self.latency == 0.0:
+            self.latency = latency_seconds
+        else:
+            self.latency += self.ewma_alpha * (latency_seconds - self.latency)
+
+    def select(self, queue_depth: int, now: Optional[float] = None) -> Tier:
+        """Current tier after applying the thresholds to ``queue_depth`` and the latency EWMA."""
+        if not self.enabled:
+            return self.tiers[0]
+        now = time.monotonic() if now is None else now
+        overloaded = queue_depth >= self.queue_high or (self.latency_high > 0 and self.latency >= self.latency_high)
+        calm = queue_depth <= self.queue_low and self.latency <= self.latency_low
+        if overloaded:
+            self._calm_since = None
+            if self.level < len(self.tiers) - 1 and now - self._changed_at >= self.step_seconds:
+                self._move(self.level + 1, now)
+        elif calm and self.level > 0:
+            if self._calm_since is None:
+                self._calm_since = now
+            elif now - self._calm_since >= self.hold_seconds and now - self._changed_at >= self.hold_seconds:
+                self._move(self.level - 1, now)
+                self._calm_since = now
+        else:
+            self._calm_since = None
+        return self.tiers[self.level]
+
+    def _move(self, level: int, now: float) -> None:
+        self.level = level
+        self._changed_at = now
+        self.switches += 1
+        # The EWMA describes the old tier; restart it from the next samples
+        self.latency = 0.0
+
+    def count(self, tier: Tier) -> None:
+        self.served[tier.name] = self.served.get(tier.name, 0) + 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "current": self.tiers[self.level].name,
+            "tiers": [t.as_dict() for t in self.tiers],
+            "latency_ewma": round(self.latency, 3),
+            "switches": self.switches,
+            "served": dict(self.served),
+        }
@@ -0,0 +1,141 @@
+"""
+Admission control for the inference pipeline.
+
+Replaces an unbounded semaphore: at most ``max_concurrent`` requests run and
+at most ``max_queue`` wait, in FIFO order. A request arriving at a full queue
+is rejected immediately with a ``Retry-After`` estimate derived from an EWMA
+of recent service times, instead of waiting until a proxy times it out.
+
+Requests may carry a deadline. A queued request whose deadline can no longer
+be met (now + expected service time > deadline) is dropped before it uses
+any CPU, both when it arrives and when it reaches the head of the queue.
+"""
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict, Optional
+
+
+class AdmissionRejected(Exception):
+    """The queue is full; retry after ``retry_after`` seconds."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Server busy, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class DeadlineExceeded(Exception):
+    """The request cannot finish before its deadline."""
+
+    def __init__(self, retry_after: int):
+        super().__init__("Request deadline cannot be met")
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    def __init__(self, max_concurrent: int, max_queue: int, ewma_alpha: float = 0.2,
+                 initial_service_seconds: float = 0.0):
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queue = max(0, max_queue)
+        self.ewma_alpha = ewma_alpha
+        self.service_seconds = initial_service_seconds
+        self.active = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self.admitted = 0
+        self.rejected = 0
+        self.expired = 0
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def estimated_wait(self, position: Optional[int] = None) -> float:
+        """Seconds until a request at queue ``position`` (default: the end) starts."""
+        if position is None:
+            position = self.queued
+        if self.active < self.max_concurrent and position == 0:
+            return 0.0
+        return (position // self.max_concurrent + 1) * self.service_seconds
+
+    def retry_after(self) -> int:
+        return max(1, math.ceil(self.estimated_wait()))
+
+    def _misses_deadline(self, deadline: Optional[float], wait: float) -> bool:
+        return deadline is not None and time.monotonic() + wait + self.service_seconds > deadline
+
+    async def acquire(self, deadline: Optional[float] = None) -> None:
+        """
+        Take a slot, queueing if needed. ``deadline`` is a ``time.monotonic()``
+        value. Raises AdmissionRejected or DeadlineExceeded.
+        """
+        if self._misses_deadline(deadline, self.estimated_wait()):
+            self.expired += 1
+            raise DeadlineExceeded(self.retry_after())
+        if self.active < self.max_concurrent and not self._waiters:
+            self.active += 1
+            self.admitted += 1
+            return
+        if self.queued >= self.max_queue:
+            self.rejected += 1
+            raise AdmissionRejected(self.retry_after())
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            if deadline is None:
+                await waiter
+            else:
+                # Give up once even an immediate start would be too late
+                await asyncio.wait_for(asyncio.shield(waiter),
+                                       max(0.0, deadline - self.service_seconds - time.monotonic()))
+        except (asyncio.CancelledError, asyncio.TimeoutError) as e:
+            if waiter.done() and not waiter.cancelled():
+                self.release()  # the slot was handed over just as we gave up
+            else:
+                waiter.cancel()
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+            if isinstance(e, asyncio.TimeoutError):
+                self.expired += 1
+                raise DeadlineExceeded(self.retry_after()) from None
+            raise
+        if self._misses_deadline(deadline, 0.0):
+            self.release()
+            self.expired += 1
+            raise DeadlineExceeded(self.retry_after())
+        self.admitted += 1
+
+    def release(self, service_seconds: Optional[float] = None) -> None:
+        """Free a slot; ``service_seconds`` updates the service-time estimate."""
+        if service_seconds is not None:
+            self.service_seconds += self.ewma_alpha * (service_seconds - self.service_seconds)
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)  # hand the slot over; `active` is unchanged
+                return
+        self.active -= 1
+
+    @asynccontextmanager
+    async def slot(self, deadline: Optional[float] = None) -> AsyncIterator[None]:
+        await self.acquire(deadline)
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(time.monotonic() - start)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "active": self.active,
+            "queued": self.queued,
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "expired": self.expired,
+            "service_seconds_ewma": round(self.service_seconds, 3),
+            "retry_after": self.retry_after(),
+        }
@@ -0,0 +1,96 @@
+"""
+Lazy iteration over the images of a multi-file or archive upload.
+
+Uploaded files are already spooled to disk by the multipart parser, so the
+generators below keep at most one image's bytes in memory at a time. An
+image larger than ``max_bytes`` -- by its header or once decompressed -- is
+yielded as ``(name, MemberTooLarge)`` in place of its bytes, and iteration
+continues with the next one; a member is never read past that limit.
+"""
+import tarfile
+import zipfile
+from pathlib import PurePosixPath
+from typing import IO, Iterable, Iterator, Optional, Tuple, Union
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp", ".webp", ".tif", ".tiff"}
+TAR_SUFFIXES = (".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tar.xz")
+
+
+class MemberTooLarge(ValueError):
+    pass
+
+
+# (name, raw bytes) -- or the reason an oversized image was skipped
+Entry = Tuple[str, Union[bytes, MemberTooLarge]]
+
+
+def is_image_name(name: str) -> bool:
+    return PurePosixPath(name).suffix.lower() in IMAGE_EXTENSIONS
+
+
+def _read_capped(name: str, f: IO[bytes], declared: int,
+                 max_bytes: Optional[int]) -> Union[bytes, MemberTooLarge]:
+    """Read ``f`` whole, refusing more than ``max_bytes`` (declared or actual; None/0 = no limit)."""
+    if not max_bytes:
+        return f.read()
+    if declared > max_bytes:
+        return MemberTooLarge(f"{name} is {declared} bytes (max {max_bytes})")
+    data = f.read(max_bytes + 1)
+    if len(data) > max_bytes:
+        return MemberTooLarge(f"{name} is larger than {max_bytes} bytes")
+    return data
+
+
+def _iter_zip(fileobj: IO[bytes], max_bytes: Optional[int] = None) -> Iterator[Entry]:
+    with zipfile.ZipFile(fileobj) as zf:
+        for info in zf.infolist():
+            if info.is_dir() or not is_image_name(info.filename):
+                continue
+            with zf.open(info) as member:
+                yield info.filename, _read_capped(info.filename, member, info.file_size, max_bytes)
+
+
+def _iter_tar(fileobj: IO[bytes], max_bytes: Optional[int] = None) -> Iterator[Entry]:
+    # "r|*" reads the archive as a forward-only stream (any compression)
+    with tarfile.open(fileobj=fileobj, mode="r|*") as tf:
+        for member in tf:
+            if not member.isfile() or not is_image_name(member.name):
+                continue
+            extracted = tf.extractfile(member)
+            if extracted is not None:
+                yield member.name, _read_capped(member.name, extracted, member.size, max_bytes)
+
+
+def archive_kind(filename: str, fileobj: IO[bytes]) -> str:
+    """Return "zip", "tar" or "" for a plain (non-archive) upload."""
+    lower = (filename or "").lower()
+    if lower.endswith(TAR_SUFFIXES):
+        return "tar"
+    if lower.endswith(".zip"):
+        return "zip"
+    if not is_image_name(lower) and zipfile.is_zipfile(fileobj):
+        fileobj.seek(0)
+        return "zip"
+    fileobj.seek(0)
+    return ""
+
+
+def iter_uploaded_images(uploads: Iterable[Tuple[str, IO[bytes]]],
+                         max_bytes: Optional[int] = None) -> Iterator[Entry]:
+    """
+    Yield ``(name, raw_bytes)`` for every image in ``uploads``.
+
+    Each upload is either a single image or a zip/tar archive whose image
+    members are yielded in archive order. ``max_bytes`` caps each image
+    (None or 0 = no limit); a larger one yields ``(name, MemberTooLarge)``.
+    """
+    for filename, fileobj in uploads:
+        fileobj.seek(0)
+        kind = archive_kind(filename, fileobj)
+        if kind == "zip":
+            yield from _iter_zip(fileobj, max_bytes)
+        elif kind == "tar":
+            yield from _iter_tar(fileobj, max_bytes)
+        else:
+            name = filename or "uploaded_image.jpg"
+            yield name, _read_capped(name, fileobj, 0, max_bytes)
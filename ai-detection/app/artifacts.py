@@ -0,0 +1,275 @@
+"""
+Model artifacts fetched from S3 (``S3_MODEL_URI``) into a local cache.
+
+  * Parallel ranged GETs (``part_size`` bytes each, ``concurrency`` at once)
+    written straight into a preallocated file; every part carries
+    ``If-Match: <etag>`` so an object replaced mid-download fails instead of
+    mixing two versions. Failed parts are retried.
+  * The file's SHA-256 is checked against, in order: the expected digest
+    passed in (``S3_MODEL_SHA256``), the object's ``sha256`` user metadata,
+    or S3's full-object ``ChecksumSHA256``. Without any of these, a
+    single-part upload's ETag (its MD5) is checked instead. A mismatch
+    discards the file. An object with nothing to check against is accepted
+    with a warning, or refused when ``require_checksum`` is set.
+  * Verified files are stored content-addressed (``blobs/sha256/<hex>``); a
+    small ref per URI remembers the ETag it was fetched at. A restart costs
+    one HEAD request (none when the digest is known), and a cached copy is
+    used when S3 cannot be reached.
+
+The S3 client is injectable: anything with boto3's ``head_object`` /
+``get_object`` works, e.g. an in-memory stand-in in tests. By default a
+boto3 client is created (``S3_ENDPOINT_URL`` for MinIO/LocalStack).
+"""
+import base64
+import binascii
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+READ_CHUNK = 1024 * 1024
+
+
+class ArtifactError(Exception):
+    pass
+
+
+def parse_s3_uri(uri: str) -> Tuple[str, str]:
+    if not uri.startswith("s3://"):
+        raise ArtifactError(f"Not an s3:// URI: {uri}")
+    bucket, _, key = uri[5:].partition("/")
+    if not bucket or not key:
+        raise ArtifactError(f"Expected s3://bucket/key, got {uri}")
+    return bucket, key
+
+
+def s3_client(endpoint_url: Optional[str] = None, max_pool_connections: int = 10) -> Any:
+    try:
+        import boto3
+        from botocore.config import Config
+    except ImportError as e:
+        raise ArtifactError("boto3 is required to fetch s3:// artifacts") from e
+    config = Config(max_pool_connections=max_pool_connections, retries={"max_attempts": 5, "mode": "standard"})
+    return boto3.client("s3", endpoint_url=endpoint_url or None, config=config)
+
+
+def expected_sha256(head: Dict[str, Any]) -> Optional[str]:
+    """Hex digest announced by the object itself, if any."""
+    digest = (head.get("Metadata") or {}).get("sha256")
+    if digest:
+        return digest.lower()
+    checksum = head.get("ChecksumSHA256")
+    # "<base64>-<parts>" is a checksum of part checksums, not of the content
+    if checksum and "-" not in checksum:
+        try:
+            return base64.b64decode(checksum).hex()
+        except (binascii.Error, ValueError):
+            return None
+    return None
+
+
+def etag_md5(head: Dict[str, Any]) -> Optional[str]:
+    """MD5 hex digest carried by the ETag of a single-part, non-KMS upload."""
+    # With SSE-KMS / SSE-C the ETag is not the MD5 of the content
+    if str(head.get("ServerSideEncryption", "")).startswith("aws:kms") or head.get("SSECustomerAlgorithm"):
+        return None
+    etag = (head.get("ETag") or "").strip('"').lower()
+    # Multipart ETags are "<md5 of part md5s>-<parts>"
+    if len(etag) == 32 and all(c in "0123456789abcdef" for c in etag):
+        return etag
+    return None
+
+
+def file_sha256(path: Path) -> str:
+    return file_digests(path)[0]
+
+
+def file_digests(path: Path) -> Tuple[str, str]:
+    """(SHA-256, MD5) hex digests of ``path`` in one pass."""
+    sha256 = hashlib.sha256()
+    md5 = hashlib.md5(usedforsecurity=False)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(READ_CHUNK), b""):
+            sha256.update(chunk)
+            md5.update(chunk)
+    return sha256.hexdigest(), md5.hexdigest()
+
+
+def link_artifact(blob: Path, target: Path) -> bool:
+    """
+    Point ``target`` (e.g. ``MODEL_PATH``) at a cached blob via an atomic
+    symlink swap. A regular file at ``target`` is never replaced.
+    """
+    target = Path(target)
+    if target.exists() and not target.is_symlink():
+        return False
+    target.parent.mkdir(parents=True, exist_ok=True)
+    tmp = target.with_name(f".{target.name}.{os.getpid()}.link")
+    tmp.unlink(missing_ok=True)
+    os.symlink(os.path.abspath(blob), tmp)
+    os.replace(tmp, target)
+    return True
+
+
+class ArtifactFetcher:
+    def __init__(self, cache_dir: str, client: Any = None, part_size: int = 8 * 1024 * 1024,
+                 concurrency: int = 8, endpoint_url: Optional[str] = None, attempts: int = 3,
+                 require_checksum: bool = False):
+        self.cache_dir = Path(cache_dir)
+        self.require_checksum = require_checksum
+        self.part_size = max(64 * 1024, part_size)
+        self.concurrency = max(1, concurrency)
+        self.endpoint_url = endpoint_url
+        self.attempts = max(1, attempts)
+        self._client = client
+        self.hits = 0
+        self.downloads = 0
+        self.bytes_downloaded = 0
+
+    @property
+    def client(self) -> Any:
+        if self._client is None:
+            self._client = s3_client(self.endpoint_url, self.concurrency)
+        return self._client
+
+    def blob_path(self, sha256: str) -> Path:
+        return self.cache_dir / "blobs" / "sha256" / sha256.lower()
+
+    def _ref_path(self, uri: str) -> Path:
+        return self.cache_dir / "refs" / (hashlib.sha1(uri.encode("utf-8")).hexdigest() + ".json")
+
+    def _read_ref(self, uri: str) -> Optional[Dict[str, Any]]:
+        try:
+            ref = json.loads(self._ref_path(uri).read_text())
+        except (OSError, ValueError):
+            return None
+        return ref if ref.get("uri") == uri and self.blob_path(ref["sha256"]).is_file() else None
+
+    def _write_ref(self, ref: Dict[str, Any]) -> None:
+        path = self._ref_path(ref["uri"])
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(ref))
+        os.replace(tmp, path)
+
+    @contextmanager
+    def _lock(self, uri: str) -> Iterator[None]:
+        """Serialise fetches of one URI across processes sharing the cache dir."""
+        path = self._ref_path(uri).with_suffix(".lock")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def fetch(self, uri: str, sha256: Optional[str] = None) -> Path:
+        """Local path of the verified artifact for ``uri``, downloading it if needed."""
+        bucket, key = parse_s3_uri(uri)
+        if sha256 and self.blob_path(sha256).is_file():
+            self.hits += 1
+            return self.blob_path(sha256)
+        with self._lock(uri):
+            ref = self._read_ref(uri)
+            try:
+                head = self.client.head_object(Bucket=bucket, Key=key, ChecksumMode="ENABLED")
+            except Exception as e:
+                if ref is not None and (not sha256 or ref["sha256"] == sha256.lower()):
+                    logger.warning("Could not reach %s (%s); using cached copy %s", uri, e, ref["sha256"][:12])
+                    self.hits += 1
+                    return self.blob_path(ref["sha256"])
+                raise ArtifactError(f"Cannot fetch {uri}: {e}") from e
+            expected = (sha256 or expected_sha256(head) or "").lower() or None
+            if (ref is not None and ref.get("etag") == head.get("ETag") and ref.get("size") == head["ContentLength"]
+                    and (expected is None or ref["sha256"] == expected)):
+                self.hits += 1
+                return self.blob_path(ref["sha256"])
+            blob = self._download(uri, bucket, key, head, expected)
+            self._write_ref({"uri": uri, "etag": head.get("ETag"), "size": head["ContentLength"],
+                             "sha256": blob.name, "fetched_at": time.time()})
+            return blob
+
+    def _download(self, uri: str, bucket: str, key: str, head: Dict[str, Any],
+                  expected: Optional[str]) -> Path:
+        size = int(head["ContentLength"])
+        etag = head.get("ETag")
+        tmp_dir = self.cache_dir / "tmp"
+        tmp_dir.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(dir=tmp_dir, prefix="part-")
+        tmp = Path(tmp_name)
+        start = time.perf_counter()
+        try:
+            os.ftruncate(fd, size)
+            ranges = [(offset, min(offset + self.part_size, size) - 1) for offset in range(0, size, self.part_size)]
+            with ThreadPoolExecutor(max_workers=min(self.concurrency, max(1, len(ranges))),
+                                    thread_name_prefix="s3-part") as pool:
+                for future in [pool.submit(self._fetch_part, fd, bucket, key, etag, first, last)
+                               for first, last in ranges]:
+                    future.result()
+            os.fsync(fd)
+        except BaseException:
+            os.close(fd)
+            tmp.unlink(missing_ok=True)
+            raise
+        os.close(fd)
+
+        md5 = None if expected else etag_md5(head)
+        digest, got_md5 = file_digests(tmp)
+        error = None
+        if expected and digest != expected:
+            error = f"Checksum mismatch for {uri}: expected sha256 {expected}, got {digest}"
+        elif md5 and got_md5 != md5:
+            error = f"Checksum mismatch for {uri}: ETag MD5 {md5}, got {got_md5}"
+        elif not expected and not md5:
+            if self.require_checksum:
+                error = f"No checksum to verify {uri} against (set S3_MODEL_SHA256 or sha256 metadata)"
+            else:
+                logger.warning("Nothing to verify %s against (multipart upload without a sha256); "
+                               "set S3_MODEL_SHA256 to pin it", uri)
+        if error:
+            tmp.unlink(missing_ok=True)
+            raise ArtifactError(error)
+        blob = self.blob_path(digest)
+        blob.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(tmp, blob)
+        elapsed = time.perf_counter() - start
+        self.downloads += 1
+        self.bytes_downloaded += size
+        logger.info("Fetched %s (%.1f MB, %d part(s)) in %.2fs, sha256 %s%s", uri, size / 1024 / 1024,
+                    len(ranges), elapsed, digest[:12],
+                    " (verified)" if expected else " (ETag MD5 verified)" if md5 else "")
+        return blob
+
+    def _fetch_part(self, fd: int, bucket: str, key: str, etag: Optional[str], first: int, last: int) -> None:
+        params = {"Bucket": bucket, "Key": key, "Range": f"bytes={first}-{last}"}
+        if etag:
+            params["IfMatch"] = etag
+        for attempt in range(1, self.attempts + 1):
+            try:
+                body = self.client.get_object(**params)["Body"]
+                offset = first
+                for chunk in iter(lambda: body.read(READ_CHUNK), b""):
+                    os.pwrite(fd, chunk, offset)
+                    offset += len(chunk)
+                if offset != last + 1:
+                    raise ArtifactError(f"short read: bytes {first}-{offset - 1} of {first}-{last}")
+                return
+            except Exception as e:
+                if attempt == self.attempts:
+                    raise ArtifactError(f"Part bytes={first}-{last} of s3://{bucket}/{key} failed: {e}") from e
+                logger.warning("Retrying part bytes=%d-%d (attempt %d): %s", first, last, attempt, e)
+                time.sleep(0.2 * attempt)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"cache_dir": str(self.cache_dir), "hits": self.hits, "downloads": self.downloads,
+                "bytes_downloaded": self.bytes_downloaded}
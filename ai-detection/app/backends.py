@@ -0,0 +1,154 @@
+"""
+Pluggable inference backends for the YOLO model.
+
+``MODEL_BACKEND`` selects how the checkpoint at ``MODEL_PATH`` is executed:
+
+  * ``torch``    – eager PyTorch (the ``.pt`` file as-is),
+  * ``onnx``     – ONNX Runtime, exported with a dynamic batch axis,
+  * ``openvino`` – OpenVINO IR,
+  * ``stub``     – deterministic offline stand-in (``app.stub_model``) for
+    load tests and CI boxes without weights or network.
+
+``MODEL_PRECISION`` picks fp32, fp16 or int8. Exported artifacts are cached
+next to the ``.pt`` file under a name that encodes backend, precision and
+input size, and are reused on later starts until the checkpoint changes.
+"""
+import fcntl
+import logging
+import os
+import shutil
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, Tuple
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ("torch", "onnx", "openvino", "stub")
+PRECISIONS = ("fp32", "fp16", "int8")
+
+
+class BackendError(Exception):
+    pass
+
+
+def artifact_path(model_path: str, backend: str, precision: str, imgsz: int) -> Path:
+    """Where the exported model for this configuration is cached."""
+    pt = Path(model_path)
+    stem = f"{pt.stem}_{imgsz}_{precision}"
+    if backend == "onnx":
+        return pt.with_name(f"{stem}.onnx")
+    if backend == "openvino":
+        # ultralytics recognises OpenVINO models by the "_openvino_model" suffix
+        return pt.with_name(f"{stem}_openvino_model")
+    return pt
+
+
+def is_fresh(artifact: Path, model_path: str) -> bool:
+    """True if ``artifact`` exists and is newer than the source checkpoint."""
+    if not artifact.exists():
+        return False
+    try:
+        return artifact.stat().st_mtime >= Path(model_path).stat().st_mtime
+    except FileNotFoundError:
+        # Only the exported artifact was shipped; use it
+        return True
+
+
+@contextmanager
+def _export_lock(artifact: Path) -> Iterator[None]:
+    """Serialise exports across worker processes sharing the models dir."""
+    lock_path = artifact.with_name(artifact.name + ".lock")
+    with open(lock_path, "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _quantize_onnx_int8(src: Path, dst: Path) -> None:
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    quantize_dynamic(str(src), str(dst), weight_type=QuantType.QUInt8)
+
+
+def _convert_onnx_fp16(src: Path, dst: Path) -> None:
+    # ultralytics only exports half precision on GPU; convert the fp32 graph
+    # instead, keeping fp32 inputs/outputs so pre/postprocessing is unchanged
+    import onnx
+    from onnxconverter_common import float16
+
+    model = onnx.load(str(src))
+    onnx.save(float16.convert_float_to_float16(model, keep_io_types=True), str(dst))
+
+
+def export_model(model_path: str, backend: str, precision: str, imgsz: int) -> Path:
+    """Export ``model_path`` for ``backend`` (if not cached) and return the artifact path."""
+    from ultralytics import YOLO
+
+    target = artifact_path(model_path, backend, precision, imgsz)
+    with _export_lock(target):
+        if is_fresh(target, model_path):
+            return target
+        logger.info("Exporting %s to %s (%s, imgsz=%d)...", model_path, backend, precision, imgsz)
+        source = YOLO(model_path)
+        if backend == "onnx":
+            # fp16/int8 are derived from the fp32 export
+            exported = Path(source.export(format="onnx", imgsz=imgsz, dynamic=True, simplify=True))
+            if precision == "int8":
+                _quantize_onnx_int8(exported, target)
+                exported.unlink(missing_ok=True)
+            elif precision == "fp16":
+                _convert_onnx_fp16(exported, target)
+                exported.unlink(missing_ok=True)
+            else:
+                os.replace(exported, target)
+        else:
+            # int8 runs NNCF post-training quantization on ultralytics' default
+            # calibration set, which is downloaded on first export
+            exported = Path(source.export(format="openvino", imgsz=imgsz, dynamic=True,
+                                          half=precision == "fp16", int8=precision == "int8"))
+            if target.exists():
+                shutil.rmtree(target)
+            os.replace(exported, target)
+        logger.info("✓ Exported model cached at %s", target)
+        return target
+
+
+def load_yolo_model(model_path: str, backend: str = "torch", precision: str = "fp32",
+                    imgsz: int = 640) -> Tuple[Any, Dict[str, Any]]:
+    """
+    Load YOLO for the requested backend. Returns ``(model, info)`` where
+    ``info`` describes what is actually active (for /health).
+    Falls back to torch fp32 if the export or the runtime is unavailable.
+    """
+    backend = backend.lower()
+    precision = precision.lower()
+    if backend not in BACKENDS:
+        raise BackendError(f"Unknown MODEL_BACKEND '{backend}' (expected one of {', '.join(BACKENDS)})")
+    if precision not in PRECISIONS:
+        raise BackendError(f"Unknown MODEL_PRECISION '{precision}' (expected one of {', '.join(PRECISIONS)})")
+
+    if backend == "stub":
+        from app.stub_model import StubYOLO
+
+        return StubYOLO(), {"backend": "stub", "precision": "fp32", "artifact": None}
+
+    from ultralytics import YOLO
+
+    if backend != "torch":
+        try:
+            artifact = export_model(model_path, backend, precision, imgsz)
+            model = YOLO(str(artifact), task="detect")
+            return model, {"backend": backend, "precision": precision, "artifact": str(artifact)}
+        except ImportError as e:
+            logger.warning("Cannot use %s backend (%s); install requirements-export.txt. "
+                           "Falling back to torch fp32", backend, e)
+        except Exception as e:
+            logger.warning("Cannot use %s backend (%s); falling back to torch fp32", backend, e,
+                           exc_info=True)
+
+    if backend == "torch" and precision != "fp32":
+        # Eager fp16/int8 kernels are not available on CPU for the whole model
+        logger.warning("MODEL_PRECISION=%s is not supported by the torch CPU backend; using fp32", precision)
+    return YOLO(model_path), {"backend": "torch", "precision": "fp32", "artifact": model_path}
@@ -0,0 +1,120 @@
+"""
+Dynamic micro-batching in front of a model.
+
+Requests that arrive within a few milliseconds of each other are grouped into
+one batched call: a batch is dispatched as soon as it holds ``max_batch_size``
+items or ``max_wait_ms`` has passed since its first item, whichever is first.
+"""
+import asyncio
+import contextvars
+import logging
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional
+
+from app.executor import InferenceExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """
+    Collects submitted items and runs ``process_batch(items) -> results`` on
+    the inference executor, resolving one future per item.
+
+    Up to ``max_concurrent_batches`` batches run at once; while they are all
+    busy, new items keep accumulating, so batches grow with load.
+    """
+
+    def __init__(self, name: str, process_batch: Callable[[List[Any]], List[Any]],
+                 executor: InferenceExecutor, stage: str, max_batch_size: int = 8,
+                 max_wait_ms: float = 10.0, max_concurrent_batches: int = 1):
+        self.name = name
+        self.process_batch = process_batch
+        self.executor = executor
+        self.stage = stage
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.max_concurrent_batches = max(1, max_concurrent_batches)
+        self.batch_sizes: Counter = Counter()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def _ensure_started(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._task is not None and not self._task.done():
+            return
+        self._loop = loop
+        self._queue = asyncio.Queue()
+        self._slots = asyncio.Semaphore(self.max_concurrent_batches)
+        # Fresh context: the loop outlives the request that started it (see app.tracing)
+        self._task = loop.create_task(self._collect_loop(), context=contextvars.Context())
+
+    def submit(self, item: Any) -> "asyncio.Future[Any]":
+        """Queue ``item`` and return a future for its individual result."""
+        self._ensure_started()
+        future = self._loop.create_future()
+        self._queue.put_nowait((item, future))
+        return future
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, RuntimeError):
+                pass
+            self._task = None
+
+    async def _collect_loop(self) -> None:
+        while True:
+            batch = [await self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            # Drop items whose requester already gave up (timeout/disconnect)
+            batch = [(item, fut) for item, fut in batch if not fut.done()]
+            if not batch:
+                continue
+            await self._slots.acquire()
+            self._loop.create_task(self._run_batch(batch))
+
+    async def _run_batch(self, batch: List[Any]) -> None:
+        items = [item for item, _ in batch]
+        self.batch_sizes[len(items)] += 1
+        try:
+            results = await self.executor.run(self.stage, self.process_batch, items)
+            if len(results) != len(items):
+                raise RuntimeError(f"{self.name}: got {len(results)} results for {len(items)} items")
+        except Exception as e:
+            logger.error("%s batch of %d failed: %s", self.name, len(items), e)
+            for _, fut in batch:
+                if not fut.done():
+                    fut.set_exception(e)
+        else:
+            for (_, fut), res in zip(batch, results):
+                if not fut.done():
+                    fut.set_result(res)
+        finally:
+            self._slots.release()
+
+    def stats(self) -> Dict[str, Any]:
+        """Batch-size distribution achieved so far."""
+        batches = sum(self.batch_sizes.values())
+        items = sum(size * count for size, count in self.batch_sizes.items())
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "batches": batches,
+            "items": items,
+            "mean_batch_size": round(items / batches, 3) if batches else 0.0,
+            "batch_size_histogram": {str(k): v for k, v in sorted(self.batch_sizes.items())},
+        }
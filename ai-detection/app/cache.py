@@ -0,0 +1,322 @@
+"""
+Content-addressed cache for prediction results.
+
+Keys are a SHA-256 over the raw upload bytes plus everything that changes the
+output (model path, inference parameters). Values are JSON-serialisable dicts.
+
+Two tiers:
+  * memory: LRU bounded by entry count and serialised size,
+  * disk (optional): one JSON file per key, survives restarts, bounded by size.
+
+Concurrent requests for the same key are collapsed: only the first computes,
+the others await its result (single-flight).
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def make_cache_key(contents: bytes, **params: Any) -> str:
+    """Hash upload bytes together with the parameters that affect the result."""
+    digest = hashlib.sha256(contents)
+    digest.update(json.dumps(params, sort_keys=True, default=str).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class ResultCache:
+    def __init__(self, max_entries: int = 256, max_bytes: int = 256 * 1024 * 1024,
+                 disk_dir: Optional[str] = None, disk_max_bytes: int = 1024 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self.disk_max_bytes = disk_max_bytes
+        self._memory: "OrderedDict[str, Tuple[Dict[str, Any], int]]" = OrderedDict()
+        self._memory_bytes = 0
+        self._disk_bytes = 0
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.counters = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "collapsed": 0,
+            "memory_evictions": 0,
+            "disk_evictions": 0,
+        }
+        if self.disk_dir is not None:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+            self._disk_bytes = sum(p.stat().st_size for p in self.disk_dir.glob("*/*.json"))
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 or self.disk_dir is not None
+
+    # --- memory tier -----------------------------------------------------
+    def _memory_get(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._memory.get(key)
+        if entry is None:
+            return None
+        self._memory.move_to_end(key)
+        return entry[0]
+
+    def _memory_put(self, key: str, value: Dict[str, Any], size: int) -> None:
+        if self.max_entries <= 0 or size > self.max_bytes:
+            return
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_bytes -= old[1]
+        self._memory[key] = (value, size)
+        self._memory_bytes += size
+        while len(self._memory) > self.max_entries or self._memory_bytes > self.max_bytes:
+            _, (_, evicted_size) = self._memory.popitem(last=False)
+            self._memory_bytes -= evicted_size
+            self.counters["memory_evictions"] += 1
+
+    # --- disk tier (blocking, called via run_in_executor) -----------------
+    def _disk_path(self, key: str) -> Path:
+        return self.disk_dir / key[:2] / f"{key}.json"
+
+    def _disk_get(self, key: str) -> Optional[bytes]:
+        path = self._disk_path(key)
+        try:
+            data = path.read_bytes()
+            os.utime(path)  # refresh recency for eviction
+            return data
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            logger.warning("Result cache disk read failed for %s: %s", key, e)
+            return None
+
+    def _disk_put(self, key: str, data: bytes) -> None:
+        path = self._disk_path(key)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            old_size = path.stat().st_size if path.exists() else 0
+            tmp = path.with_suffix(".tmp")
+            tmp.write_bytes(data)
+            os.replace(tmp, path)
+            self._disk_bytes += len(data) - old_size
+            if self._disk_bytes > self.disk_max_bytes:
+                self._disk_evict()
+        except OSError as e:
+            logger.warning("Result cache disk write failed for %s: %s", key, e)
+
+    def _disk_evict(self) -> None:
+        files = sorted(self.disk_dir.glob("*/*.json"), key=lambda p: p.stat().st_mtime)
+        total = sum(p.stat().st_size for p in files)
+        # Evict oldest down to 90% so we do not rescan on every write
+        target = int(self.disk_max_bytes * 0.9)
+        for path in files:
+            if total <= target:
+                break
+            size = path.stat().st_size
+            path.unlink(missing_ok=True)
+            total -= size
+            self.counters["disk_evictions"] += 1
+        self._disk_bytes = total
+
+    # --- public API -------------------------------------------------------
+    async def get_or_compute(self, key: str,
+                             compute: Callable[[], Awaitable[Dict[str, Any]]],
+                             should_cache: Optional[Callable[[Dict[str, Any]], bool]] = None,
+                             ) -> Tuple[Dict[str, Any], bool]:
+        """
+        Return ``(value, hit)``. On a miss ``compute()`` runs once per key even
+        when several requests for the same key arrive concurrently.
+        ``should_cache(value)`` can veto storing a (e.g. degraded) result;
+        waiters collapsed onto that computation still receive it.
+        """
+        if not self.enabled:
+            return await compute(), False
+
+        value = self._memory_get(key)
+        if value is not None:
+            self.counters["memory_hits"] += 1
+            return value, True
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.counters["collapsed"] += 1
+            try:
+                return await asyncio.shield(inflight), True
+            except Exception:
+                # Leader failed (timeout, disconnect, ...); compute on our own
+                pass
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._inflight[key] = future
+        try:
+            if self.disk_dir is not None:
+                data = await loop.run_in_executor(None, self._disk_get, key)
+                if data is not None:
+                    value = json.loads(data)
+                    self.counters["disk_hits"] += 1
+                    self._memory_put(key, value, len(data))
+                    future.set_result(value)
+                    return value, True
+
+            self.counters["misses"] += 1
+            value = await compute()
+            if should_cache is None or should_cache(value):
+                data = json.dumps(value, ensure_ascii=False).encode("utf-8")
+                self._memory_put(key, value, len(data))
+                if self.disk_dir is not None:
+                    # Fire-and-forget; the response does not wait for the disk write
+                    loop.run_in_executor(None, self._disk_put, key, data)
+            future.set_result(value)
+            return value, False
+        except BaseException as e:
+            if not future.done():
+                future.set_exception(e if isinstance(e, Exception) else RuntimeError("cancelled"))
+                # Mark retrieved so asyncio does not log "exception never retrieved"
+                future.exception()
+            raise
+        finally:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    def discard(self, key: str) -> None:
+        """Drop ``key`` from both tiers (e.g. its stored image is gone)."""
+        entry = self._memory.pop(key, None)
+        if entry is not None:
+            self._memory_bytes -= entry[1]
+        if self.disk_dir is not None:
+            path = self._disk_path(key)
+            try:
+                size = path.stat().st_size
+                path.unlink()
+                self._disk_bytes -= size
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning("Result cache disk delete failed for %s: %s", key, e)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.counters,
+            "entries": len(self._memory),
+            "memory_bytes": self._memory_bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "disk_enabled": self.disk_dir is not None,
+            "disk_bytes": self._disk_bytes,
+        }
+
+
+class BlobStore:
+    """
+    Small LRU of binary blobs (e.g. annotated images) by id, in memory.
+
+    With ``disk_dir`` every blob is also written there (``<id>`` holding the
+    media type line then the bytes), so processes sharing the directory --
+    the workers of ``app.serve`` -- can serve each other's blobs. Disk I/O
+    runs in the default executor. The directory is bounded by ``max_bytes``
+    too: a running total of this process's writes triggers a scan that
+    evicts the oldest files.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, disk_dir: Optional[str] = None):
+        self.max_bytes = max_bytes
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self._blobs: "OrderedDict[str, Tuple[bytes, str]]" = OrderedDict()
+        self._bytes = 0
+        self._disk_bytes = 0
+        self.evictions = 0
+        self.disk_hits = 0
+        self.disk_evictions = 0
+        if self.disk_dir is not None:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+            self._disk_bytes = sum(p.stat().st_size for p in self._disk_files())
+
+    async def contains(self, blob_id: str) -> bool:
+        if blob_id in self._blobs:
+            return True
+        if self.disk_dir is None:
+            return False
+        return await asyncio.get_running_loop().run_in_executor(None, self._disk_path(blob_id).is_file)
+
+    async def put(self, blob_id: str, data: bytes, media_type: str) -> None:
+        if len(data) > self.max_bytes:
+            return
+        old = self._blobs.pop(blob_id, None)
+        if old is not None:
+            self._bytes -= len(old[0])
+        self._blobs[blob_id] = (data, media_type)
+        self._bytes += len(data)
+        while self._bytes > self.max_bytes:
+            _, (evicted, _) = self._blobs.popitem(last=False)
+            self._bytes -= len(evicted)
+            self.evictions += 1
+        if self.disk_dir is not None:
+            # Awaited: a follow-up request on another worker must find the file
+            await asyncio.get_running_loop().run_in_executor(None, self._disk_put, blob_id, data, media_type)
+
+    async def get(self, blob_id: str) -> Optional[Tuple[bytes, str]]:
+        entry = self._blobs.get(blob_id)
+        if entry is not None:
+            self._blobs.move_to_end(blob_id)
+            return entry
+        if self.disk_dir is None:
+            return None
+        entry = await asyncio.get_running_loop().run_in_executor(None, self._disk_get, blob_id)
+        if entry is not None:
+            self.disk_hits += 1
+        return entry
+
+    # --- disk (blocking, called via run_in_executor) ----------------------
+    def _disk_path(self, blob_id: str) -> Path:
+        return self.disk_dir / blob_id.replace("/", "_")
+
+    def _disk_files(self) -> List[Path]:
+        return [p for p in self.disk_dir.iterdir() if not p.name.startswith(".")]
+
+    def _disk_get(self, blob_id: str) -> Optional[Tuple[bytes, str]]:
+        try:
+            raw = self._disk_path(blob_id).read_bytes()
+        except OSError:
+            return None
+        media_type, _, data = raw.partition(b"\n")
+        return data, media_type.decode("ascii")
+
+    def _disk_put(self, blob_id: str, data: bytes, media_type: str) -> None:
+        path = self._disk_path(blob_id)
+        raw = media_type.encode("ascii") + b"\n" + data
+        try:
+            old_size = path.stat().st_size if path.exists() else 0
+            tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+            tmp.write_bytes(raw)
+            os.replace(tmp, path)
+            self._disk_bytes += len(raw) - old_size
+            if self._disk_bytes > self.max_bytes:
+                self._disk_evict(keep=path)
+        except OSError as e:
+            logger.warning("Blob store disk write failed for %s: %s", blob_id, e)
+
+    def _disk_evict(self, keep: Path) -> None:
+        # Rescan only when over budget: the directory is shared, so the total
+        # is refreshed from what every process wrote
+        files = sorted((p for p in self._disk_files() if p != keep), key=lambda p: p.stat().st_mtime)
+        total = keep.stat().st_size + sum(p.stat().st_size for p in files)
+        target = int(self.max_bytes * 0.9)  # some headroom before the next scan
+        for path in files:
+            if total <= target:
+                break
+            size = path.stat().st_size
+            path.unlink(missing_ok=True)
+            total -= size
+            self.disk_evictions += 1
+        self._disk_bytes = total
+
+    def stats(self) -> Dict[str, Any]:
+        return {"entries": len(self._blobs), "bytes": self._bytes, "max_bytes": self.max_bytes,
+                "evictions": self.evictions, "shared_dir": str(self.disk_dir) if self.disk_dir else None,
+                "disk_bytes": self._disk_bytes, "disk_hits": self.disk_hits,
+                "disk_evictions": self.disk_evictions}
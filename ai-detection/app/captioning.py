@@ -0,0 +1,81 @@
+"""
+BLIP captioning engine.
+
+Wraps ``Salesforce/blip-image-captioning-base`` (or another BLIP checkpoint)
+with:
+
+  * an optional dynamically-quantized INT8 variant (``nn.Linear`` weights),
+  * batched generation, so caption jobs from several requests share one
+    ``generate`` call (driven by ``app.batching.MicroBatcher``),
+  * bounded generation length and beam settings.
+"""
+import logging
+import time
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+CAPTION_VARIANTS = ("fp32", "int8")
+
+
+class CaptionEngine:
+    def __init__(self, model_name: str = "Salesforce/blip-image-captioning-base",
+                 variant: str = "fp32", max_new_tokens: int = 30, num_beams: int = 1):
+        self.model_name = model_name
+        self.variant = variant
+        self.max_new_tokens = max_new_tokens
+        self.num_beams = max(1, num_beams)
+        self.processor: Any = None
+        self.model: Any = None
+        self.load_seconds: Optional[float] = None
+
+    @property
+    def available(self) -> bool:
+        return self.model is not None and self.processor is not None
+
+    def load(self) -> None:
+        """Load processor and model; raises if transformers/torch are unavailable."""
+        if self.variant not in CAPTION_VARIANTS:
+            raise ValueError(f"Unknown caption variant '{self.variant}' "
+                             f"(expected one of {', '.join(CAPTION_VARIANTS)})")
+        import torch
+        from transformers import BlipForConditionalGeneration, BlipProcessor
+
+        start = time.perf_counter()
+        processor = BlipProcessor.from_pretrained(self.model_name)
+        model = BlipForConditionalGeneration.from_pretrained(self.model_name)
+        model.eval()
+        if self.variant == "int8":
+            # Dynamic quantization: int8 weights, activations quantized on the fly
+            model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        self.processor = processor
+        self.model = model
+        self.load_seconds = time.perf_counter() - start
+
+    def unload(self) -> None:
+        self.processor = None
+        self.model = None
+
+    def caption_batch(self, images: List[Any]) -> List[str]:
+        """Caption a batch of BGR arrays; returns one English caption per image."""
+        if not self.available:
+            return ["" for _ in images]
+        import cv2
+        import torch
+        from PIL import Image
+
+        pil_images = [Image.fromarray(cv2.cvtColor(img, cv2.COLOR_BGR2RGB)) for img in images]
+        inputs = self.processor(images=pil_images, return_tensors="pt")
+        with torch.inference_mode():
+            out = self.model.generate(**inputs, max_new_tokens=self.max_new_tokens,
+                                      num_beams=self.num_beams)
+        return [text.strip() for text in self.processor.batch_decode(out, skip_special_tokens=True)]
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "model": self.model_name,
+            "variant": self.variant,
+            "max_new_tokens": self.max_new_tokens,
+            "num_beams": self.num_beams,
+            "available": self.available,
+        }
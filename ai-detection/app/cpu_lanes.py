@@ -0,0 +1,251 @@
+"""
+CPU lanes for YOLO and BLIP.
+
+Without lanes every concurrent prediction runs torch with one intra-op thread
+per core, so ``MAX_CONCURRENT_REQUESTS`` predictions (plus BLIP) oversubscribe
+the CPU and fight over the same cores. ``CpuLanes`` splits the cores
+available to the process into disjoint, near-equal sets; each lane is ONE
+worker thread pinned (``sched_setaffinity``) to its cores. torch's intra-op
+thread count is process-global, so it is set once to the size of the
+smallest lane rather than per lane. The ``caption`` stage can get its own
+lane (``caption_cores`` cores taken from the end) so BLIP never competes with
+YOLO for cores.
+
+``autotune`` benchmarks a few lane counts on a synthetic image at startup and
+keeps the highest throughput whose median latency stays within
+``latency_slack`` of the fastest configuration.
+
+Pinning is Linux only; elsewhere lanes still bound the thread counts.
+"""
+import logging
+import os
+import statistics
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from app.executor import InferenceExecutor
+
+logger = logging.getLogger(__name__)
+
+
+def available_cpus() -> List[int]:
+    """Cores this process may run on (respects taskset/cgroup cpusets)."""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def partition(cpus: Sequence[int], lanes: int) -> List[List[int]]:
+    """``cpus`` split into ``lanes`` contiguous, near-equal sets (at most one lane per core)."""
+    cpus = list(cpus)
+    lanes = max(1, min(lanes, len(cpus)))
+    size, extra = divmod(len(cpus), lanes)
+    sets, start = [], 0
+    for i in range(lanes):
+        end = start + size + (1 if i < extra else 0)
+        sets.append(cpus[start:end])
+        start = end
+    return sets
+
+
+def plan_lanes(cpus: Sequence[int], lanes: int, caption_cores: int = 0) -> Tuple[List[List[int]], List[int]]:
+    """(inference lanes, caption cores); at least one core always stays with inference."""
+    cpus = list(cpus)
+    caption_cores = min(max(0, caption_cores), len(cpus) - 1)
+    inference = cpus[:len(cpus) - caption_cores]
+    return partition(inference, lanes), cpus[len(inference):]
+
+
+def candidate_lane_counts(cores: int, max_lanes: int) -> List[int]:
+    """Lane counts tried by ``autotune``: powers of two plus ``max_lanes``, capped by both bounds."""
+    limit = max(1, min(cores, max_lanes))
+    counts = {limit}
+    n = 1
+    while n < limit:
+        counts.add(n)
+        n *= 2
+    return sorted(counts)
+
+
+def set_torch_threads(threads: int, interop: int = 0) -> None:
+    try:
+        import torch
+    except ImportError:
+        return
+    if threads > 0:
+        torch.set_num_threads(threads)
+    if interop > 0:
+        try:
+            torch.set_num_interop_threads(interop)
+        except RuntimeError:
+            pass  # only settable before the first inter-op parallel work
+
+
+def _pin_current_thread(cores: List[int]) -> None:
+    if hasattr(os, "sched_setaffinity"):
+        try:
+            os.sched_setaffinity(0, cores)  # pid 0 = the calling thread on Linux
+        except OSError as e:
+            logger.warning("Could not pin lane thread to cores %s: %s", cores, e)
+
+
+class _Lane(ThreadPoolExecutor):
+    """One pinned worker thread; counts queued + running calls."""
+
+    def __init__(self, name: str, cores: List[int], threads: int):
+        super().__init__(max_workers=1, thread_name_prefix=name,
+                         initializer=_pin_current_thread, initargs=(cores,))
+        self.name = name
+        self.cores = list(cores)
+        self.threads = threads
+        self.pending = 0
+        self.calls = 0
+        self._count_lock = threading.Lock()
+
+    def submit(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Future:
+        future = super().submit(fn, *args, **kwargs)
+        with self._count_lock:
+            self.pending += 1
+            self.calls += 1
+        future.add_done_callback(self._done)
+        return future
+
+    def _done(self, _: Future) -> None:
+        with self._count_lock:
+            self.pending -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {"name": self.name, "cores": self.cores, "torch_threads": self.threads,
+                "pending": self.pending, "calls": self.calls}
+
+
+class CpuLanes(InferenceExecutor):
+    """
+    ``InferenceExecutor`` whose calls run in CPU lanes: a call goes to the
+    lane with the fewest pending calls, ``caption`` calls to the caption lane
+    when there is one. Stage timeouts and disconnect handling are inherited.
+
+    ``torch_threads`` (0 = cores of the smallest lane) sets the intra-op
+    threads, once for the whole process; ``cpus`` overrides the detected cores. Lanes are created on first
+    use, in the process that serves requests.
+    """
+
+    def __init__(self, lanes: int, caption_cores: int = 0, torch_threads: int = 0,
+                 stage_timeouts: Optional[Dict[str, float]] = None, poll_interval: float = 0.25,
+                 cpus: Optional[Sequence[int]] = None):
+        super().__init__(lanes, stage_timeouts, poll_interval)
+        self.lanes_requested = max(1, lanes)
+        self.caption_cores = caption_cores
+        self.torch_threads = torch_threads
+        self.cpus = list(cpus) if cpus else None
+        self._lanes: List[_Lane] = []
+        self._caption_lane: Optional[_Lane] = None
+        self._start_lock = threading.Lock()
+
+    def _build(self) -> Tuple[List[_Lane], Optional[_Lane]]:
+        lanes, caption = plan_lanes(self.cpus or available_cpus(), self.lanes_requested, self.caption_cores)
+        self.max_workers = len(lanes)
+        # torch.set_num_threads is process-global: one value for every lane (and the unpinned
+        # threads), sized so that no lane runs more intra-op threads than it has cores
+        threads = self.torch_threads or min(len(cores) for cores in lanes)
+        set_torch_threads(threads, interop=1)
+        caption_lane = _Lane("caption-lane", caption, threads) if caption else None
+        inference = [_Lane(f"lane{i}", cores, threads) for i, cores in enumerate(lanes)]
+        return inference, caption_lane
+
+    def _log_plan(self) -> None:
+        logger.info("CPU lanes: %s; caption lane: %s", [lane.cores for lane in self._lanes],
+                    self._caption_lane.cores if self._caption_lane else "shared")
+
+    def start(self) -> None:
+        if self._lanes:
+            return
+        with self._start_lock:
+            if self._lanes:
+                return
+            self._lanes, self._caption_lane = self._build()
+        self._log_plan()
+
+    def shutdown(self) -> None:
+        with self._start_lock:
+            for lane in self._lanes + ([self._caption_lane] if self._caption_lane else []):
+                lane.shutdown(wait=False, cancel_futures=True)
+            self._lanes = []
+            self._caption_lane = None
+
+    def configure(self, lanes: int) -> None:
+        """
+        Re-plan with ``lanes`` inference lanes (used after ``autotune``). Safe
+        while serving: new calls go to the new lanes at once, calls already
+        queued on the old lanes still run, then their threads exit.
+        """
+        with self._start_lock:
+            old = self._lanes + ([self._caption_lane] if self._caption_lane else [])
+            self.lanes_requested = max(1, lanes)
+            self._lanes, self._caption_lane = self._build()
+        for lane in old:
+            lane.shutdown(wait=False)
+        self._log_plan()
+
+    def _pool_for(self, stage: str) -> ThreadPoolExecutor:
+        if stage == "caption" and self._caption_lane is not None:
+            return self._caption_lane
+        return min(self._lanes, key=lambda lane: lane.pending)
+
+    def submit(self, stage: str, fn: Callable[..., Any], *args: Any) -> Future:
+        """Blocking-world counterpart of ``run`` (no timeout handling)."""
+        self.start()
+        return self._pool_for(stage).submit(fn, *args)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "lanes": [lane.stats() for lane in self._lanes],
+            "caption_lane": self._caption_lane.stats() if self._caption_lane else None,
+        }
+
+
+def autotune(infer: Callable[[], Any], lane_counts: Sequence[int], caption_cores: int = 0,
+             torch_threads: int = 0, rounds: int = 4, latency_slack: float = 1.5,
+             cpus: Optional[Sequence[int]] = None) -> Tuple[int, List[Dict[str, Any]]]:
+    """
+    Time ``infer()`` (one synthetic inference) under each lane count with all
+    lanes busy (``rounds`` calls per lane, after one warm-up call per lane).
+    Returns the chosen lane count and the measurements.
+    """
+    results: List[Dict[str, Any]] = []
+    for requested in sorted(set(lane_counts)):
+        lanes = CpuLanes(requested, caption_cores, torch_threads, cpus=cpus)
+        lanes.start()
+        count = lanes.max_workers  # capped by the number of cores
+        if any(r["lanes"] == count for r in results):
+            lanes.shutdown()
+            continue
+        latencies: List[float] = []
+
+        def timed() -> None:
+            start = time.perf_counter()
+            infer()
+            latencies.append(time.perf_counter() - start)
+
+        try:
+            for lane in lanes._lanes:
+                lane.submit(infer).result()
+            start = time.perf_counter()
+            for future in [lanes.submit("yolo", timed) for _ in range(count * rounds)]:
+                future.result()
+            wall = time.perf_counter() - start
+        finally:
+            lanes.shutdown()
+        results.append({
+            "lanes": count,
+            "cores_per_lane": min(len(cores) for cores in plan_lanes(cpus or available_cpus(), count,
+                                                                      caption_cores)[0]),
+            "throughput": round(count * rounds / wall, 2),
+            "p50_ms": round(statistics.median(latencies) * 1000, 2),
+        })
+    fastest = min(r["p50_ms"] for r in results)
+    eligible = [r for r in results if r["p50_ms"] <= fastest * latency_slack]
+    best = max(eligible, key=lambda r: r["throughput"])
+    return best["lanes"], results
@@ -0,0 +1,131 @@
+"""
+Inference execution layer.
+
+CPU-heavy pipeline stages (image decode, YOLO, BLIP, plotting, JPEG encoding)
+run on a dedicated thread pool so the asyncio event loop only does I/O.
+Torch, OpenCV and PIL release the GIL in their native code, so threads give
+real parallelism without duplicating model weights per worker.
+"""
+import asyncio
+import contextvars
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class StageTimeout(Exception):
+    """Raised when a pipeline stage exceeds its configured timeout."""
+
+    def __init__(self, stage: str, timeout: float):
+        super().__init__(f"Stage '{stage}' timed out after {timeout:.1f}s")
+        self.stage = stage
+        self.timeout = timeout
+
+
+class ClientDisconnected(Exception):
+    """Raised when the client went away while a stage was running."""
+
+    def __init__(self, stage: str):
+        super().__init__(f"Client disconnected during stage '{stage}'")
+        self.stage = stage
+
+
+async def wait_for_disconnect(request: Any, poll_interval: float) -> None:
+    """Return once the ASGI request reports that the client disconnected."""
+    while not await request.is_disconnected():
+        await asyncio.sleep(poll_interval)
+
+
+class InferenceExecutor:
+    """
+    Thread pool that runs blocking pipeline stages off the event loop.
+
+    Each call to ``run`` is tagged with a stage name; the stage's timeout
+    (seconds, ``0`` or missing = unlimited) comes from ``stage_timeouts``.
+    When a ``request`` is given, the stage is abandoned as soon as the client
+    disconnects. A stage that already started cannot be interrupted inside
+    native code, but its result is discarded and no later stage is scheduled.
+    """
+
+    def __init__(self, max_workers: int, stage_timeouts: Optional[Dict[str, float]] = None,
+                 poll_interval: float = 0.25):
+        self.max_workers = max(1, max_workers)
+        self.stage_timeouts = dict(stage_timeouts or {})
+        self.poll_interval = poll_interval
+        self._pool: Optional[ThreadPoolExecutor] = None
+
+    def start(self) -> None:
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.max_workers,
+                                            thread_name_prefix="inference")
+            logger.info("Inference executor started with %d worker threads", self.max_workers)
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def _pool_for(self, stage: str) -> ThreadPoolExecutor:
+        return self._pool
+
+    async def run(self, stage: str, fn: Callable[..., Any], *args: Any,
+                  request: Any = None, **kwargs: Any) -> Any:
+        """
+        Run ``fn(*args, **kwargs)`` on the pool and await its result. ``fn``
+        sees the caller's context variables (e.g. the request trace). The
+        stage timeout counts from the moment ``fn`` starts, not while it is
+        still queued behind other stages.
+        """
+        self.start()
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()
+        started = asyncio.Event()
+
+        def call() -> Any:
+            loop.call_soon_threadsafe(started.set)
+            return context.run(fn, *args, **kwargs)
+
+        future = loop.run_in_executor(self._pool_for(stage), call)
+        return await self.wait(stage, future, request=request, started=started)
+
+    async def wait(self, stage: str, future: "asyncio.Future[Any]", request: Any = None,
+                   started: Optional[asyncio.Event] = None) -> Any:
+        """
+        Await ``future`` under the stage timeout and disconnect watch.
+
+        Used for work that is scheduled elsewhere (e.g. a micro-batch) but
+        should obey the same per-stage limits as ``run``. With ``started``,
+        the timeout only begins once that event is set.
+        """
+        timeout = self.stage_timeouts.get(stage) or None
+
+        watcher = None
+        if request is not None:
+            watcher = asyncio.ensure_future(wait_for_disconnect(request, self.poll_interval))
+        starter = None
+        if started is not None and timeout is not None and not started.is_set():
+            starter = asyncio.ensure_future(started.wait())
+        try:
+            waiters = {future} if watcher is None else {future, watcher}
+            if starter is not None:
+                # Still queued in the pool: wait (untimed) until the stage starts, finishes or is abandoned
+                await asyncio.wait(waiters | {starter}, return_when=asyncio.FIRST_COMPLETED)
+            done, _ = await asyncio.wait(waiters, timeout=timeout,
+                                         return_when=asyncio.FIRST_COMPLETED)
+            if future in done:
+                return future.result()
+            future.cancel()
+            if watcher is not None and watcher in done:
+                raise ClientDisconnected(stage)
+            raise StageTimeout(stage, timeout or 0.0)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        finally:
+            if watcher is not None:
+                watcher.cancel()
+            if starter is not None:
+                starter.cancel()
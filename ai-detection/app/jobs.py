@@ -0,0 +1,216 @@
+"""
+Background jobs for deferred work (asynchronous captioning).
+
+``JobStore`` keeps a bounded, expiring table of job records that clients
+poll or stream. ``JobRunner`` runs jobs on a fixed number of asyncio workers
+behind a bounded queue; when the queue is full new jobs are shed (marked
+``skipped``) instead of failing the request that created them.
+
+A job runs in the process that created it. With ``disk_dir`` the store also
+writes every record there as ``<id>.json``, so the other workers of
+``app.serve`` sharing the directory can answer polls for it (``fetch``).
+Writes go through one background thread, in order; reads run in the default
+executor. The event loop never touches the disk.
+"""
+import asyncio
+import contextvars
+import json
+import logging
+import os
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+FINAL_STATUSES = ("done", "failed", "skipped")
+
+
+class JobStore:
+    def __init__(self, max_jobs: int = 1000, ttl_seconds: float = 600.0, disk_dir: Optional[str] = None):
+        self.max_jobs = max(1, max_jobs)
+        self.ttl_seconds = ttl_seconds
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self._jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._by_key: Dict[str, str] = {}
+        self.expired = 0
+        self._writer: Optional[ThreadPoolExecutor] = None
+        self._last_write: Optional[Future] = None
+        if self.disk_dir is not None:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+            # One thread: writes of the same job land in the order they were made
+            self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="job-store")
+
+    # --- shared directory (workers of one server) ---------------------------
+    def _disk_path(self, job_id: str) -> Path:
+        return self.disk_dir / f"{job_id}.json"
+
+    def _save(self, job: Dict[str, Any]) -> None:
+        if self._writer is not None:
+            # Serialised now: the record may change before the write runs
+            data = json.dumps(job, ensure_ascii=False, default=str)
+            self._last_write = self._writer.submit(self._write, job["id"], data)
+
+    def _write(self, job_id: str, data: str) -> None:
+        path = self._disk_path(job_id)
+        try:
+            tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+            tmp.write_text(data)
+            os.replace(tmp, path)
+        except OSError as e:
+            logger.warning("Could not share job %s: %s", job_id, e)
+
+    async def flush(self) -> None:
+        """Wait until the records written so far are visible to other workers."""
+        if self._last_write is not None and not self._last_write.done():
+            await asyncio.wrap_future(self._last_write)
+
+    def _load(self, job_id: str) -> Optional[Dict[str, Any]]:
+        if self.disk_dir is None or not job_id.isalnum():
+            return None
+        path = self._disk_path(job_id)
+        try:
+            job = json.loads(path.read_text())
+        except (OSError, ValueError):
+            return None
+        if time.time() - job["created_at"] > self.ttl_seconds:
+            path.unlink(missing_ok=True)
+            return None
+        return job
+
+    def _expire(self) -> None:
+        now = time.time()
+        while self._jobs:
+            job_id, job = next(iter(self._jobs.items()))
+            too_old = now - job["created_at"] > self.ttl_seconds
+            if not too_old and len(self._jobs) <= self.max_jobs:
+                break
+            self._jobs.popitem(last=False)
+            if self._writer is not None:
+                self._last_write = self._writer.submit(self._disk_path(job_id).unlink, missing_ok=True)
+            if self._by_key.get(job.get("key")) == job_id:
+                del self._by_key[job["key"]]
+            self.expired += 1
+
+    def create(self, key: Optional[str] = None, **fields: Any) -> Dict[str, Any]:
+        now = time.time()
+        job = {"id": uuid.uuid4().hex, "key": key, "status": "pending",
+               "created_at": now, "updated_at": now, **fields}
+        self._jobs[job["id"]] = job
+        if key is not None:
+            self._by_key[key] = job["id"]
+        self._save(job)
+        self._expire()
+        return job
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Job of this process by id."""
+        self._expire()
+        return self._jobs.get(job_id)
+
+    async def fetch(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Job by id; jobs of other workers come from the shared directory."""
+        job = self.get(job_id)
+        if job is None and self.disk_dir is not None:
+            job = await asyncio.get_running_loop().run_in_executor(None, self._load, job_id)
+        return job
+
+    def find(self, key: str) -> Optional[Dict[str, Any]]:
+        """Latest live job created for ``key`` that has not failed or been shed."""
+        job_id = self._by_key.get(key)
+        job = self.get(job_id) if job_id else None
+        if job is None or job["status"] in ("failed", "skipped"):
+            return None
+        return job
+
+    def update(self, job_id: str, **fields: Any) -> None:
+        job = self._jobs.get(job_id)
+        if job is not None:
+            job.update(fields, updated_at=time.time())
+            self._save(job)
+
+    def stats(self) -> Dict[str, Any]:
+        counts: Dict[str, int] = {}
+        for job in self._jobs.values():
+            counts[job["status"]] = counts.get(job["status"], 0) + 1
+        return {"jobs": len(self._jobs), "max_jobs": self.max_jobs, "ttl_seconds": self.ttl_seconds,
+                "expired": self.expired, "by_status": counts,
+                "shared_dir": str(self.disk_dir) if self.disk_dir else None}
+
+
+def public_job(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Job fields returned to clients (drops internal keys)."""
+    return {k: v for k, v in job.items() if k != "key"}
+
+
+class JobRunner:
+    """
+    Runs ``handler(job, payload)`` for submitted jobs on ``workers`` asyncio
+    tasks. At most ``max_pending`` jobs wait in the queue.
+    """
+
+    def __init__(self, store: JobStore, handler: Callable[[Dict[str, Any], Any], Awaitable[Dict[str, Any]]],
+                 workers: int = 1, max_pending: int = 32):
+        self.store = store
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.max_pending = max_pending
+        self.shed = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: list = []
+
+    def _ensure_started(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._tasks and not all(t.done() for t in self._tasks):
+            return
+        self._loop = loop
+        self._queue = asyncio.Queue()
+        # Fresh context: workers must not inherit the trace of the request that started them
+        self._tasks = [loop.create_task(self._worker(), context=contextvars.Context())
+                       for _ in range(self.workers)]
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def submit(self, job: Dict[str, Any], payload: Any) -> bool:
+        """Queue ``job``; returns False (job marked ``skipped``) if the queue is full."""
+        self._ensure_started()
+        if self._queue.qsize() >= self.max_pending:
+            self.shed += 1
+            self.store.update(job["id"], status="skipped", error="Caption queue full")
+            return False
+        self._queue.put_nowait((job["id"], payload))
+        return True
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except (asyncio.CancelledError, RuntimeError):
+                pass
+        self._tasks = []
+
+    async def _worker(self) -> None:
+        while True:
+            job_id, payload = await self._queue.get()
+            job = self.store.get(job_id)
+            if job is None:
+                continue  # expired while queued
+            self.store.update(job_id, status="running")
+            try:
+                result = await self.handler(job, payload)
+                self.store.update(job_id, status="done", **result)
+            except Exception as e:
+                logger.warning("Job %s failed: %s", job_id, e)
+                self.store.update(job_id, status="failed", error=str(e))
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.store.stats(), "workers": self.workers, "pending": self.pending,
+                "max_pending": self.max_pending, "shed": self.shed}
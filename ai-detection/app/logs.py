@@ -0,0 +1,128 @@
+"""
+Non-blocking log output.
+
+Records are put on an in-memory queue by a ``QueueHandler`` on the root
+logger; a ``QueueListener`` thread formats them and writes to stdout, so a
+request never waits on a stdout write. The message is %-formatted (and a
+traceback rendered) in the calling thread, everything else happens on the
+listener thread.
+
+``LOG_FORMAT=json`` writes one JSON object per line; structured fields are
+passed as ``extra={"fields": {...}}``. ``text`` keeps the classic format.
+
+The listener thread is stopped (after draining) right before a fork and
+restarted in both processes afterwards, so ``app.serve`` never forks while
+it holds the stdout lock.
+"""
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import sys
+import time
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Optional
+
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        fields = getattr(record, "fields", None)
+        if fields:
+            entry.update(fields)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def _text_value(value: Any) -> str:
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False, default=str)
+    return str(value)
+
+
+class TextFormatter(logging.Formatter):
+    """Classic format; structured fields are appended as key=value."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = getattr(record, "fields", None)
+        if fields:
+            line += " " + " ".join(f"{k}={_text_value(v)}" for k, v in fields.items())
+        return line
+
+
+class _QueueHandler(QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Merge args now (they may be mutated later); keep `fields` structured
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class _State:
+    handler: Optional[_QueueHandler] = None
+    listener: Optional[QueueListener] = None
+    target: Optional[logging.Handler] = None
+
+
+def _start_listener() -> None:
+    _State.listener = QueueListener(_State.handler.queue, _State.target, respect_handler_level=True)
+    _State.listener.start()
+
+
+def _stop_listener() -> None:
+    if _State.listener is not None and _State.listener._thread is not None:
+        _State.listener.stop()  # drains the queue
+
+
+def _before_fork() -> None:
+    # Never fork while the listener thread may hold the stdout lock
+    if _State.handler is not None:
+        _stop_listener()
+
+
+def _after_fork() -> None:
+    if _State.handler is not None:
+        _start_listener()
+
+
+def setup_logging(level: str = "INFO", fmt: str = "json", stream: Any = None) -> None:
+    """Route all logging through the background listener (idempotent)."""
+    target = logging.StreamHandler(stream or sys.stdout)
+    target.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter(TEXT_FORMAT))
+    root = logging.getLogger()
+    root.setLevel(getattr(logging, level.upper(), logging.INFO))
+    if _State.handler is not None:
+        # Reconfigure: swap the output, keep the queue and thread
+        _State.listener.handlers = (target,)
+        _State.target = target
+        return
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    _State.target = target
+    _State.handler = _QueueHandler(queue.SimpleQueue())
+    root.addHandler(_State.handler)
+    _start_listener()
+    os.register_at_fork(before=_before_fork, after_in_parent=_after_fork, after_in_child=_after_fork)
+    atexit.register(stop_logging)
+
+
+def stop_logging() -> None:
+    """Flush queued records and stop the listener thread."""
+    _stop_listener()
@@ -1,35 +1,55 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException
+import time
+_IMPORT_STARTED = time.perf_counter()
+
+from fastapi import FastAPI, File, UploadFile, HTTPException, Request, Depends, Query, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
-from ultralytics import YOLO
 from pathlib import Path
-from typing import Dict, Any, Tuple, Optional
-import shutil
+from typing import Dict, Any, Tuple, Optional, List
+import asyncio
 import base64
-import tempfile
-import uuid
+import functools
+from collections import deque
+import json
 import os
-import time
 import logging
-import sys
-
 
-# --- Cấu hình ---
-import logging
-import sys
-import asyncio
-from asyncio import Semaphore
+from app.executor import InferenceExecutor, StageTimeout, ClientDisconnected
+from app.cpu_lanes import CpuLanes, autotune, available_cpus, candidate_lane_counts
+from app.admission import AdmissionController, AdmissionRejected, DeadlineExceeded
+from app.adaptive import AdaptivePolicy, Tier, parse_tiers
+from app.artifacts import ArtifactFetcher, link_artifact
+from app.registry import ModelRegistry, UnknownModel
+from app.responses import JSON, encode_response, negotiate
+from app.batching import MicroBatcher
+from app.archives import MemberTooLarge, iter_uploaded_images
+from app.cache import ResultCache, BlobStore, make_cache_key
+from app.limits import BodySizeLimitMiddleware
+from app.logs import setup_logging
+from app.tracing import OTLPFileExporter, TraceMiddleware, record_span, set_attribute
+from app.backends import load_yolo_model
+from app.captioning import CaptionEngine
+from app.jobs import JobStore, JobRunner, FINAL_STATUSES, public_job
+from app.translation import PhraseTranslator, contains_japanese
+from app.streaming import LatestFrameSlot, RateMeter
+from app.tiling import merge_tile_results, tile_windows
+from app.video import BackgroundFrameReader, SegmentAccumulator, VideoError, open_frames, probe_video
+from app.metrics import (IN_FLIGHT, MODEL_LOAD_SECONDS, QUEUED, count_request, observe,
+                         observe_yolo_speed, render_latest, stage_timer)
 
 
 # --- Cấu hình Logging ---
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(sys.stdout)
-    ]
-)
+# Logs are written by a background thread; LOG_FORMAT=json|text
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+# One record per request: successful requests are sampled, errors and slow ones always kept
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "1.0"))
+LOG_SLOW_MS = float(os.getenv("LOG_SLOW_MS", "2000"))
+# Optional OTLP/JSON trace file for an OpenTelemetry collector
+TRACE_EXPORT_PATH = os.getenv("TRACE_EXPORT_PATH", "")
+setup_logging(LOG_LEVEL, LOG_FORMAT)
 logger = logging.getLogger(__name__)
 
 
@@ -38,11 +58,143 @@ MODEL_PATH = os.getenv("MODEL_PATH", "models/yolov8s.pt")
 ALLOWED_ORIGINS = os.getenv("CORS_ORIGINS", "*")
 # Disable BLIP-2 by default for AWS to save cost (set to "true" to enable)
 ENABLE_CAPTIONING = os.getenv("ENABLE_CAPTIONING", "false").lower() == "true"
+# BLIP checkpoint, variant (fp32 or int8 dynamic quantization) and generation bounds
+CAPTION_MODEL = os.getenv("CAPTION_MODEL", "Salesforce/blip-image-captioning-base")
+CAPTION_VARIANT = os.getenv("CAPTION_VARIANT", "fp32").lower()
+CAPTION_MAX_NEW_TOKENS = int(os.getenv("CAPTION_MAX_NEW_TOKENS", "30"))
+CAPTION_NUM_BEAMS = int(os.getenv("CAPTION_NUM_BEAMS", "1"))
+# Asynchronous captioning (?caption=async): workers, queue bound, stored jobs and their TTL
+CAPTION_JOB_WORKERS = int(os.getenv("CAPTION_JOB_WORKERS", "1"))
+CAPTION_JOB_QUEUE = int(os.getenv("CAPTION_JOB_QUEUE", "32"))
+CAPTION_JOB_MAX = int(os.getenv("CAPTION_JOB_MAX", "1000"))
+CAPTION_JOB_TTL_SECONDS = float(os.getenv("CAPTION_JOB_TTL_SECONDS", "600"))
+# Long side of the image a queued caption job keeps (re-encoded JPEG; BLIP's input is 384 px)
+CAPTION_JOB_IMAGE_SIDE = int(os.getenv("CAPTION_JOB_IMAGE_SIDE", "384"))
+# Caption jobs from concurrent requests are batched like YOLO
+CAPTION_BATCH_MAX_SIZE = int(os.getenv("CAPTION_BATCH_MAX_SIZE", "4"))
+CAPTION_BATCH_MAX_WAIT_MS = float(os.getenv("CAPTION_BATCH_MAX_WAIT_MS", "20"))
+# English → Japanese vocabulary (JSON with "phrases" and "objects"); empty = bundled file
+TRANSLATIONS_PATH = os.getenv("TRANSLATIONS_PATH", "")
+# Micro-batching for YOLO: dispatch after N images or T milliseconds
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "8"))
+BATCH_MAX_WAIT_MS = float(os.getenv("BATCH_MAX_WAIT_MS", "10"))
 # Maximum concurrent requests to prevent OOM
 MAX_CONCURRENT_REQUESTS = int(os.getenv("MAX_CONCURRENT_REQUESTS", "3"))
+# Requests allowed to wait for a slot; beyond this /predict/ answers 429 + Retry-After
+MAX_QUEUED_REQUESTS = int(os.getenv("MAX_QUEUED_REQUESTS", str(4 * MAX_CONCURRENT_REQUESTS)))
+# Deadline applied when the client sends no X-Request-Timeout-Ms header (0 = none)
+DEFAULT_REQUEST_TIMEOUT_SECONDS = float(os.getenv("DEFAULT_REQUEST_TIMEOUT_SECONDS", "0"))
+# Inference backend for YOLO: torch, onnx or openvino; precision fp32, fp16 or int8
+MODEL_BACKEND = os.getenv("MODEL_BACKEND", "torch").lower()
+MODEL_PRECISION = os.getenv("MODEL_PRECISION", "fp32").lower()
+# YOLO input resolution (longest side, pixels)
+MODEL_IMGSZ = int(os.getenv("MODEL_IMGSZ", "640"))
+# Model registry (/predict/?model=<name>): checkpoints in MODELS_DIR loaded on demand,
+# at most N models / MB resident (LRU), reloaded when the file changes.
+# MODEL_PRELOAD names are loaded at startup (before the pre-fork, so shared)
+MODELS_DIR = os.getenv("MODELS_DIR", "models")
+MODEL_REGISTRY_MAX_MODELS = int(os.getenv("MODEL_REGISTRY_MAX_MODELS", "2"))
+MODEL_REGISTRY_MAX_BYTES = int(os.getenv("MODEL_REGISTRY_MAX_MB", "0")) * 1024 * 1024
+MODEL_RELOAD_CHECK_SECONDS = float(os.getenv("MODEL_RELOAD_CHECK_SECONDS", "2"))
+MODEL_PRELOAD = [name.strip() for name in os.getenv("MODEL_PRELOAD", "").split(",") if name.strip()]
+# Checkpoint fetched from S3 at startup when MODEL_PATH is not a local file (s3://bucket/key);
+# parallel ranged GETs, SHA-256 verified, kept in a content-addressed cache across restarts
+S3_MODEL_URI = os.getenv("S3_MODEL_URI", "")
+S3_MODEL_SHA256 = os.getenv("S3_MODEL_SHA256", "")
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL", "")
+ARTIFACT_CACHE_DIR = os.getenv("ARTIFACT_CACHE_DIR", os.path.join(MODELS_DIR, ".artifact-cache"))
+ARTIFACT_PART_BYTES = int(os.getenv("ARTIFACT_PART_MB", "8")) * 1024 * 1024
+ARTIFACT_CONCURRENCY = int(os.getenv("ARTIFACT_CONCURRENCY", "8"))
+# Refuse a download with nothing to verify it against (no sha256, multipart ETag)
+ARTIFACT_REQUIRE_CHECKSUM = os.getenv("ARTIFACT_REQUIRE_CHECKSUM", "false").lower() == "true"
+# Warmup passes through each model at startup before /readyz reports ready (0 = skip)
+WARMUP_ITERATIONS = int(os.getenv("WARMUP_ITERATIONS", "1"))
+# Load-adaptive tiers (name=path@imgsz, most accurate first; empty path = MODEL_PATH).
+# Under load (queue depth / latency EWMA above the HIGH thresholds) /predict/
+# moves to the next tier; it moves back after HOLD seconds below the LOW ones.
+# Off unless ADAPTIVE_TIERS is set: it trades accuracy for latency, so it is opt-in
+ADAPTIVE_INFERENCE = os.getenv("ADAPTIVE_INFERENCE",
+                               "true" if os.getenv("ADAPTIVE_TIERS") else "false").lower() == "true"
+ADAPTIVE_TIERS = os.getenv("ADAPTIVE_TIERS", "") or (
+    f"full=@{MODEL_IMGSZ},reduced=@{max(160, MODEL_IMGSZ * 3 // 4 // 32 * 32)},low=@{max(160, MODEL_IMGSZ // 2 // 32 * 32)}"
+)
+ADAPTIVE_QUEUE_HIGH = int(os.getenv("ADAPTIVE_QUEUE_HIGH", str(max(1, MAX_QUEUED_REQUESTS // 2))))
+ADAPTIVE_QUEUE_LOW = int(os.getenv("ADAPTIVE_QUEUE_LOW", "0"))
+ADAPTIVE_LATENCY_HIGH_MS = float(os.getenv("ADAPTIVE_LATENCY_HIGH_MS", "3000"))
+ADAPTIVE_LATENCY_LOW_MS = float(os.getenv("ADAPTIVE_LATENCY_LOW_MS", "1000"))
+ADAPTIVE_HOLD_SECONDS = float(os.getenv("ADAPTIVE_HOLD_SECONDS", "10"))
+# Bounds for the per-request ?imgsz= hint (rounded down to a multiple of 32)
+IMGSZ_HINT_MIN = 160
+IMGSZ_HINT_MAX = 1280
+# Upload size limits, enforced while the body streams in (0 = no limit)
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_MB", "50")) * 1024 * 1024
+MAX_BATCH_UPLOAD_BYTES = int(os.getenv("MAX_BATCH_UPLOAD_MB", "500")) * 1024 * 1024
+# Cap on decoded resolution even when a full-size annotated image is requested (0 = no cap)
+DECODE_MAX_SIDE = int(os.getenv("DECODE_MAX_SIDE", "4096"))
+# Tiled inference for very large images: tile size / overlap (per-request
+# defaults), auto-enable above this long side (0 = only with ?tile=on),
+# decode cap and max tiles per image, NMS threshold when merging tiles
+TILE_SIZE = int(os.getenv("TILE_SIZE", "1024"))
+TILE_OVERLAP = float(os.getenv("TILE_OVERLAP", "0.2"))
+TILE_AUTO_MIN_SIDE = int(os.getenv("TILE_AUTO_MIN_SIDE", "3000"))
+TILE_MAX_SIDE = int(os.getenv("TILE_MAX_SIDE", "8192"))
+TILE_MAX_TILES = int(os.getenv("TILE_MAX_TILES", "128"))
+TILE_NMS_THRESHOLD = float(os.getenv("TILE_NMS_THRESHOLD", "0.5"))
+# Largest original size a client may declare for a pre-resized upload (?orig_width=&orig_height=)
+PRESIZED_MAX_SIDE = 65535
+# /predict/batch: max images per request and images in flight at once
+BATCH_MAX_IMAGES = int(os.getenv("BATCH_MAX_IMAGES", "500"))
+BATCH_WINDOW = int(os.getenv("BATCH_WINDOW", str(2 * BATCH_MAX_SIZE)))
+# /ws/detect live streams: concurrent connections and max encoded frame size
+MAX_STREAMS = int(os.getenv("MAX_STREAMS", "4"))
+MAX_STREAM_FRAME_BYTES = int(os.getenv("MAX_STREAM_FRAME_MB", "5")) * 1024 * 1024
+# /predict/video: upload limit, decoder (auto/ffmpeg/opencv), default sampling,
+# frames buffered between decoder and YOLO, and a cap on analyzed frames
+MAX_VIDEO_UPLOAD_BYTES = int(os.getenv("MAX_VIDEO_UPLOAD_MB", "500")) * 1024 * 1024
+VIDEO_DECODER = os.getenv("VIDEO_DECODER", "auto").lower()
+VIDEO_SAMPLE_FPS = float(os.getenv("VIDEO_SAMPLE_FPS", "2"))
+VIDEO_BUFFER_FRAMES = int(os.getenv("VIDEO_BUFFER_FRAMES", "4"))
+VIDEO_MAX_FRAMES = int(os.getenv("VIDEO_MAX_FRAMES", "3600"))
+# Result cache: in-memory LRU (entries / bytes) + optional disk tier
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "256"))
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_MB", "256")) * 1024 * 1024
+RESULT_CACHE_DIR = os.getenv("RESULT_CACHE_DIR", "")
+RESULT_CACHE_DISK_MAX_BYTES = int(os.getenv("RESULT_CACHE_DISK_MAX_MB", "1024")) * 1024 * 1024
+# Annotated image rendering defaults (overridable per request)
+RENDER_QUALITY = int(os.getenv("RENDER_QUALITY", "90"))
+RENDER_MAX_SIZE = int(os.getenv("RENDER_MAX_SIZE", "0"))
+# Memory for annotated images served from /predict/images/{id}
+ANNOTATED_IMAGE_STORE_BYTES = int(os.getenv("ANNOTATED_IMAGE_STORE_MB", "64")) * 1024 * 1024
+# Directory shared by the workers of one server (app.serve sets it when --workers > 1):
+# annotated images and caption jobs are visible to every worker, not only the one that made them
+SHARED_STATE_DIR = os.getenv("SHARED_STATE_DIR", "")
+# Worker threads running CPU stages off the event loop
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", str(MAX_CONCURRENT_REQUESTS)))
+# CPU lanes for YOLO/BLIP: 0 = shared pool, N = N lanes pinned to disjoint cores, auto = tuned at startup
+INFERENCE_LANES = os.getenv("INFERENCE_LANES", "0").lower()
+# Cores reserved for a BLIP lane (0 = captions run in the inference lanes)
+CAPTION_LANE_CORES = int(os.getenv("CAPTION_LANE_CORES", "0"))
+# torch intra-op threads, set once for the process (0 = cores of the smallest lane)
+LANE_TORCH_THREADS = int(os.getenv("LANE_TORCH_THREADS", "0"))
+# auto: best throughput whose median latency is within this factor of the fastest lane count
+LANE_AUTOTUNE_LATENCY_SLACK = float(os.getenv("LANE_AUTOTUNE_LATENCY_SLACK", "1.5"))
+# Per-stage timeouts in seconds (0 = no limit)
+STAGE_TIMEOUTS = {
+    "decode": float(os.getenv("DECODE_TIMEOUT_SECONDS", "10")),
+    "yolo": float(os.getenv("YOLO_TIMEOUT_SECONDS", "60")),
+    "caption": float(os.getenv("CAPTION_TIMEOUT_SECONDS", "120")),
+    "render": float(os.getenv("RENDER_TIMEOUT_SECONDS", "10")),
+}
 
 
 # --- Định nghĩa response ---
+class DetectionBox(BaseModel):
+    xyxy: List[float]  # [x1, y1, x2, y2] theo pixel của ảnh gốc
+    class_id: int
+    class_name: str
+    confidence: float
+
+
 class PredictionResponse(BaseModel):
     filename: str
     description: str  # Mô tả chi tiết bằng tiếng Nhật
@@ -51,53 +203,344 @@ class PredictionResponse(BaseModel):
     object_details: Dict[str, int]  # Chi tiết từng loại
     processing_time: float  # Thời gian xử lý (giây)
     inference_speed: Dict[str, float]  # Tốc độ inference (ms)
-    image_base64: str
+    image_base64: str  # Rỗng nếu render=none hoặc inline_image=false
+    boxes: List[DetectionBox] = []  # Bounding boxes để client tự vẽ overlay
+    image_url: Optional[str] = None  # URL ảnh annotated (khi inline_image=false)
+    caption_job_id: Optional[str] = None  # Job caption (khi caption=async), xem /captions/{id}
+    caption_status: Optional[str] = None  # pending/running/done/skipped/disabled
+    tiles: Optional[int] = None  # Số tile khi dùng tiled inference
+    served_tier: Optional[str] = None  # Tier (model + imgsz) đã xử lý request
+    imgsz: Optional[int] = None  # Kích thước input YOLO thực tế
+    model: Optional[str] = None  # Model đã xử lý request (tên checkpoint)
+
+
+RENDER_MEDIA_TYPES = {"jpeg": "image/jpeg", "webp": "image/webp"}
+
+
+class PredictOptions:
+    """Tham số query của /predict/ (render mode, chất lượng, kích thước)."""
+
+    def __init__(
+        self,
+        render: str = Query("jpeg", regex="^(none|jpeg|webp)$",
+                            description="Ảnh annotated: none, jpeg hoặc webp"),
+        quality: int = Query(RENDER_QUALITY, ge=1, le=100, description="Chất lượng JPEG/WebP"),
+        max_size: int = Query(RENDER_MAX_SIZE, ge=0,
+                              description="Cạnh dài tối đa của ảnh annotated (0 = giữ nguyên)"),
+        inline_image: bool = Query(True, description="Nhúng ảnh base64 trong JSON; false = trả về image_url"),
+        caption: str = Query("sync", regex="^(sync|async|none)$",
+                             description="Caption BLIP: sync (chờ), async (job riêng) hoặc none"),
+        tile: str = Query("auto", regex="^(auto|on|off)$",
+                          description="Tiled inference cho ảnh lớn: auto (theo TILE_AUTO_MIN_SIDE), on hoặc off"),
+        tile_size: int = Query(TILE_SIZE, ge=256, le=4096, description="Cạnh của mỗi tile (pixel)"),
+        tile_overlap: float = Query(TILE_OVERLAP, ge=0.0, le=0.5, description="Tỉ lệ chồng lấn giữa các tile"),
+        imgsz: int = Query(0, ge=0, le=IMGSZ_HINT_MAX,
+                           description="Kích thước input YOLO mong muốn (0 = theo tier; khi quá tải bị giới hạn bởi tier)"),
+        tier: str = Query("auto", description="auto (theo tải) hoặc tên tier trong ADAPTIVE_TIERS"),
+        model: str = Query("", description="Tên model trong MODELS_DIR, ví dụ yolov8n (rỗng = model mặc định)"),
+        orig_width: int = Query(0, ge=0, le=PRESIZED_MAX_SIDE,
+                                description="Chiều rộng ảnh gốc khi client đã thu nhỏ ảnh trước khi gửi (0 = ảnh gốc)"),
+        orig_height: int = Query(0, ge=0, le=PRESIZED_MAX_SIDE, description="Chiều cao ảnh gốc (đi cùng orig_width)"),
+    ):
+        self.render = render
+        self.quality = quality
+        self.max_size = max_size
+        self.inline_image = inline_image
+        self.caption = caption
+        self.tile = tile
+        self.tile_size = tile_size
+        self.tile_overlap = tile_overlap
+        self.imgsz = imgsz
+        self.tier = tier
+        self.model = model
+        self.orig_width = orig_width
+        self.orig_height = orig_height
+
+    @property
+    def presized(self) -> bool:
+        return bool(self.orig_width or self.orig_height)
+
+    def presized_scale(self, size: Optional[Tuple[int, int]]) -> float:
+        """
+        Ảnh đã được client thu nhỏ: tỉ lệ kích thước gốc / kích thước gửi lên
+        (cạnh dài) để đưa box về ảnh gốc. 400 nếu kích thước khai báo không khớp
+        với ảnh (thiếu một chiều, nhỏ hơn ảnh gửi lên hoặc khác tỉ lệ khung).
+        """
+        if not (self.orig_width and self.orig_height):
+            raise HTTPException(status_code=400, detail="orig_width and orig_height must be given together")
+        if not size:
+            raise HTTPException(status_code=400, detail="Cannot decode image. Please upload a valid image file.")
+        width, height = size
+        scale_x, scale_y = self.orig_width / width, self.orig_height / height
+        # Each side was rounded to whole pixels when resizing
+        tolerance = 0.01 + 1.0 / min(width, height)
+        if min(scale_x, scale_y) < 1 - tolerance or abs(scale_x - scale_y) > max(scale_x, scale_y) * tolerance:
+            raise HTTPException(status_code=400, detail=f"orig_width x orig_height ({self.orig_width}x"
+                                f"{self.orig_height}) does not match the uploaded {width}x{height} image")
+        return max(self.orig_width, self.orig_height) / max(width, height)
+
+    def use_tiling(self, size: Optional[Tuple[int, int]]) -> bool:
+        """Tiled inference cho ảnh có kích thước `size` (width, height) hay không."""
+        if self.tile == "off" or not size:
+            return False
+        long_side = max(size)
+        if self.tile == "on":
+            return long_side > self.tile_size
+        return bool(TILE_AUTO_MIN_SIDE) and long_side >= TILE_AUTO_MIN_SIDE
+
+    def decode_side(self, imgsz: int = MODEL_IMGSZ) -> int:
+        """Cạnh dài cần decode: đủ cho YOLO và cho ảnh annotated được yêu cầu (0 = nguyên gốc)."""
+        if self.render == "none":
+            target = imgsz
+        elif self.max_size:
+            target = max(imgsz, self.max_size)
+        else:
+            target = 0
+        if DECODE_MAX_SIDE:
+            target = min(target, DECODE_MAX_SIDE) if target else DECODE_MAX_SIDE
+        return target
+
+    def cache_params(self) -> Dict[str, Any]:
+        return {"render": self.render, "quality": self.quality,
+                "max_size": self.max_size, "inline_image": self.inline_image,
+                "caption": self.caption, "tile": self.tile, "tile_size": self.tile_size,
+                "tile_overlap": self.tile_overlap, "orig_width": self.orig_width,
+                "orig_height": self.orig_height}
 
 
 app = FastAPI()
 
+# Translation engine, compiled once at import time
+ja_translator = PhraseTranslator.from_file(TRANSLATIONS_PATH or None)
+
 # Models loaded at startup
 model = None
-captioner = None
-caption_processor = None
-# Semaphore for rate limiting
-request_semaphore = Semaphore(MAX_CONCURRENT_REQUESTS)
+# Backend actually serving YOLO (may differ from MODEL_BACKEND after a fallback)
+model_backend_info: Dict[str, Any] = {}
+caption_engine = CaptionEngine(CAPTION_MODEL, CAPTION_VARIANT, CAPTION_MAX_NEW_TOKENS, CAPTION_NUM_BEAMS)
+# Admission control: bounded concurrency + bounded queue, deadline-aware
+admission = AdmissionController(MAX_CONCURRENT_REQUESTS, MAX_QUEUED_REQUESTS)
+# Tier selection for /predict/ from queue depth and recent latency
+adaptive_policy = AdaptivePolicy(
+    parse_tiers(ADAPTIVE_TIERS, MODEL_PATH), ADAPTIVE_QUEUE_HIGH, ADAPTIVE_QUEUE_LOW,
+    ADAPTIVE_LATENCY_HIGH_MS / 1000.0, ADAPTIVE_LATENCY_LOW_MS / 1000.0, ADAPTIVE_HOLD_SECONDS,
+    enabled=ADAPTIVE_INFERENCE,
+)
+# Models of tiers that do not use MODEL_PATH (path -> model)
+tier_models: Dict[str, Any] = {}
+# Other checkpoints, loaded per request (?model=) and evicted LRU
+model_registry = ModelRegistry(
+    MODELS_DIR, lambda path: load_yolo_model(path, MODEL_BACKEND, MODEL_PRECISION, MODEL_IMGSZ)[0],
+    MODEL_REGISTRY_MAX_MODELS, MODEL_REGISTRY_MAX_BYTES, MODEL_RELOAD_CHECK_SECONDS,
+)
+# S3 model downloads (client created on first use)
+artifact_fetcher = ArtifactFetcher(ARTIFACT_CACHE_DIR, part_size=ARTIFACT_PART_BYTES,
+                                   concurrency=ARTIFACT_CONCURRENCY, endpoint_url=S3_ENDPOINT_URL,
+                                   require_checksum=ARTIFACT_REQUIRE_CHECKSUM)
+# Thread pool for blocking inference stages
+inference_executor = InferenceExecutor(INFERENCE_WORKERS, STAGE_TIMEOUTS)
+# YOLO/BLIP batches run in pinned CPU lanes when enabled (decode/render stay on the pool above)
+if INFERENCE_LANES in ("", "0"):
+    lane_executor = inference_executor
+else:
+    lane_executor = CpuLanes(INFERENCE_WORKERS if INFERENCE_LANES == "auto" else int(INFERENCE_LANES),
+                             CAPTION_LANE_CORES, LANE_TORCH_THREADS, STAGE_TIMEOUTS)
+# Measurements of the last lane autotune (INFERENCE_LANES=auto)
+lane_autotune_results: List[Dict[str, Any]] = []
+# Annotated images fetched on demand via /predict/images/{id}
+annotated_images = BlobStore(ANNOTATED_IMAGE_STORE_BYTES,
+                             os.path.join(SHARED_STATE_DIR, "images") if SHARED_STATE_DIR else None)
+# Content-addressed cache of /predict/ results
+result_cache = ResultCache(RESULT_CACHE_MAX_ENTRIES, RESULT_CACHE_MAX_BYTES,
+                           RESULT_CACHE_DIR or None, RESULT_CACHE_DISK_MAX_BYTES)
 
 
-@app.on_event("startup")
-async def load_model_on_startup():
-    global model, captioner, caption_processor
-    import logging
-    
-    logging.basicConfig(level=logging.INFO)
-    logger = logging.getLogger(__name__)
-    
+# True once load_models() ran (in this process or in the pre-fork parent, see app.serve)
+models_preloaded = False
+# Flips to True after models are loaded and warmed up (GET /readyz)
+app_ready = False
+# Seconds spent in each startup phase (import, model loads, warmup), logged and shown by /readyz
+startup_timings: Dict[str, float] = {}
+_startup_task: Optional[asyncio.Future] = None
+
+
+def fetch_model_artifact() -> None:
+    """
+    S3_MODEL_URI: tải checkpoint (hoặc lấy từ cache) rồi trỏ MODEL_PATH tới nó
+    bằng symlink. Một file thật đã có ở MODEL_PATH thì được giữ nguyên.
+    """
+    target = Path(MODEL_PATH)
+    if target.is_file() and not target.is_symlink():
+        logger.info("Using existing model at %s (S3_MODEL_URI ignored)", MODEL_PATH)
+        return
+    start = time.perf_counter()
+    try:
+        blob = artifact_fetcher.fetch(S3_MODEL_URI, S3_MODEL_SHA256 or None)
+        link_artifact(blob, target)
+    except Exception as e:
+        logger.error("Failed to fetch model from %s: %s", S3_MODEL_URI, e)
+        return
+    startup_timings["model_fetch"] = time.perf_counter() - start
+    logger.info("✓ Model %s -> %s in %.2fs", S3_MODEL_URI, MODEL_PATH, startup_timings["model_fetch"])
+
+
+def load_models():
+    """
+    Load YOLO and (optionally) BLIP. Called by the startup hook, or once in
+    the parent process before workers fork so the weights are shared.
+    """
+    global model, model_backend_info, models_preloaded
+
+    if S3_MODEL_URI:
+        fetch_model_artifact()
+
     # Load YOLO
     try:
-        from ultralytics import YOLO
-        logger.info("Loading YOLO model from %s...", MODEL_PATH)
-        model = YOLO(MODEL_PATH)
-        logger.info("✓ YOLO model loaded successfully")
+        logger.info("Loading YOLO model from %s (backend=%s, precision=%s)...",
+                    MODEL_PATH, MODEL_BACKEND, MODEL_PRECISION)
+        load_start = time.perf_counter()
+        model, model_backend_info = load_yolo_model(MODEL_PATH, MODEL_BACKEND, MODEL_PRECISION, MODEL_IMGSZ)
+        startup_timings["yolo_load"] = time.perf_counter() - load_start
+        MODEL_LOAD_SECONDS.labels("yolo").set(startup_timings["yolo_load"])
+        logger.info("✓ YOLO model loaded successfully (%s)", model_backend_info)
     except Exception as e:
         logger.error("Failed to load YOLO model: %s", e, exc_info=True)
         # Don't raise - let server start even if YOLO fails
+
+    # Lighter models of the adaptive tiers
+    for tier in list(adaptive_policy.tiers):
+        if tier.model_path == MODEL_PATH or tier.model_path in tier_models:
+            continue
+        try:
+            tier_models[tier.model_path], _ = load_yolo_model(tier.model_path, MODEL_BACKEND, MODEL_PRECISION,
+                                                              tier.imgsz)
+            logger.info("✓ Tier '%s' model loaded from %s", tier.name, tier.model_path)
+        except Exception as e:
+            logger.warning("Cannot load model for tier '%s' (%s); tier disabled", tier.name, e)
+            adaptive_policy.drop_tier(tier.name)
+
+    for name in MODEL_PRELOAD:
+        try:
+            model_registry.get(name)
+        except Exception as e:
+            logger.warning("Cannot preload model '%s': %s", name, e)
     
     # Load BLIP-2 for image captioning (optional, can be disabled via env var)
     if ENABLE_CAPTIONING:
         try:
-            from transformers import BlipProcessor, BlipForConditionalGeneration
-            logger.info("Loading BLIP captioning model (this may take 1-2 minutes on first run)...")
-            caption_processor = BlipProcessor.from_pretrained("Salesforce/blip-image-captioning-base")
-            captioner = BlipForConditionalGeneration.from_pretrained("Salesforce/blip-image-captioning-base")
-            logger.info("✓ BLIP captioning model loaded successfully")
+            logger.info("Loading BLIP captioning model %s (%s) (this may take 1-2 minutes on first run)...",
+                        CAPTION_MODEL, CAPTION_VARIANT)
+            caption_engine.load()
+            startup_timings["caption_load"] = caption_engine.load_seconds
+            MODEL_LOAD_SECONDS.labels("caption").set(caption_engine.load_seconds)
+            logger.info("✓ BLIP captioning model loaded successfully in %.1fs", caption_engine.load_seconds)
         except Exception as e:
             logger.warning("Failed to load BLIP captioning model: %s. Captioning will be disabled.", e, exc_info=True)
-            captioner = None
-            caption_processor = None
+            caption_engine.unload()
     else:
         logger.info("Image captioning disabled via ENABLE_CAPTIONING=false")
-    
-    logger.info("Startup complete. PORT=%s", os.getenv("PORT", "8000"))
+    models_preloaded = True
+
+
+def warm_up_models(iterations: int = WARMUP_ITERATIONS) -> Dict[str, float]:
+    """
+    Chạy thử decode → YOLO → render → BLIP ở độ phân giải phục vụ để nạp thư viện,
+    khởi tạo thread pool của torch và chọn kernel trước request thật đầu tiên.
+    Trả về thời gian (giây) của từng bước.
+    """
+    import numpy as np
+    import cv2
+
+    timings: Dict[str, float] = {}
+    sample = np.full((MODEL_IMGSZ, MODEL_IMGSZ, 3), 114, dtype=np.uint8)
+    cv2.rectangle(sample, (MODEL_IMGSZ // 4, MODEL_IMGSZ // 4), (MODEL_IMGSZ // 2, MODEL_IMGSZ // 2),
+                  (30, 60, 200), -1)
+
+    start = time.perf_counter()
+    ok, buf = cv2.imencode(".jpg", sample)
+    img, _ = decode_image(buf.tobytes(), MODEL_IMGSZ)
+    timings["warmup_decode"] = time.perf_counter() - start
+
+    if model is not None:
+        start = time.perf_counter()
+        for _ in range(iterations):
+            result = run_yolo_batch([img])[0]
+        timings["warmup_yolo"] = time.perf_counter() - start
+        # Lower tiers run only under load, when a cold first call hurts most
+        start = time.perf_counter()
+        for tier in adaptive_policy.tiers[1:]:
+            run_yolo_batch([img], tier.model_path, tier.imgsz)
+        timings["warmup_tiers"] = time.perf_counter() - start
+        start = time.perf_counter()
+        render_annotated_image(result)
+        timings["warmup_render"] = time.perf_counter() - start
+
+    if caption_engine.available:
+        start = time.perf_counter()
+        for _ in range(iterations):
+            caption_engine.caption_batch([img])
+        timings["warmup_caption"] = time.perf_counter() - start
+
+    if model is not None and INFERENCE_LANES == "auto":
+        start = time.perf_counter()
+        tune_cpu_lanes(img)
+        timings["lane_autotune"] = time.perf_counter() - start
+    return timings
+
+
+def tune_cpu_lanes(img) -> int:
+    """
+    INFERENCE_LANES=auto: đo vài số lane (1, 2, 4, ... ≤ INFERENCE_WORKERS) với
+    ảnh mẫu và giữ cấu hình có throughput cao nhất mà latency vẫn chấp nhận được.
+    """
+    cores = max(1, len(available_cpus()) - CAPTION_LANE_CORES)
+    lanes, results = autotune(lambda: run_yolo_batch([img]), candidate_lane_counts(cores, INFERENCE_WORKERS),
+                              CAPTION_LANE_CORES, LANE_TORCH_THREADS, latency_slack=LANE_AUTOTUNE_LATENCY_SLACK)
+    lane_autotune_results[:] = results
+    lane_executor.configure(lanes)
+    logger.info("CPU lanes autotuned: %d lane(s) (%s)", lanes,
+                "; ".join(f"{r['lanes']} lanes: {r['throughput']} img/s, p50 {r['p50_ms']} ms" for r in results))
+    return lanes
+
+
+async def prepare_models():
+    """Load (unless pre-loaded) and warm up the models, then mark the app ready."""
+    global app_ready
+    started = time.perf_counter()
+    try:
+        if not models_preloaded:
+            await inference_executor.run("load", load_models)
+        if model is not None and WARMUP_ITERATIONS > 0:
+            startup_timings.update(await inference_executor.run("warmup", warm_up_models))
+        app_ready = model is not None
+    except Exception as e:
+        logger.error("Startup preparation failed: %s", e, exc_info=True)
+    startup_timings["prepare"] = time.perf_counter() - started
+    logger.info("Startup timing (ready=%s): %s", app_ready,
+                ", ".join(f"{k}={v:.2f}s" for k, v in startup_timings.items()))
+
+
+@app.on_event("startup")
+async def load_model_on_startup():
+    global _startup_task
+    # Threads are started per process (never before a fork)
+    inference_executor.start()
+    lane_executor.start()
+    # Load and warm up in the background: /livez answers at once, /readyz flips when done
+    _startup_task = asyncio.ensure_future(prepare_models())
+    logger.info("Startup complete, warming up in background. PORT=%s", os.getenv("PORT", "8000"))
+
+
+@app.on_event("shutdown")
+async def shutdown_executor():
+    if _startup_task is not None and not _startup_task.done():
+        _startup_task.cancel()
+    for batcher in list(yolo_batchers.values()):
+        await batcher.stop()
+    await caption_batcher.stop()
+    await caption_job_runner.stop()
+    inference_executor.shutdown()
+    lane_executor.shutdown()
 
 # CORS
 if ALLOWED_ORIGINS == "*":
@@ -106,157 +549,113 @@ else:
     # phân tách danh sách origin nếu cần
     allow_origins = [o.strip() for o in ALLOWED_ORIGINS.split(",") if o.strip()]
 
+# Added before CORS so that 413 responses still carry CORS headers
+app.add_middleware(
+    BodySizeLimitMiddleware,
+    max_bytes=MAX_UPLOAD_BYTES,
+    path_limits={"/predict/batch": MAX_BATCH_UPLOAD_BYTES, "/predict/video": MAX_VIDEO_UPLOAD_BYTES},
+)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=allow_origins,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Trace-Id", "X-Cache"],
+)
+
+# Outermost: the trace covers the whole request, including 413/CORS responses
+app.add_middleware(
+    TraceMiddleware,
+    sample_rate=LOG_SAMPLE_RATE,
+    slow_ms=LOG_SLOW_MS,
+    exporter=OTLPFileExporter(TRACE_EXPORT_PATH) if TRACE_EXPORT_PATH else None,
 )
 
 
 # Health check endpoint for AWS ECS/Fargate
 @app.get("/health")
 async def health_check():
-    """AWS health check endpoint - returns 200 if service is healthy"""
+    """AWS health check endpoint - returns 200 while the process is up (see /readyz for readiness)"""
     return {
         "status": "healthy",
+        "ready": app_ready,
         "model_loaded": model is not None,
+        "model_backend": model_backend_info.get("backend"),
+        "model_precision": model_backend_info.get("precision"),
         "captioning_enabled": ENABLE_CAPTIONING,
-        "captioning_available": captioner is not None
+        "captioning_available": caption_engine.available,
+        "caption_variant": caption_engine.variant,
+        # Serving resolution: clients resize uploads to this long side (see frontend)
+        "model_imgsz": MODEL_IMGSZ,
     }
 
 
-# Simple request logging middleware to help debug Method/Path/Origin on Render
-@app.middleware("http")
-async def log_requests(request, call_next):
-    import logging
-    client = request.client.host if request.client else "-"
-    logging.info("Incoming request %s %s from %s", request.method, request.url.path, client)
-    logging.debug("Request headers: %s", dict(request.headers))
-    response = await call_next(request)
-    logging.info("Response %s %s -> %s", request.method, request.url.path, response.status_code)
-    return response
+@app.get("/livez")
+async def livez():
+    """Liveness: the process and its event loop respond (models may still be loading)."""
+    return {"status": "alive"}
+
+
+@app.get("/readyz")
+async def readyz():
+    """Readiness: 200 only after the models are loaded and warmed up, 503 before."""
+    body = {
+        "status": "ready" if app_ready else "starting",
+        "model_loaded": model is not None,
+        "captioning_available": caption_engine.available,
+        "startup_timing": {k: round(v, 3) for k, v in startup_timings.items()},
+    }
+    return JSONResponse(body, status_code=200 if app_ready else 503)
 
 
 def translate_caption_to_japanese(english_caption: str) -> str:
     """
-    Dịch caption tiếng Anh sang tiếng Nhật bằng từ điển và pattern matching.
+    Dịch caption tiếng Anh sang tiếng Nhật bằng từ điển cụm từ (khớp dài nhất,
+    theo ranh giới từ). Giữ nguyên tiếng Anh nếu không dịch được từ nào.
     """
-    # Common English -> Japanese translations
-    translations = {
-        # Scenes
-        "a photo of": "", "an image of": "", "a picture of": "",
-        "street": "通り", "road": "道路", "city": "都市", "town": "町",
-        "beach": "ビーチ", "ocean": "海", "mountain": "山", "forest": "森",
-        "park": "公園", "building": "建物", "house": "家",
-        "room": "部屋", "office": "オフィス", "kitchen": "キッチン",
-        
-        # Actions
-        "walking": "歩いている", "running": "走っている", "sitting": "座っている",
-        "standing": "立っている", "playing": "遊んでいる", "eating": "食べている",
-        "driving": "運転している", "riding": "乗っている",
-        
-        # Descriptions
-        "busy": "賑やかな", "crowded": "混雑した", "empty": "空の",
-        "sunny": "晴れた", "cloudy": "曇りの", "rainy": "雨の",
-        "beautiful": "美しい", "old": "古い", "new": "新しい",
-        "large": "大きな", "small": "小さな",
-        
-        # Conjunctions
-        " with ": "と", " and ": "と", " on ": "の上に",
-        " in ": "の中に", " at ": "で", " near ": "の近くに",
-        
-        # Objects (common ones)
-        "people": "人々", "person": "人", "man": "男性", "woman": "女性",
-        "child": "子供", "children": "子供たち",
-        "car": "車", "cars": "車", "bus": "バス", "truck": "トラック",
-        "bicycle": "自転車", "motorcycle": "バイク",
-        "dog": "犬", "cat": "猫", "bird": "鳥",
-        "tree": "木", "trees": "木々", "grass": "草",
-        "sky": "空", "cloud": "雲", "clouds": "雲",
-        "water": "水", "river": "川", "lake": "湖",
-    }
-    
-    # Clean and translate
-    result = english_caption.lower().strip()
-    
-    # Replace patterns
-    for en, ja in translations.items():
-        result = result.replace(en, ja)
-    
-    # Capitalize first letter if it's a sentence
-    if result and not any(char in result for char in "あいうえおかきくけこ"):
+    result = ja_translator.translate(english_caption)
+    if not contains_japanese(result):
         # If no Japanese characters yet, keep original
         return english_caption.strip()
-    
-    return result.strip()
+    return result
 
 
-def generate_scene_description(img_array, detected_objects: Dict[str, int]) -> str:
+def generate_caption(img_array) -> Tuple[str, str]:
     """
-    Tạo mô tả chi tiết khung cảnh ảnh bằng tiếng Nhật.
-    Kết hợp BLIP caption (dịch sang tiếng Nhật) và YOLO detection.
+    Chạy BLIP để lấy caption (tiếng Anh, tiếng Nhật).
+    Trả về chuỗi rỗng nếu captioning bị tắt hoặc lỗi.
     """
-    import logging
-    
-    # Translate object names to Japanese
-    object_translations = {
-        "person": "人", "people": "人々", "car": "車", "truck": "トラック",
-        "bus": "バス", "motorcycle": "バイク", "bicycle": "自転車",
-        "dog": "犬", "cat": "猫", "bird": "鳥", "horse": "馬", "sheep": "羊",
-        "cow": "牛", "elephant": "象", "bear": "熊", "zebra": "シマウマ",
-        "giraffe": "キリン",
-        "backpack": "バックパック", "umbrella": "傘", "handbag": "ハンドバッグ",
-        "tie": "ネクタイ", "suitcase": "スーツケース",
-        "frisbee": "フリスビー", "skis": "スキー", "snowboard": "スノーボード",
-        "sports ball": "ボール", "kite": "凧", "baseball bat": "野球バット",
-        "skateboard": "スケートボード", "surfboard": "サーフボード",
-        "tennis racket": "テニスラケット",
-        "bottle": "ボトル", "wine glass": "ワイングラス", "cup": "カップ",
-        "fork": "フォーク", "knife": "ナイフ", "spoon": "スプーン",
-        "bowl": "ボウル",
-        "banana": "バナナ", "apple": "リンゴ", "sandwich": "サンドイッチ",
-        "orange": "オレンジ", "broccoli": "ブロッコリー", "carrot": "ニンジン",
-        "hot dog": "ホットドッグ", "pizza": "ピザ", "donut": "ドーナツ",
-        "cake": "ケーキ",
-        "chair": "椅子", "couch": "ソファ", "potted plant": "鉢植え",
-        "bed": "ベッド", "dining table": "ダイニングテーブル", "toilet": "トイレ",
-        "tv": "テレビ", "laptop": "ノートパソコン", "mouse": "マウス",
-        "remote": "リモコン", "keyboard": "キーボード", "cell phone": "携帯電話",
-        "microwave": "電子レンジ", "oven": "オーブン", "toaster": "トースター",
-        "sink": "シンク", "refrigerator": "冷蔵庫",
-        "book": "本", "clock": "時計", "vase": "花瓶", "scissors": "はさみ",
-        "teddy bear": "テディベア", "hair drier": "ドライヤー",
-        "toothbrush": "歯ブラシ",
-        "traffic light": "信号", "fire hydrant": "消火栓", "stop sign": "停止標識",
-        "parking meter": "駐車メーター", "bench": "ベンチ",
-    }
-    
-    # Get BLIP caption if available
     caption_text = ""
     caption_ja = ""
-    if captioner is not None and caption_processor is not None:
+    if caption_engine.available:
         try:
-            from PIL import Image
-            import cv2
-            # Convert BGR to RGB for PIL
-            rgb_img = cv2.cvtColor(img_array, cv2.COLOR_BGR2RGB)
-            pil_img = Image.fromarray(rgb_img)
-            
-            inputs = caption_processor(pil_img, return_tensors="pt")
-            out = captioner.generate(**inputs, max_length=50)
-            caption_text = caption_processor.decode(out[0], skip_special_tokens=True)
+            caption_text = caption_engine.caption_batch([img_array])[0]
             
             # Translate to Japanese
             caption_ja = translate_caption_to_japanese(caption_text)
             
-            logging.info(f"BLIP caption (EN): {caption_text}")
-            logging.info(f"BLIP caption (JA): {caption_ja}")
+            logger.debug("BLIP caption (EN): %s / (JA): %s", caption_text, caption_ja)
         except Exception as e:
-            logging.warning(f"Failed to generate caption: {e}")
+            logger.warning("Failed to generate caption: %s", e)
             caption_text = ""
             caption_ja = ""
     
+    return caption_text, caption_ja
+
+
+def generate_scene_description(img_array, detected_objects: Dict[str, int],
+                               caption: Optional[Tuple[str, str]] = None) -> str:
+    """
+    Tạo mô tả chi tiết khung cảnh ảnh bằng tiếng Nhật.
+    Kết hợp BLIP caption (dịch sang tiếng Nhật) và YOLO detection.
+    Nếu `caption` đã được tính trước (EN, JA) thì không chạy lại BLIP.
+    """
+    # Get BLIP caption if available
+    if caption is None:
+        caption = generate_caption(img_array)
+    caption_text, caption_ja = caption
+    
     # Build detailed Japanese description
     description_parts = []
     
@@ -274,7 +673,7 @@ def generate_scene_description(img_array, detected_objects: Dict[str, int]) -> s
         
         object_list = []
         for obj_name, count in detected_objects.items():
-            ja_name = object_translations.get(obj_name, obj_name)
+            ja_name = ja_translator.object_name(obj_name)
             if count == 1:
                 object_list.append(f"{ja_name}が1つ")
             else:
@@ -311,6 +710,24 @@ def process_prediction_results(result: Any, speed_text: str) -> Tuple[Dict[str,
     return summary, description
 
 
+def extract_inference_speed(result: Any) -> Dict[str, float]:
+    """Lấy tốc độ preprocess/inference/postprocess (ms) từ Results."""
+    speed = getattr(result, "speed", {}) or {}
+    return {
+        "preprocess": speed.get('preprocess', 0.0),
+        "inference": speed.get('inference', 0.0),
+        "postprocess": speed.get('postprocess', 0.0)
+    }
+
+
+def build_yolo_summary(detected_objects: Dict[str, int]) -> str:
+    """Tóm tắt kết quả YOLO bằng tiếng Nhật."""
+    if detected_objects:
+        object_summary = "、".join([f"{k}: {v}個" for k, v in detected_objects.items()])
+        return f"YOLO検出: {object_summary}"
+    return "YOLO検出: 物体なし"
+
+
 def encode_image_to_base64(image_path: Path) -> str:
     """Đọc file ảnh và mã hóa sang chuỗi base64."""
     if not image_path.exists():
@@ -319,9 +736,312 @@ def encode_image_to_base64(image_path: Path) -> str:
         return base64.b64encode(img_file.read()).decode("utf-8")
 
 
-@app.get("/health")
-async def health():
-    return {"status": "ok"}
+def read_image_size(contents: bytes) -> Optional[Tuple[int, int]]:
+    """Đọc (width, height) từ header ảnh mà không decode pixel."""
+    import io
+    from PIL import Image
+
+    try:
+        with Image.open(io.BytesIO(contents)) as pil_img:
+            return pil_img.size
+    except Image.DecompressionBombError:
+        raise
+    except Exception:
+        return None
+
+
+def decode_image(contents: bytes, max_side: int = 0) -> Tuple[Any, float]:
+    """
+    Decode uploaded bytes to a BGR array; returns (None, 1.0) if not an image.
+
+    Với `max_side` > 0, JPEG được decode ở độ phân giải giảm (DCT scaling
+    1/2, 1/4, 1/8) sao cho cạnh dài vẫn >= `max_side`; các định dạng khác
+    được resize xuống `max_side`. Trả về (ảnh, scale) với scale = kích thước
+    gốc / kích thước đã decode, dùng để đưa toạ độ box về ảnh gốc.
+    """
+    import numpy as np
+    import cv2
+    from PIL import Image
+
+    nparr = np.frombuffer(contents, np.uint8)
+    flag = cv2.IMREAD_COLOR
+    original_side = 0
+    if max_side:
+        try:
+            size = read_image_size(contents)
+        except Image.DecompressionBombError as e:
+            logger.warning("Rejected oversized image: %s", e)
+            return None, 1.0
+        if size:
+            original_side = max(size)
+            if contents[:2] == b"\xff\xd8":
+                for factor, reduced_flag in ((8, cv2.IMREAD_REDUCED_COLOR_8),
+                                             (4, cv2.IMREAD_REDUCED_COLOR_4),
+                                             (2, cv2.IMREAD_REDUCED_COLOR_2)):
+                    if original_side / factor >= max_side:
+                        flag = reduced_flag
+                        break
+
+    img = cv2.imdecode(nparr, flag)
+    if img is None:
+        return None, 1.0
+    h, w = img.shape[:2]
+    if max_side and max(h, w) > max_side and flag == cv2.IMREAD_COLOR:
+        ratio = max_side / max(h, w)
+        img = cv2.resize(img, (max(1, int(w * ratio)), max(1, int(h * ratio))),
+                         interpolation=cv2.INTER_AREA)
+    scale = (original_side or max(h, w)) / max(img.shape[:2])
+    return img, scale
+
+
+def run_yolo_batch(images: list, model_path: Optional[str] = None, imgsz: Optional[int] = None) -> list:
+    """Chạy YOLO trên một batch ảnh; trả về một Results cho mỗi ảnh."""
+    yolo = model if model_path in (None, MODEL_PATH) else tier_models[model_path]
+    return list(yolo.predict(images, imgsz=imgsz or MODEL_IMGSZ, save=False, verbose=False))
+
+
+# Batching queue in front of YOLO (one batched predict per N images / T ms)
+yolo_batcher = MicroBatcher(
+    "yolo", run_yolo_batch, lane_executor, stage="yolo",
+    max_batch_size=BATCH_MAX_SIZE, max_wait_ms=BATCH_MAX_WAIT_MS,
+    max_concurrent_batches=INFERENCE_WORKERS,
+)
+# One batcher per (model, imgsz): images in a batch share the model and input size
+yolo_batchers: Dict[Tuple[str, int], MicroBatcher] = {(MODEL_PATH, MODEL_IMGSZ): yolo_batcher}
+
+
+def run_registry_batch(images: list, name: str, imgsz: int) -> list:
+    """Như run_yolo_batch cho một model của registry (nạp lại nếu đã bị evict)."""
+    return list(model_registry.get(name).predict(images, imgsz=imgsz, save=False, verbose=False))
+
+
+def yolo_batcher_for(model_path: str, imgsz: int, model_name: Optional[str] = None) -> MicroBatcher:
+    key = (f"registry:{model_name}" if model_name else model_path, imgsz)
+    batcher = yolo_batchers.get(key)
+    if batcher is None:
+        if model_name:
+            process = functools.partial(run_registry_batch, name=model_name, imgsz=imgsz)
+        else:
+            process = functools.partial(run_yolo_batch, model_path=model_path, imgsz=imgsz)
+        batcher = yolo_batchers[key] = MicroBatcher(
+            f"yolo:{model_name or Path(model_path).name}@{imgsz}", process,
+            lane_executor, stage="yolo",
+            max_batch_size=BATCH_MAX_SIZE, max_wait_ms=BATCH_MAX_WAIT_MS,
+            max_concurrent_batches=INFERENCE_WORKERS,
+        )
+    return batcher
+
+
+def resolve_requested_model(name: str) -> Optional[Tuple[str, str]]:
+    """(tên, phiên bản file) của model được yêu cầu qua ?model=; None nếu là model mặc định."""
+    if not name:
+        return None
+    try:
+        path = model_registry.path(name)
+        if path.resolve() == Path(MODEL_PATH).resolve():
+            return None
+        return name, model_registry.version(name)
+    except (UnknownModel, OSError):
+        raise HTTPException(status_code=404, detail=f"Unknown model '{name}' "
+                                                    f"(available: {', '.join(model_registry.available())})")
+
+
+def select_tier(options: PredictOptions) -> Tuple[Tier, int]:
+    """
+    Tier cho request (theo tải khi tier=auto) và imgsz thực tế. Gợi ý `imgsz`
+    của client được tôn trọng, trừ khi server đang quá tải: khi đó bị giới
+    hạn bởi imgsz của tier hiện tại.
+    """
+    if options.tier == "auto":
+        tier = adaptive_policy.select(admission.queued)
+        degraded = adaptive_policy.level > 0
+    else:
+        tier = adaptive_policy.tier(options.tier)
+        if tier is None:
+            names = ", ".join(t.name for t in adaptive_policy.tiers)
+            raise HTTPException(status_code=400, detail=f"Unknown tier '{options.tier}' (available: auto, {names})")
+        degraded = False
+    imgsz = tier.imgsz
+    if options.imgsz:
+        hint = max(IMGSZ_HINT_MIN, options.imgsz // 32 * 32)
+        imgsz = min(hint, tier.imgsz) if degraded else hint
+    return tier, imgsz
+
+
+def image_size_or_none(contents: bytes) -> Optional[Tuple[int, int]]:
+    try:
+        return read_image_size(contents)
+    except Exception:
+        return None  # decode_image rejects it
+
+
+async def detect_tiled(img: Any, tile_size: int, overlap: float, request: Optional[Request] = None,
+                       batcher: Optional[MicroBatcher] = None) -> Any:
+    """
+    Tiled inference: các tile chồng lấn (cùng ảnh đầy đủ, cho vật thể lớn hơn
+    một tile) được đưa qua yolo_batcher như các ảnh bình thường, rồi box được
+    chuyển về toạ độ ảnh và gộp bằng NMS.
+    """
+    h, w = img.shape[:2]
+    windows = tile_windows(w, h, tile_size, overlap)
+    if len(windows) > TILE_MAX_TILES:
+        raise HTTPException(status_code=400,
+                            detail=f"Too many tiles ({len(windows)} > {TILE_MAX_TILES}); use a larger tile_size")
+    batcher = batcher or yolo_batcher
+    # Crops are views into the decoded image, no copies
+    futures = [batcher.submit(img[y0:y1, x0:x1]) for x0, y0, x1, y1 in windows]
+    futures.append(batcher.submit(img))
+    results = await inference_executor.wait("yolo", asyncio.gather(*futures), request=request)
+    return merge_tile_results(img, results, windows, TILE_NMS_THRESHOLD)
+
+
+def caption_job_image(contents: bytes) -> Optional[bytes]:
+    """Ảnh upload thu nhỏ về CAPTION_JOB_IMAGE_SIDE và encode lại JPEG (payload nhỏ của caption job)."""
+    import cv2
+
+    img, _ = decode_image(contents, CAPTION_JOB_IMAGE_SIDE)
+    if img is None:
+        return None
+    h, w = img.shape[:2]
+    if max(h, w) > CAPTION_JOB_IMAGE_SIDE:
+        # Reduced JPEG decode stops at >= the target side
+        ratio = CAPTION_JOB_IMAGE_SIDE / max(h, w)
+        img = cv2.resize(img, (max(1, int(w * ratio)), max(1, int(h * ratio))), interpolation=cv2.INTER_AREA)
+    ok, buf = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, 90])
+    return buf.tobytes() if ok else None
+
+
+async def run_caption_job(job: Dict[str, Any], payload: Tuple[Optional[bytes], Dict[str, int]]) -> Dict[str, Any]:
+    """Worker của caption job: decode ảnh đã thu nhỏ, chạy BLIP và tạo mô tả tiếng Nhật đầy đủ."""
+    image, detected_objects = payload
+    img = None
+    if image is not None:
+        img, _ = await inference_executor.run("decode", decode_image, image, 0)
+    if img is None:
+        raise ValueError("Cannot decode image")
+    caption_text = await inference_executor.wait("caption", caption_batcher.submit(img))
+    caption_ja = translate_caption_to_japanese(caption_text)
+    return {
+        "caption_en": caption_text,
+        "caption_ja": caption_ja,
+        "description": generate_scene_description(img, detected_objects, caption=(caption_text, caption_ja)),
+    }
+
+
+# Bounded, expiring store of caption jobs and the workers that run them
+caption_jobs = JobStore(CAPTION_JOB_MAX, CAPTION_JOB_TTL_SECONDS,
+                        os.path.join(SHARED_STATE_DIR, "caption-jobs") if SHARED_STATE_DIR else None)
+caption_job_runner = JobRunner(caption_jobs, run_caption_job, CAPTION_JOB_WORKERS, CAPTION_JOB_QUEUE)
+
+
+async def submit_caption_job(cache_key: str, contents: bytes, detected_objects: Dict[str, int]) -> Dict[str, Any]:
+    """
+    Tạo (hoặc dùng lại) caption job cho ảnh; trả về các trường caption_* của response.
+    Job bị bỏ qua (skipped) khi hàng đợi đầy, request vẫn thành công.
+    Hàng đợi chỉ giữ ảnh đã thu nhỏ (vài chục KB), không giữ bản upload gốc.
+    """
+    if not caption_engine.available:
+        return {"caption_status": "disabled"}
+    job = caption_jobs.find(cache_key)
+    if job is None:
+        job = caption_jobs.create(cache_key)
+        image = None
+        if caption_job_runner.pending < caption_job_runner.max_pending:  # else shed without decoding
+            image = await inference_executor.run("decode", caption_job_image, contents)
+        caption_job_runner.submit(job, (image, detected_objects))
+        await caption_jobs.flush()  # the next poll may reach another worker
+    return {"caption_job_id": job["id"], "caption_status": job["status"]}
+
+
+# Batching queue in front of BLIP; one generate() at a time, it uses all cores (or its lane)
+caption_batcher = MicroBatcher(
+    "caption", caption_engine.caption_batch, lane_executor, stage="caption",
+    max_batch_size=CAPTION_BATCH_MAX_SIZE, max_wait_ms=CAPTION_BATCH_MAX_WAIT_MS,
+)
+
+
+def extract_boxes(result: Any, scale: float = 1.0) -> List[Dict[str, Any]]:
+    """
+    Lấy danh sách box (xyxy, class, confidence) từ Results.
+    `scale` đưa toạ độ về ảnh gốc nếu ảnh đã được decode ở độ phân giải giảm.
+    """
+    try:
+        boxes = result.boxes
+        xyxy = boxes.xyxy.tolist()
+        classes = boxes.cls.tolist()
+        confidences = boxes.conf.tolist()
+    except Exception:
+        return []
+    return [
+        {
+            "xyxy": [round(float(v) * scale, 2) for v in coords],
+            "class_id": int(c),
+            "class_name": result.names[int(c)],
+            "confidence": round(float(conf), 4),
+        }
+        for coords, c, conf in zip(xyxy, classes, confidences)
+    ]
+
+
+def render_annotated_image(result: Any, fmt: str = "jpeg", quality: int = RENDER_QUALITY,
+                           max_size: int = RENDER_MAX_SIZE) -> bytes:
+    """Vẽ bounding boxes, thu nhỏ nếu cần và encode JPEG/WebP."""
+    import cv2
+
+    with stage_timer("plot"):
+        plotted_img = result.plot()
+        if max_size:
+            h, w = plotted_img.shape[:2]
+            scale = max_size / max(h, w)
+            if scale < 1:
+                plotted_img = cv2.resize(plotted_img, (max(1, int(w * scale)), max(1, int(h * scale))),
+                                         interpolation=cv2.INTER_AREA)
+    with stage_timer("encode"):
+        if fmt == "webp":
+            ok, buffer = cv2.imencode('.webp', plotted_img, [cv2.IMWRITE_WEBP_QUALITY, quality])
+        else:
+            ok, buffer = cv2.imencode('.jpg', plotted_img, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        raise RuntimeError(f"Cannot encode annotated image as {fmt}")
+    return buffer.tobytes()
+
+
+def render_annotated_base64(result: Any) -> str:
+    """Ảnh annotated JPEG dưới dạng chuỗi base64 (mặc định cũ)."""
+    image_bytes = render_annotated_image(result)
+    with stage_timer("base64"):
+        return base64.b64encode(image_bytes).decode('utf-8')
+
+
+@app.get("/stats")
+async def stats():
+    """Runtime counters for tuning (batch-size distribution, ...)."""
+    return {
+        "yolo_batching": yolo_batcher.stats(),
+        "caption_batching": caption_batcher.stats(),
+        "caption_jobs": caption_job_runner.stats(),
+        "result_cache": result_cache.stats(),
+        "annotated_images": annotated_images.stats(),
+        "admission": admission.stats(),
+        "adaptive": adaptive_policy.stats(),
+        "yolo_batching_tiers": {b.name: b.stats() for b in yolo_batchers.values() if b is not yolo_batcher},
+        "streams": stream_stats,
+        "cpu_lanes": lane_executor.stats() if isinstance(lane_executor, CpuLanes) else None,
+        "cpu_lane_autotune": lane_autotune_results,
+    }
+
+
+@app.get("/models")
+async def list_models():
+    """Model mặc định, các checkpoint có thể chọn qua ?model= và các model đang nạp trong RAM."""
+    return {"default": Path(MODEL_PATH).stem, **model_registry.stats()}
+
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    """Prometheus scrape endpoint (per-stage latency histograms, gauges, process RSS)."""
+    body, content_type = render_latest()
+    return Response(content=body, media_type=content_type)
 
 
 # OPTIONS handler to satisfy CORS preflight or probes that may hit /predict/
@@ -349,94 +1069,613 @@ async def predict_get_no_slash():
     return {"detail": "Use POST /predict/ with multipart/form-data field 'file' to upload an image."}
 
 
-@app.post("/predict/", response_model=PredictionResponse)
-async def predict_slash(file: UploadFile = File(...)):
+def request_deadline(request: Request) -> Optional[float]:
     """
-    Xử lý inference với YOLO + Image Captioning - tối ưu cho Render.
-    Trả về mô tả chi tiết bằng tiếng Nhật với metrics đầy đủ.
-    Rate-limited to prevent OOM with concurrent requests.
+    Deadline (time.monotonic()) từ header `X-Request-Timeout-Ms` của client,
+    hoặc DEFAULT_REQUEST_TIMEOUT_SECONDS; None nếu không giới hạn.
     """
-    # Acquire semaphore to limit concurrent requests
-    async with request_semaphore:
-        if model is None:
-            raise HTTPException(status_code=503, detail="Model not loaded yet")
+    header = request.headers.get("x-request-timeout-ms")
+    if header is None:
+        return time.monotonic() + DEFAULT_REQUEST_TIMEOUT_SECONDS if DEFAULT_REQUEST_TIMEOUT_SECONDS > 0 else None
+    try:
+        timeout_ms = float(header)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="X-Request-Timeout-Ms must be a number of milliseconds")
+    return time.monotonic() + max(0.0, timeout_ms) / 1000.0
 
-        start_time = time.time()
-        
-        try:
-            import numpy as np
-            import cv2
 
-            # Đọc toàn bộ file vào memory
-            contents = await file.read()
-            
-            # Decode image
-            nparr = np.frombuffer(contents, np.uint8)
-            img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-            
-            if img is None:
-                raise HTTPException(status_code=400, detail="Cannot decode image. Please upload a valid image file.")
+async def run_prediction_pipeline(request: Request, contents: bytes, options: PredictOptions,
+                                  image_id: str, degraded: list,
+                                  deadline: Optional[float] = None,
+                                  served: Optional[Tuple[Tier, int, Optional[str]]] = None) -> Dict[str, Any]:
+    """
+    Chạy decode → YOLO → caption → render cho một ảnh và trả về các trường
+    của PredictionResponse (trừ filename/processing_time).
+    Ảnh annotated được nhúng base64 hoặc lưu vào `annotated_images` với id
+    `image_id` tuỳ theo `options`.
+    Nếu kết quả bị giảm chất lượng (caption timeout) thì ghi vào `degraded`
+    để không lưu vào cache.
+    `deadline` (time.monotonic()): bị loại khỏi hàng đợi nếu không kịp xử lý.
+    `served`: (tier, imgsz) từ select_tier và tên model của registry (None =
+    model của tier); mặc định là tier đầu tiên.
+    """
+    tier, imgsz, model_name = served or (adaptive_policy.tiers[0], adaptive_policy.tiers[0].imgsz, None)
+    batcher = yolo_batcher_for(tier.model_path, imgsz, model_name)
+    # Admission control: wait for a slot or fail fast (429 / deadline)
+    QUEUED.inc()
+    wait_start = time.perf_counter()
+    try:
+        await admission.acquire(deadline)
+    finally:
+        QUEUED.dec()
+    queued_until = time.perf_counter()
+    observe("queue_wait", queued_until - wait_start)
+    record_span("queue_wait", wait_start, queued_until)
+    service_start = time.monotonic()
+    try:
+        if model_name:
+            # Load on demand before queueing for a batch (no-op when resident)
+            with stage_timer("model_load"):
+                await inference_executor.run("load", model_registry.get, model_name, request=request)
 
-            # YOLO Prediction
-            results = model.predict(img, save=False, verbose=False)
-            result = results[0]
+        # Decode image (full resolution when it is going to be tiled)
+        with stage_timer("decode"):
+            if options.presized:
+                # Fast path: the client already resized to the serving resolution, so
+                # the decode caps are normally no-ops; boxes are scaled back to the original
+                presized_scale = options.presized_scale(image_size_or_none(contents))
+                tiled = False
+                img, scale = await inference_executor.run("decode", decode_image, contents,
+                                                          options.decode_side(imgsz), request=request)
+                scale *= presized_scale
+                set_attribute("presized", True)
+            else:
+                tiled = options.tile != "off" and options.use_tiling(image_size_or_none(contents))
+                img, scale = await inference_executor.run("decode", decode_image, contents,
+                                                          TILE_MAX_SIDE if tiled else options.decode_side(imgsz),
+                                                          request=request)
 
-            # Extract detected objects
-            detected_objects = {}
+        if img is None:
+            raise HTTPException(status_code=400, detail="Cannot decode image. Please upload a valid image file.")
+
+        # YOLO Prediction
+        with stage_timer("yolo"):
+            if tiled:
+                result = await detect_tiled(img, options.tile_size, options.tile_overlap, request=request,
+                                            batcher=batcher)
+            else:
+                result = await inference_executor.wait("yolo", batcher.submit(img), request=request)
+        if not tiled:
+            observe_yolo_speed(getattr(result, "speed", None) or {})
+
+        # Extract detected objects
+        detected_objects, _ = process_prediction_results(result, "")
+
+        # BLIP caption (batched across requests); a slow or failed caption
+        # degrades to a detection-only description
+        caption = ("", "")
+        if caption_engine.available and options.caption == "sync":
             try:
-                detected_names = [result.names[int(c)] for c in result.boxes.cls]
-                for name in detected_names:
-                    detected_objects[name] = detected_objects.get(name, 0) + 1
-            except Exception:
-                detected_objects = {}
+                with stage_timer("caption"):
+                    caption_text = await inference_executor.wait("caption", caption_batcher.submit(img),
+                                                                 request=request)
+                caption = (caption_text, translate_caption_to_japanese(caption_text))
+                logger.debug("BLIP caption (EN): %s / (JA): %s", caption[0], caption[1])
+            except ClientDisconnected:
+                raise
+            except Exception as e:
+                logger.warning("Caption failed (%s); continuing without caption", e)
+                degraded.append("caption")
 
-            # Get inference speed metrics
-            speed = getattr(result, "speed", {})
-            inference_speed = {
-                "preprocess": speed.get('preprocess', 0.0),
-                "inference": speed.get('inference', 0.0),
-                "postprocess": speed.get('postprocess', 0.0)
-            }
+        # Draw bounding boxes
+        encoded_image = ""
+        image_url = None
+        if options.render != "none":
+            image_bytes = await inference_executor.run(
+                "render", render_annotated_image, result, options.render,
+                options.quality, options.max_size, request=request,
+            )
+            if options.inline_image:
+                with stage_timer("base64"):
+                    encoded_image = base64.b64encode(image_bytes).decode('utf-8')
+            else:
+                await annotated_images.put(image_id, image_bytes, RENDER_MEDIA_TYPES[options.render])
+                image_url = f"/predict/images/{image_id}"
 
+        return {
             # Generate detailed Japanese description
-            detailed_description = generate_scene_description(img, detected_objects)
-            
+            "description": generate_scene_description(img, detected_objects, caption=caption),
             # Create YOLO summary in Japanese
-            total_objects = sum(detected_objects.values())
-            if detected_objects:
-                object_summary = "、".join([f"{k}: {v}個" for k, v in detected_objects.items()])
-                yolo_summary = f"YOLO検出: {object_summary}"
-            else:
-                yolo_summary = "YOLO検出: 物体なし"
-
-            # Draw bounding boxes
-            plotted_img = result.plot()
-            _, buffer = cv2.imencode('.jpg', plotted_img)
-            encoded_image = base64.b64encode(buffer).decode('utf-8')
-
-            # Calculate total processing time
-            processing_time = time.time() - start_time
-
-            return PredictionResponse(
-                filename=file.filename or "uploaded_image.jpg",
-                description=detailed_description,
-                yolo_summary=yolo_summary,
-                object_count=total_objects,
-                object_details=detected_objects,
-                processing_time=round(processing_time, 3),
-                inference_speed=inference_speed,
-                image_base64=encoded_image,
-            )
+            "yolo_summary": build_yolo_summary(detected_objects),
+            "object_count": sum(detected_objects.values()),
+            "object_details": detected_objects,
+            # Get inference speed metrics
+            "inference_speed": extract_inference_speed(result),
+            "image_base64": encoded_image,
+            "boxes": extract_boxes(result, scale),
+            "image_url": image_url,
+            "tiles": getattr(result, "tiles", None),
+            "served_tier": tier.name,
+            "imgsz": imgsz,
+            "model": model_name or Path(tier.model_path).stem,
+        }
+    finally:
+        admission.release(time.monotonic() - service_start)
+        adaptive_policy.record(time.perf_counter() - wait_start)
 
-        except HTTPException:
-            raise
-        except Exception as e:
-            logger.error("Inference error: %s", e, exc_info=True)
-            raise HTTPException(status_code=500, detail=f"画像処理中にエラーが発生しました: {str(e)}")
-@app.post("/predict", response_model=PredictionResponse)
-async def predict_no_slash(file: UploadFile = File(...)):
+
+# Binary encodings offered through Accept (see app.responses)
+PREDICT_RESPONSES = {200: {"content": {"application/msgpack": {}, "multipart/mixed": {}}}}
+
+
+@app.post("/predict/", response_model=PredictionResponse, responses=PREDICT_RESPONSES)
+async def predict_slash(request: Request, file: UploadFile = File(...), options: PredictOptions = Depends()):
+    """
+    Xử lý inference với YOLO + Image Captioning - tối ưu cho Render.
+    Trả về mô tả chi tiết bằng tiếng Nhật với metrics đầy đủ.
+    Rate-limited to prevent OOM with concurrent requests.
+    CPU stages run on the inference executor; the event loop only does I/O.
+    Kết quả được cache theo nội dung ảnh (header `X-Cache: HIT|MISS`).
+    `render`/`quality`/`max_size`/`inline_image` điều khiển ảnh annotated;
+    `boxes` luôn có để client tự vẽ overlay.
+    Định dạng theo header Accept: JSON (mặc định), `application/msgpack` hoặc
+    `multipart/mixed` (JSON + ảnh annotated nhị phân, không base64).
+    """
+    if model is None:
+        raise HTTPException(status_code=503, detail="Model not loaded yet")
+
+    response_format = negotiate(request.headers.get("accept"))
+    if response_format != JSON:
+        # The image travels as raw bytes next to the metadata, never as base64
+        options.inline_image = False
+    start_time = time.time()
+    deadline = request_deadline(request)
+    IN_FLIGHT.inc()
+    
+    try:
+        # Đọc toàn bộ file vào memory
+        with stage_timer("upload"):
+            contents = await file.read()
+
+        # Tier chosen on arrival (queue depth now), part of the cache key
+        tier, imgsz = select_tier(options)
+        requested = resolve_requested_model(options.model)
+        cache_key = await inference_executor.run(
+            "decode", make_cache_key, contents,
+            model=":".join(requested) if requested else tier.model_path, tier=tier.name,
+            backend=model_backend_info, imgsz=imgsz, decode_side=options.decode_side(imgsz),
+            captioning=caption_engine.info(), **options.cache_params(),
+        )
+        if options.render != "none" and not options.inline_image and not await annotated_images.contains(cache_key):
+            # A cached image_url would point at an evicted image; recompute
+            result_cache.discard(cache_key)
+        degraded: list = []
+        payload, hit = await result_cache.get_or_compute(
+            cache_key,
+            lambda: run_prediction_pipeline(request, contents, options, cache_key, degraded, deadline,
+                                            (tier, imgsz, requested[0] if requested else None)),
+            should_cache=lambda _: not degraded,
+        )
+        adaptive_policy.count(tier)
+
+        # Caption later: return detections now, deliver the caption via /captions/{id}
+        caption_fields: Dict[str, Any] = {}
+        if options.caption == "async":
+            caption_fields = await submit_caption_job(cache_key, contents, payload["object_details"])
+
+        # Calculate total processing time
+        processing_time = time.time() - start_time
+        observe("total", processing_time)
+        count_request("hit" if hit else "miss")
+        set_attribute("cache", "hit" if hit else "miss")
+        set_attribute("tier", tier.name)
+
+        # Serialized straight from the dict (PredictionResponse documents the schema)
+        body = {
+            "filename": file.filename or "uploaded_image.jpg",
+            "processing_time": round(processing_time, 3),
+            "caption_job_id": None,
+            "caption_status": None,
+            **payload,
+            **caption_fields,
+        }
+        image = None
+        if response_format != JSON and payload.get("image_url"):
+            image = await annotated_images.get(cache_key)
+        return encode_response(response_format, body, image, {"X-Cache": "HIT" if hit else "MISS"})
+
+    except HTTPException:
+        count_request("rejected")
+        raise
+    except AdmissionRejected as e:
+        logger.warning("Rejecting request: %s (%s)", e, admission.stats())
+        count_request("overloaded")
+        raise HTTPException(status_code=429, detail=f"サーバーが混雑しています。{e.retry_after}秒後に再試行してください。",
+                            headers={"Retry-After": str(e.retry_after)})
+    except DeadlineExceeded as e:
+        logger.info("Dropping request: %s", e)
+        count_request("deadline")
+        raise HTTPException(status_code=503, detail="期限内に処理できないため、リクエストを破棄しました。",
+                            headers={"Retry-After": str(e.retry_after)})
+    except ClientDisconnected as e:
+        logger.info("%s; dropping request", e)
+        count_request("disconnected")
+        # 499 Client Closed Request (nginx convention); nobody reads it
+        return Response(status_code=499)
+    except StageTimeout as e:
+        logger.error("Inference timeout: %s", e)
+        count_request("timeout")
+        raise HTTPException(status_code=504, detail=f"画像処理がタイムアウトしました: {str(e)}")
+    except Exception as e:
+        logger.error("Inference error: %s", e, exc_info=True)
+        count_request("error")
+        raise HTTPException(status_code=500, detail=f"画像処理中にエラーが発生しました: {str(e)}")
+    finally:
+        IN_FLIGHT.dec()
+
+
+@app.post("/predict", response_model=PredictionResponse, responses=PREDICT_RESPONSES)
+async def predict_no_slash(request: Request, file: UploadFile = File(...), options: PredictOptions = Depends()):
     """Redirect to main handler with trailing slash for consistency"""
-    return await predict_slash(file)
+    return await predict_slash(request, file, options)
+
+
+@app.get("/captions/{job_id}")
+async def get_caption_job(job_id: str):
+    """Trạng thái và kết quả của một caption job (polling)."""
+    job = await caption_jobs.fetch(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Caption job not found or expired")
+    return public_job(job)
+
+
+@app.get("/captions/{job_id}/events")
+async def stream_caption_job(job_id: str):
+    """
+    Server-sent events cho một caption job: gửi trạng thái mỗi khi thay đổi,
+    kết thúc sau trạng thái cuối cùng (done/failed/skipped) hoặc khi job hết hạn.
+    """
+    if await caption_jobs.fetch(job_id) is None:
+        raise HTTPException(status_code=404, detail="Caption job not found or expired")
+
+    async def events():
+        last_update = None
+        idle = 0.0
+        while True:
+            job = await caption_jobs.fetch(job_id)
+            if job is None:
+                yield 'event: expired\ndata: {}\n\n'
+                return
+            if job["updated_at"] != last_update:
+                last_update = job["updated_at"]
+                yield f"event: {job['status']}\ndata: {json.dumps(public_job(job), ensure_ascii=False)}\n\n"
+                if job["status"] in FINAL_STATUSES:
+                    return
+                idle = 0.0
+            elif idle >= 15:
+                # Comment line keeps proxies from closing an idle stream
+                yield ": keep-alive\n\n"
+                idle = 0.0
+            await asyncio.sleep(0.25)
+            idle += 0.25
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+# Live stream counters for /stats
+stream_stats = {"active": 0, "total": 0, "rejected": 0, "frames_processed": 0, "frames_dropped": 0}
+
+
+async def detect_frame(data: bytes) -> Dict[str, Any]:
+    """YOLO cho một frame của stream; trả về kết quả gọn (boxes dạng mảng, số lượng theo class)."""
+    img, scale = await inference_executor.run("decode", decode_image, data, MODEL_IMGSZ)
+    if img is None:
+        return {"error": "Cannot decode frame"}
+    result = await inference_executor.wait("yolo", yolo_batcher.submit(img))
+    detected_objects, _ = process_prediction_results(result, "")
+    return {
+        # [x1, y1, x2, y2, class_id, confidence] theo pixel của frame gốc
+        "boxes": [b["xyxy"] + [b["class_id"], b["confidence"]] for b in extract_boxes(result, scale)],
+        "counts": detected_objects,
+    }
+
+
+@app.websocket("/ws/detect")
+async def detect_stream(websocket: WebSocket):
+    """
+    Stream video qua WebSocket: client gửi từng frame (JPEG/PNG, message nhị phân),
+    server trả về một message JSON cho mỗi frame đã xử lý.
+    Khi inference chậm hơn camera, chỉ frame mới nhất được xử lý; các frame cũ
+    bị bỏ qua và được đếm trong `dropped`.
+    """
+    await websocket.accept()
+    # 1013 Try Again Later
+    if model is None:
+        await websocket.close(code=1013, reason="Model not loaded")
+        return
+    if stream_stats["active"] >= MAX_STREAMS:
+        stream_stats["rejected"] += 1
+        await websocket.close(code=1013, reason="Too many streams")
+        return
+
+    stream_stats["active"] += 1
+    stream_stats["total"] += 1
+    slot = LatestFrameSlot()
+    fps = RateMeter()
+    await websocket.send_text(json.dumps({"type": "hello", "names": getattr(model, "names", {}),
+                                          "max_frame_bytes": MAX_STREAM_FRAME_BYTES}, ensure_ascii=False))
+
+    async def receive_frames():
+        seq = 0
+        try:
+            while True:
+                message = await websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    break
+                data = message.get("bytes")
+                if data is None:
+                    continue  # text messages are ignored
+                if len(data) > MAX_STREAM_FRAME_BYTES:
+                    await websocket.close(code=1009, reason="Frame too large")
+                    break
+                slot.put((seq, time.perf_counter(), data))
+                seq += 1
+        finally:
+            slot.close()
+
+    receiver = asyncio.ensure_future(receive_frames())
+    processed = 0
+    dropped_reported = 0
+    try:
+        while True:
+            frame = await slot.get()
+            if frame is None:
+                break
+            seq, received_at, data = frame
+            try:
+                payload = await detect_frame(data)
+            except StageTimeout as e:
+                payload = {"error": str(e)}
+            except Exception as e:
+                # One bad frame (decode/model error) must not end the stream
+                logger.warning("Stream frame %d failed: %s", seq, e)
+                payload = {"error": str(e) or type(e).__name__}
+            processed += 1
+            fps.tick()
+            latency = time.perf_counter() - received_at
+            observe("stream_frame", latency)
+            stream_stats["frames_processed"] += 1
+            stream_stats["frames_dropped"] += slot.dropped - dropped_reported
+            dropped_reported = slot.dropped
+            await websocket.send_text(json.dumps({
+                "type": "detections", "frame": seq, **payload,
+                "latency_ms": round(latency * 1000, 1), "fps": round(fps.rate(), 2),
+                "received": slot.received, "processed": processed, "dropped": slot.dropped,
+            }, ensure_ascii=False, separators=(",", ":")))
+    except (WebSocketDisconnect, RuntimeError):
+        # Client went away while a result was being sent
+        pass
+    finally:
+        receiver.cancel()
+        stream_stats["active"] -= 1
+        logger.info("Stream closed: received=%d processed=%d dropped=%d",
+                    slot.received, processed, slot.dropped)
+
+
+@app.get("/predict/images/{image_id}")
+async def get_annotated_image(image_id: str):
+    """Trả về ảnh annotated (nhị phân) của một lần /predict/?inline_image=false."""
+    entry = await annotated_images.get(image_id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Image not found or expired")
+    data, media_type = entry
+    return Response(content=data, media_type=media_type,
+                    headers={"Cache-Control": "private, max-age=3600"})
+
+
+async def predict_batch_item(index: int, name: str, contents: bytes, include_image: bool) -> Dict[str, Any]:
+    """Chạy pipeline cho một ảnh của /predict/batch và trả về một dòng NDJSON."""
+    start_time = time.time()
+    item: Dict[str, Any] = {"index": index, "filename": name}
+    try:
+        with stage_timer("decode"):
+            img, scale = await inference_executor.run("decode", decode_image, contents, MODEL_IMGSZ)
+        del contents
+        if img is None:
+            item["error"] = "Cannot decode image"
+            return item
+
+        with stage_timer("yolo"):
+            result = await inference_executor.wait("yolo", yolo_batcher.submit(img))
+        observe_yolo_speed(getattr(result, "speed", None) or {})
+        detected_objects, _ = process_prediction_results(result, "")
+        item.update(
+            description=generate_scene_description(img, detected_objects, caption=("", "")),
+            yolo_summary=build_yolo_summary(detected_objects),
+            object_count=sum(detected_objects.values()),
+            object_details=detected_objects,
+            inference_speed=extract_inference_speed(result),
+            boxes=extract_boxes(result, scale),
+        )
+        if include_image:
+            item["image_base64"] = await inference_executor.run("render", render_annotated_base64, result)
+        item["processing_time"] = round(time.time() - start_time, 3)
+    except Exception as e:
+        logger.warning("Batch item %d (%s) failed: %s", index, name, e)
+        item["error"] = str(e)
+    return item
+
+
+async def admit_batch_item() -> None:
+    """
+    Chờ slot của admission cho một ảnh batch (giống /predict/). Batch không
+    bị từ chối: hàng đợi đầy thì đợi `retry_after` rồi thử lại, nên mỗi
+    batch chỉ chiếm tối đa một chỗ trong hàng đợi.
+    """
+    while True:
+        try:
+            await admission.acquire()
+            return
+        except AdmissionRejected as e:
+            await asyncio.sleep(e.retry_after)
+
+
+def release_batch_item(admitted_at: float, _: asyncio.Future) -> None:
+    admission.release(time.monotonic() - admitted_at)
+
+
+async def stream_batch_results(files: List[UploadFile], include_image: bool):
+    """
+    Đọc ảnh (hoặc archive) lần lượt, đưa qua YOLO theo batch và trả về
+    từng dòng NDJSON ngay khi ảnh đó xong. Tối đa BATCH_WINDOW ảnh được
+    giữ trong bộ nhớ cùng lúc, bất kể tập ảnh lớn đến đâu.
+    """
+    images = iter_uploaded_images(((f.filename, f.file) for f in files), MAX_UPLOAD_BYTES or None)
+    pending = set()
+    count = 0
+    exhausted = False
+    try:
+        while pending or not exhausted:
+            while not exhausted and len(pending) < BATCH_WINDOW:
+                try:
+                    entry = await inference_executor.run("decode", next, images, None)
+                except Exception as e:
+                    logger.warning("Failed to read batch upload: %s", e)
+                    yield json.dumps({"error": f"Cannot read upload: {e}"}, ensure_ascii=False) + "\n"
+                    entry = None
+                if entry is None:
+                    exhausted = True
+                elif count >= BATCH_MAX_IMAGES:
+                    yield json.dumps({"error": f"Too many images (max {BATCH_MAX_IMAGES})"}) + "\n"
+                    exhausted = True
+                elif isinstance(entry[1], MemberTooLarge):
+                    # Skipped without reading it; the rest of the upload goes on
+                    yield json.dumps({"index": count, "filename": entry[0], "error": str(entry[1])},
+                                     ensure_ascii=False) + "\n"
+                    count += 1
+                else:
+                    name, contents = entry
+                    await admit_batch_item()
+                    task = asyncio.ensure_future(predict_batch_item(count, name, contents, include_image))
+                    # Released however the item ends, even if cancelled before it starts
+                    task.add_done_callback(functools.partial(release_batch_item, time.monotonic()))
+                    pending.add(task)
+                    count += 1
+            if not pending:
+                break
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                yield json.dumps(task.result(), ensure_ascii=False) + "\n"
+        yield json.dumps({"done": True, "count": count}) + "\n"
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+@app.post("/predict/batch")
+async def predict_batch(files: List[UploadFile] = File(...), include_image: bool = False):
+    """
+    Nhận nhiều ảnh (hoặc một file zip/tar) và stream kết quả dạng NDJSON,
+    mỗi dòng một ảnh theo thứ tự hoàn thành (trường `index` giữ thứ tự gốc).
+    Dòng cuối cùng là `{"done": true, "count": N}`.
+    """
+    if model is None:
+        raise HTTPException(status_code=503, detail="Model not loaded yet")
+    return StreamingResponse(stream_batch_results(files, include_image),
+                             media_type="application/x-ndjson")
+
+
+def save_upload_to_temp(upload: Any, suffix: str) -> str:
+    """Chép file upload ra file tạm (decoder video cần đường dẫn để seek)."""
+    import shutil
+    import tempfile
+
+    with tempfile.NamedTemporaryFile(prefix="video-", suffix=suffix, delete=False) as tmp:
+        upload.seek(0)
+        shutil.copyfileobj(upload, tmp, 1024 * 1024)
+        return tmp.name
+
+
+async def stream_video_results(path: str, info: Dict[str, Any], frames: Any, segment_seconds: float):
+    """
+    Decode (thread riêng) → YOLO theo batch → gom kết quả theo đoạn `segment_seconds` giây.
+    Mỗi đoạn là một dòng NDJSON ngay khi xong; bộ nhớ chỉ giữ vài frame.
+    """
+    start_time = time.time()
+    reader = BackgroundFrameReader(frames, VIDEO_BUFFER_FRAMES)
+    segments = SegmentAccumulator(segment_seconds)
+    # Frames submitted to YOLO but not collected yet; enough to fill a batch
+    pending: "deque[Tuple[float, asyncio.Future]]" = deque()
+    analyzed = 0
+
+    async def collect_oldest():
+        t, future = pending.popleft()
+        result = await inference_executor.wait("yolo", future)
+        detected_objects, _ = process_prediction_results(result, "")
+        return segments.add(t, detected_objects)
+
+    try:
+        yield json.dumps({"type": "info", **info}, ensure_ascii=False) + "\n"
+        async for t, img in reader:
+            if analyzed >= VIDEO_MAX_FRAMES:
+                yield json.dumps({"type": "error", "error": f"Too many frames (max {VIDEO_MAX_FRAMES})"}) + "\n"
+                break
+            pending.append((t, yolo_batcher.submit(img)))
+            analyzed += 1
+            if len(pending) >= BATCH_MAX_SIZE:
+                for segment in await collect_oldest():
+                    yield json.dumps(segment, ensure_ascii=False) + "\n"
+        while pending:
+            for segment in await collect_oldest():
+                yield json.dumps(segment, ensure_ascii=False) + "\n"
+        for segment in segments.flush():
+            yield json.dumps(segment, ensure_ascii=False) + "\n"
+        yield json.dumps({
+            "type": "summary", "done": True,
+            "frames_analyzed": analyzed,
+            "object_details": segments.totals,
+            "processing_time": round(time.time() - start_time, 3),
+        }, ensure_ascii=False) + "\n"
+    except Exception as e:
+        logger.warning("Video analysis failed: %s", e)
+        yield json.dumps({"type": "error", "error": str(e)}, ensure_ascii=False) + "\n"
+    finally:
+        reader.stop()
+        for _, future in pending:
+            future.cancel()
+        os.unlink(path)
+
+
+@app.post("/predict/video")
+async def predict_video(
+    file: UploadFile = File(...),
+    sample_fps: float = Query(VIDEO_SAMPLE_FPS, gt=0, le=60, description="Số frame phân tích mỗi giây"),
+    keyframes: bool = Query(False, description="Chỉ decode keyframe (cần ffmpeg); bỏ qua sample_fps"),
+    segment_seconds: float = Query(5.0, ge=0.5, description="Độ dài mỗi đoạn tổng hợp (giây)"),
+):
+    """
+    Phân tích video (MP4, ...) và stream NDJSON: dòng `info`, mỗi đoạn một dòng
+    `segment` (`object_details` = số lượng lớn nhất cùng lúc theo class,
+    `frames_with`, `timeline`), cuối cùng là `summary`.
+    """
+    if model is None:
+        raise HTTPException(status_code=503, detail="Model not loaded yet")
+    suffix = Path(file.filename or "").suffix or ".mp4"
+    path = await inference_executor.run("decode", save_upload_to_temp, file.file, suffix)
+    try:
+        info = await inference_executor.run("decode", probe_video, path)
+        frames = open_frames(path, info, VIDEO_DECODER, sample_fps, keyframes, MODEL_IMGSZ)
+    except VideoError as e:
+        os.unlink(path)
+        raise HTTPException(status_code=400, detail=f"動画を読み込めません: {e}")
+    except Exception:
+        os.unlink(path)
+        raise
+    info.update(sample_fps=None if keyframes else sample_fps, keyframes=keyframes,
+                segment_seconds=segment_seconds)
+    return StreamingResponse(stream_video_results(path, info, frames, segment_seconds),
+                             media_type="application/x-ndjson")
 
 
 # ============================================================================
@@ -458,3 +1697,6 @@ if frontend_path.exists():
     async def index_html():
         """Explicit route for index.html"""
         return FileResponse(frontend_path / "index.html")
+
+
+startup_timings["import"] = time.perf_counter() - _IMPORT_STARTED
@@ -0,0 +1,192 @@
+"""
+Registry of YOLO checkpoints loaded on demand (``/predict/?model=<name>``).
+
+Any ``*.pt`` / ``*.onnx`` file in ``models_dir`` can be requested by its
+name (file name without suffix). Models are loaded on first use and kept in
+an LRU: once more than ``max_models`` are resident, or their estimated size
+exceeds ``max_bytes``, the least recently used ones are evicted (a model
+still running a batch stays alive until that batch finishes). Concurrent
+requests for a model that is not resident share a single load.
+
+A checkpoint whose file changed on disk (mtime or size, checked at most
+every ``check_interval`` seconds) is reloaded on its next use; requests
+keep using the previous version until the new one is loaded, and keep it if
+the reload fails (e.g. a file still being copied; retried on a later check).
+
+Each process has its own registry: with ``app.serve --workers N`` the limits
+apply per worker, so up to N times ``max_bytes`` can be resident in total.
+
+The default model (``MODEL_PATH``) is not managed here and never evicted.
+"""
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SUFFIXES = (".pt", ".onnx")
+_NAME = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_.-]*$")
+
+
+class UnknownModel(KeyError):
+    pass
+
+
+def model_size_bytes(model: Any, path: Path) -> int:
+    """Parameters + buffers of a torch model, else the checkpoint file size."""
+    module = getattr(model, "model", None)
+    try:
+        tensors = list(module.parameters()) + list(module.buffers())
+        size = sum(t.numel() * t.element_size() for t in tensors)
+        if size:
+            return size
+    except (AttributeError, TypeError):
+        pass
+    try:
+        return path.stat().st_size
+    except OSError:
+        return 0
+
+
+class _Entry:
+    def __init__(self, model: Any, path: Path, version: Tuple[int, int], size: int):
+        self.model = model
+        self.path = path
+        self.version = version
+        self.size = size
+        self.checked_at = time.monotonic()
+        self.loaded_at = time.time()
+        self.uses = 0
+
+
+class ModelRegistry:
+    def __init__(self, models_dir: str, loader: Callable[[str], Any], max_models: int = 3,
+                 max_bytes: int = 0, check_interval: float = 2.0):
+        self.models_dir = Path(models_dir)
+        self.loader = loader
+        self.max_models = max(1, max_models)
+        self.max_bytes = max(0, max_bytes)
+        self.check_interval = check_interval
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._loading: Dict[str, threading.Lock] = {}
+        self.loads = 0
+        self.reloads = 0
+        self.reload_failures = 0
+        self.evictions = 0
+
+    def available(self) -> List[str]:
+        if not self.models_dir.is_dir():
+            return []
+        return sorted(p.stem for p in self.models_dir.iterdir() if p.suffix in SUFFIXES and p.is_file())
+
+    def path(self, name: str) -> Path:
+        """Checkpoint file for ``name``; raises UnknownModel."""
+        if _NAME.match(name):
+            for suffix in SUFFIXES:
+                candidate = self.models_dir / f"{name}{suffix}"
+                if candidate.is_file():
+                    return candidate
+        raise UnknownModel(name)
+
+    @staticmethod
+    def _version(path: Path) -> Tuple[int, int]:
+        st = path.stat()
+        return st.st_mtime_ns, st.st_size
+
+    def version(self, name: str) -> str:
+        """Identifies the checkpoint content on disk (for cache keys)."""
+        mtime, size = self._version(self.path(name))
+        return f"{mtime}-{size}"
+
+    def get(self, name: str) -> Any:
+        """The model for ``name``, loading or reloading it if needed (blocking)."""
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is not None:
+                self._entries.move_to_end(name)
+                entry.uses += 1
+                if time.monotonic() - entry.checked_at < self.check_interval:
+                    return entry.model
+        if entry is not None and not self._changed(entry):
+            return entry.model
+        return self._load(name, entry)
+
+    def _changed(self, entry: _Entry) -> bool:
+        entry.checked_at = time.monotonic()
+        try:
+            return self._version(entry.path) != entry.version
+        except OSError:
+            return False  # file removed: keep serving the resident copy
+
+    def _load(self, name: str, stale: Optional[_Entry]) -> Any:
+        with self._lock:
+            lock = self._loading.setdefault(name, threading.Lock())
+        with lock:
+            with self._lock:
+                current = self._entries.get(name)
+            if current is not None and current is not stale:
+                return current.model  # loaded by a concurrent request
+            path = self.path(name)
+            version = self._version(path)
+            start = time.perf_counter()
+            try:
+                model = self.loader(str(path))
+            except Exception as e:
+                if stale is None:
+                    raise
+                self.reload_failures += 1
+                logger.warning("Reloading model '%s' from %s failed (%s); keeping the resident version",
+                               name, path, e)
+                return stale.model
+            entry = _Entry(model, path, version, model_size_bytes(model, path))
+            entry.uses = 1
+            with self._lock:
+                self._entries[name] = entry
+                self._entries.move_to_end(name)
+                if stale is None:
+                    self.loads += 1
+                else:
+                    self.reloads += 1
+                self._evict(keep=name)
+            logger.info("%s model '%s' from %s in %.2fs (%.1f MB)", "Reloaded" if stale else "Loaded",
+                        name, path, time.perf_counter() - start, entry.size / 1024 / 1024)
+            return model
+
+    def _evict(self, keep: str) -> None:
+        while len(self._entries) > 1 and (
+                len(self._entries) > self.max_models or (self.max_bytes and self.resident_bytes > self.max_bytes)):
+            name = next(iter(self._entries))
+            if name == keep:
+                break
+            evicted = self._entries.pop(name)
+            self.evictions += 1
+            logger.info("Evicted model '%s' (%.1f MB)", name, evicted.size / 1024 / 1024)
+
+    @property
+    def resident_bytes(self) -> int:
+        return sum(e.size for e in self._entries.values())
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._entries
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            resident = [{"name": name, "path": str(e.path), "size_mb": round(e.size / 1024 / 1024, 1),
+                         "uses": e.uses, "loaded_at": round(e.loaded_at, 3)}
+                        for name, e in self._entries.items()]
+        return {
+            "available": self.available(),
+            "resident": resident,  # least recently used first
+            "resident_mb": round(sum(e["size_mb"] for e in resident), 1),
+            "max_models": self.max_models,
+            "max_mb": round(self.max_bytes / 1024 / 1024, 1),
+            "loads": self.loads,
+            "reloads": self.reloads,
+            "reload_failures": self.reload_failures,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,289 @@
+"""
+Pre-fork server: load the models once, then fork N uvicorn workers.
+
+``uvicorn --workers N`` starts N fresh interpreters that each import the app
+and load YOLO and BLIP again, multiplying RAM. Here the parent process loads
+the models (``app.main.load_models``), freezes the GC so collections in the
+workers do not write to the inherited objects, and forks workers that serve
+on one shared listening socket. Weight tensors are never written after
+loading (``requires_grad`` off, inference mode), so their pages stay shared
+copy-on-write between all workers.
+
+The parent stays a small supervisor: when a worker dies it forks a
+replacement from its own (already loaded) memory, with a backoff if workers
+keep crashing right after start. SIGTERM/SIGINT are forwarded to the
+workers, which finish in-flight requests before exiting.
+
+The parent never runs inference and starts no threads before forking; the
+thread pools (inference executor, torch intra-op) are created in each worker.
+The log writer thread (``app.logs``) is stopped around every fork.
+
+State a follow-up request must find -- annotated images behind
+``image_url`` and ``?caption=async`` jobs -- goes through ``SHARED_STATE_DIR``
+(a temporary directory unless set), since the next request may land on
+another worker. The result cache memory tier, admission control and the
+registry limits stay per worker; set ``RESULT_CACHE_DIR`` to share cached
+results.
+
+The port is bound only after the parent has loaded the models, so /livez
+cannot answer during the load; ``start.sh`` therefore runs plain uvicorn for
+a single worker (the app then loads in the background).
+
+Usage::
+
+    python -m app.serve --host 0.0.0.0 --port 8000 --workers 4
+"""
+import argparse
+import gc
+import logging
+import os
+import shutil
+import signal
+import socket
+import tempfile
+import time
+from typing import Callable, Dict, Optional
+
+from app.logs import setup_logging
+
+logger = logging.getLogger("app.serve")
+
+
+def _exit_with_parent() -> None:
+    """Ask the kernel to SIGTERM this worker if the supervisor dies (Linux only)."""
+    try:
+        import ctypes
+
+        PR_SET_PDEATHSIG = 1
+        ctypes.CDLL(None, use_errno=True).prctl(PR_SET_PDEATHSIG, signal.SIGTERM)
+    except (OSError, AttributeError):
+        pass
+
+
+class Supervisor:
+    """Keeps ``workers`` forked children running ``target`` until stopped."""
+
+    def __init__(self, target: Callable[[int], None], workers: int, graceful_timeout: float = 15.0,
+                 on_exit: Optional[Callable[[int], None]] = None, min_uptime: float = 5.0,
+                 max_backoff: float = 30.0):
+        self.target = target
+        self.workers = max(1, workers)
+        self.graceful_timeout = graceful_timeout
+        self.on_exit = on_exit
+        self.min_uptime = min_uptime
+        self.max_backoff = max_backoff
+        self.children: Dict[int, int] = {}  # pid -> slot
+        self.restarts = 0
+        self._started_at: Dict[int, float] = {}
+        self._backoff: Dict[int, float] = {}
+        self._respawn_at: Dict[int, float] = {}
+        self._stopping = False
+
+    def spawn(self, slot: int) -> int:
+        pid = os.fork()
+        if pid == 0:
+            code = 1
+            try:
+                signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                signal.signal(signal.SIGINT, signal.SIG_DFL)
+                _exit_with_parent()
+                self.target(slot)
+                code = 0
+            except SystemExit as e:
+                code = e.code if isinstance(e.code, int) else 1
+            except BaseException:
+                logger.exception("Worker %d crashed", slot)
+            finally:
+                os._exit(code)
+        self.children[pid] = slot
+        self._started_at[slot] = time.monotonic()
+        logger.info("Started worker %d (pid %d)", slot, pid)
+        return pid
+
+    def stop(self) -> None:
+        self._stopping = True
+
+    def _reap(self) -> None:
+        while self.children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            slot = self.children.pop(pid, None)
+            if slot is None:
+                continue
+            if self.on_exit:
+                self.on_exit(pid)
+            if self._stopping:
+                continue
+            logger.warning("Worker %d (pid %d) exited with status %d; restarting",
+                           slot, pid, os.waitstatus_to_exitcode(status))
+            uptime = time.monotonic() - self._started_at.get(slot, 0.0)
+            backoff = self._backoff.get(slot, 0.0)
+            # Crash loop: wait longer before each restart
+            backoff = min(self.max_backoff, max(1.0, backoff * 2)) if uptime < self.min_uptime else 0.0
+            self._backoff[slot] = backoff
+            self._respawn_at[slot] = time.monotonic() + backoff
+
+    def run(self, poll_interval: float = 0.2) -> None:
+        for slot in range(self.workers):
+            self.spawn(slot)
+        while not self._stopping:
+            self._reap()
+            now = time.monotonic()
+            for slot, at in list(self._respawn_at.items()):
+                if at <= now and not self._stopping:
+                    del self._respawn_at[slot]
+                    self.restarts += 1
+                    self.spawn(slot)
+            time.sleep(poll_interval)
+        self._shutdown()
+
+    def _shutdown(self) -> None:
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        deadline = time.monotonic() + self.graceful_timeout
+        while self.children and time.monotonic() < deadline:
+            self._reap()
+            time.sleep(0.05)
+        for pid in list(self.children):
+            logger.warning("Worker pid %d did not exit in %.0fs; killing", pid, self.graceful_timeout)
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        while self.children:
+            try:
+                pid, _ = os.waitpid(-1, 0)
+            except ChildProcessError:
+                break
+            self.children.pop(pid, None)
+            if self.on_exit:
+                self.on_exit(pid)
+
+
+def freeze_model_weights(module) -> None:
+    """Mark a torch module's parameters read-only so nothing writes to shared pages."""
+    try:
+        module.eval()
+        module.requires_grad_(False)
+    except AttributeError:
+        pass
+
+
+def _torch_modules(main) -> list:
+    modules = []
+    yolo = getattr(main.model, "model", None)
+    if yolo is not None and hasattr(yolo, "requires_grad_"):
+        modules.append(yolo)
+    if main.caption_engine.model is not None:
+        modules.append(main.caption_engine.model)
+    return modules
+
+
+def _set_torch_threads(threads: int) -> None:
+    if threads <= 0:
+        return
+    try:
+        import torch
+    except ImportError:
+        return
+    torch.set_num_threads(threads)
+
+
+def _pin_worker(slot: int, workers: int) -> None:
+    """Give each worker its own slice of the cores (its CPU lanes are planned inside it)."""
+    from app.cpu_lanes import available_cpus, partition
+
+    slices = partition(available_cpus(), workers)
+    if len(slices) == workers and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, slices[slot % workers])
+
+
+def bind_socket(host: str, port: int, backlog: int = 2048) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Pre-fork server sharing model weights between workers")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", "1")))
+    parser.add_argument("--threads-per-worker", type=int, default=int(os.getenv("TORCH_THREADS_PER_WORKER", "0")),
+                        help="torch intra-op threads per worker (0 = cores / workers)")
+    parser.add_argument("--timeout-keep-alive", type=int, default=180)
+    parser.add_argument("--timeout-graceful-shutdown", type=float, default=15)
+    args = parser.parse_args(argv)
+
+    setup_logging(os.getenv("LOG_LEVEL", "INFO"), os.getenv("LOG_FORMAT", "json").lower())
+
+    # Metrics from all workers are aggregated through files in this directory;
+    # it must be set before prometheus_client is imported
+    metrics_dir = None
+    if args.workers > 1 and not os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        metrics_dir = tempfile.mkdtemp(prefix="ai-detection-metrics-")
+        os.environ["PROMETHEUS_MULTIPROC_DIR"] = metrics_dir
+    # Annotated images and caption jobs are looked up by later requests on any worker
+    state_dir = None
+    if args.workers > 1 and not os.environ.get("SHARED_STATE_DIR"):
+        state_dir = tempfile.mkdtemp(prefix="ai-detection-state-")
+        os.environ["SHARED_STATE_DIR"] = state_dir
+
+    import uvicorn
+    import app.main as main_module
+    from app.metrics import mark_worker_dead
+
+    start = time.perf_counter()
+    main_module.load_models()
+    for module in _torch_modules(main_module):
+        freeze_model_weights(module)
+    logger.info("Models loaded in parent in %.1fs; forking %d worker(s)", time.perf_counter() - start, args.workers)
+
+    sock = bind_socket(args.host, args.port)
+    # Objects that exist now live for the whole process; keep the GC from
+    # touching (and so un-sharing) their pages in the workers
+    gc.collect()
+    gc.freeze()
+
+    threads = args.threads_per_worker or max(1, (os.cpu_count() or 1) // args.workers)
+
+    def run_worker(slot: int) -> None:
+        _set_torch_threads(threads)
+        if main_module.INFERENCE_LANES not in ("", "0") and args.workers > 1:
+            _pin_worker(slot, args.workers)
+        config = uvicorn.Config(main_module.app, timeout_keep_alive=args.timeout_keep_alive,
+                                timeout_graceful_shutdown=args.timeout_graceful_shutdown,
+                                log_config=None, access_log=False)  # TraceMiddleware logs requests
+        uvicorn.Server(config).run(sockets=[sock])
+
+    supervisor = Supervisor(run_worker, args.workers, graceful_timeout=args.timeout_graceful_shutdown + 5,
+                            on_exit=mark_worker_dead)
+
+    def handle_stop(signum, frame):
+        logger.info("Received signal %d; stopping workers", signum)
+        supervisor.stop()
+
+    signal.signal(signal.SIGTERM, handle_stop)
+    signal.signal(signal.SIGINT, handle_stop)
+    try:
+        supervisor.run()
+    finally:
+        sock.close()
+        for path in (metrics_dir, state_dir):
+            if path:
+                shutil.rmtree(path, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Helpers for live frame streams (``/ws/detect``).
+
+A camera produces frames faster than CPU inference can keep up with, and a
+queue of old frames only adds latency. ``LatestFrameSlot`` keeps just the
+newest unprocessed frame: a frame that arrives while another is still
+waiting replaces it and is counted as dropped. ``RateMeter`` reports the
+effective processed FPS over a sliding window.
+"""
+import asyncio
+import time
+from collections import deque
+from typing import Any, Deque, Optional
+
+
+class LatestFrameSlot:
+    def __init__(self):
+        self._item: Any = None
+        self._event = asyncio.Event()
+        self.closed = False
+        self.received = 0
+        self.dropped = 0
+
+    def put(self, item: Any) -> None:
+        if self._item is not None:
+            self.dropped += 1  # never processed: a newer frame is here
+        self._item = item
+        self.received += 1
+        self._event.set()
+
+    async def get(self) -> Optional[Any]:
+        """Newest frame, waiting for one if needed; None once closed and empty."""
+        while self._item is None:
+            if self.closed:
+                return None
+            self._event.clear()
+            await self._event.wait()
+        item, self._item = self._item, None
+        return item
+
+    def close(self) -> None:
+        self.closed = True
+        self._event.set()
+
+
+class RateMeter:
+    """Events per second over the last ``window`` seconds."""
+
+    def __init__(self, window: float = 5.0):
+        self.window = window
+        self._times: Deque[float] = deque()
+
+    def tick(self) -> None:
+        now = time.monotonic()
+        self._times.append(now)
+        self._trim(now)
+
+    def _trim(self, now: float) -> None:
+        while self._times and now - self._times[0] > self.window:
+            self._times.popleft()
+
+    def rate(self) -> float:
+        now = time.monotonic()
+        self._trim(now)
+        if len(self._times) < 2:
+            return 0.0
+        span = now - self._times[0]
+        return (len(self._times) - 1) / span if span > 0 else 0.0
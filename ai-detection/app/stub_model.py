@@ -0,0 +1,94 @@
+"""
+Offline stand-in for the YOLO model (``MODEL_BACKEND=stub``).
+
+Needs no weights, network or ultralytics: it exposes the slice of the
+ultralytics ``YOLO``/``Results`` interface the API uses (``predict``,
+``boxes.cls/conf/xyxy``, ``names``, ``speed``, ``plot``). Detections are
+derived deterministically from the pixels, and each image costs a real
+resize to ``imgsz`` plus ``STUB_MODEL_WORK_MS`` of CPU work, so load tests
+and CI exercise the whole serving path with a realistic cost profile.
+"""
+import os
+import time
+import zlib
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+STUB_NAMES = {0: "person", 1: "bicycle", 2: "car", 3: "motorcycle", 5: "bus",
+              16: "dog", 56: "chair", 62: "tv"}
+
+
+class StubBoxes:
+    def __init__(self, xyxy: np.ndarray, cls: np.ndarray, conf: np.ndarray):
+        self.xyxy = xyxy
+        self.cls = cls
+        self.conf = conf
+
+
+class StubResult:
+    def __init__(self, img: np.ndarray, boxes: StubBoxes, speed: Dict[str, float]):
+        self.orig_img = img
+        self.boxes = boxes
+        self.names = STUB_NAMES
+        self.speed = speed
+
+    def plot(self) -> np.ndarray:
+        import cv2
+
+        canvas = self.orig_img.copy()
+        for (x1, y1, x2, y2), c in zip(self.boxes.xyxy.astype(int).tolist(), self.boxes.cls.tolist()):
+            cv2.rectangle(canvas, (x1, y1), (x2, y2), (0, 255, 0), 2)
+            cv2.putText(canvas, self.names[int(c)], (x1, max(12, y1 - 4)),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 1)
+        return canvas
+
+
+def _burn_cpu(milliseconds: float) -> None:
+    deadline = time.perf_counter() + milliseconds / 1000.0
+    a = np.ones((64, 64), dtype=np.float32)
+    while time.perf_counter() < deadline:
+        a = np.tanh(a @ a * 1e-3)
+
+
+class StubYOLO:
+    names = STUB_NAMES
+    task = "detect"
+
+    def __init__(self, work_ms: Optional[float] = None):
+        if work_ms is None:
+            work_ms = float(os.getenv("STUB_MODEL_WORK_MS", "20"))
+        self.work_ms = work_ms
+
+    def _detect(self, img: np.ndarray, imgsz: int) -> StubResult:
+        import cv2
+
+        start = time.perf_counter()
+        h, w = img.shape[:2]
+        ratio = imgsz / max(h, w)
+        resized = cv2.resize(img, (max(1, int(w * ratio)), max(1, int(h * ratio))),
+                             interpolation=cv2.INTER_LINEAR)
+        preprocess = time.perf_counter()
+
+        _burn_cpu(self.work_ms)
+        # Same pixels → same detections
+        thumb = cv2.resize(resized, (8, 8), interpolation=cv2.INTER_AREA)
+        rng = np.random.default_rng(zlib.crc32(thumb.tobytes()))
+        n = int(rng.integers(0, 6))
+        x1 = rng.uniform(0, w * 0.7, n)
+        y1 = rng.uniform(0, h * 0.7, n)
+        xyxy = np.stack([x1, y1, x1 + rng.uniform(0.1, 0.3, n) * w,
+                         y1 + rng.uniform(0.1, 0.3, n) * h], axis=1).astype(np.float32).reshape(n, 4)
+        cls = rng.choice(list(STUB_NAMES), n).astype(np.float32)
+        conf = rng.uniform(0.3, 0.95, n).astype(np.float32)
+        inference = time.perf_counter()
+
+        boxes = StubBoxes(xyxy, cls, conf)
+        done = time.perf_counter()
+        speed = {"preprocess": (preprocess - start) * 1000, "inference": (inference - preprocess) * 1000,
+                 "postprocess": (done - inference) * 1000}
+        return StubResult(img, boxes, speed)
+
+    def predict(self, source: Any, imgsz: int = 640, **kwargs: Any) -> List[StubResult]:
+        images = source if isinstance(source, list) else [source]
+        return [self._detect(img, imgsz) for img in images]
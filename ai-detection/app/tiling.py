@@ -0,0 +1,130 @@
+"""
+Tiled (sliced) inference for very large images.
+
+YOLO letterboxes its input to ``imgsz`` (640 px), so on a 6000 px aerial or
+warehouse shot every object shrinks ~10x and small ones disappear. Here the
+full-resolution image is cut into overlapping tiles of ``tile_size`` px; the
+tiles (plus the whole image, for objects larger than a tile) go through YOLO
+as ordinary batch items, and their boxes are shifted back to image
+coordinates and merged with class-aware NMS.
+
+Boxes of an object cut by a tile edge are partial, so duplicates are matched
+by intersection over the *smaller* box (IoS) rather than IoU: a partial box
+lies almost entirely inside the full one.
+"""
+from typing import Any, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+Window = Tuple[int, int, int, int]  # x0, y0, x1, y1
+
+
+def _starts(length: int, size: int, step: int) -> List[int]:
+    if length <= size:
+        return [0]
+    starts = list(range(0, length - size, step))
+    starts.append(length - size)  # last tile flush with the edge
+    return starts
+
+
+def tile_windows(width: int, height: int, tile_size: int, overlap: float) -> List[Window]:
+    """Overlapping ``tile_size`` windows covering the image (row-major)."""
+    step = max(1, int(tile_size * (1.0 - overlap)))
+    return [(x, y, min(width, x + tile_size), min(height, y + tile_size))
+            for y in _starts(height, tile_size, step)
+            for x in _starts(width, tile_size, step)]
+
+
+def nms(xyxy: np.ndarray, conf: np.ndarray, cls: np.ndarray, threshold: float,
+        metric: str = "ios") -> np.ndarray:
+    """
+    Class-aware greedy NMS; returns the kept indices, highest confidence first.
+    ``metric`` is ``"ios"`` (intersection over the smaller box) or ``"iou"``.
+    """
+    if len(xyxy) == 0:
+        return np.zeros(0, dtype=np.int64)
+    # Offset every class into its own region so boxes of different classes never overlap
+    offset = cls.astype(np.float64)[:, None] * (float(xyxy.max()) + 1.0)
+    boxes = xyxy.astype(np.float64) + offset
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    order = np.argsort(-conf, kind="stable")
+    keep = []
+    while order.size:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        w = np.clip(np.minimum(boxes[i, 2], boxes[rest, 2]) - np.maximum(boxes[i, 0], boxes[rest, 0]), 0, None)
+        h = np.clip(np.minimum(boxes[i, 3], boxes[rest, 3]) - np.maximum(boxes[i, 1], boxes[rest, 1]), 0, None)
+        inter = w * h
+        if metric == "iou":
+            denom = areas[i] + areas[rest] - inter
+        else:
+            denom = np.minimum(areas[i], areas[rest])
+        overlap = inter / np.maximum(denom, 1e-9)
+        order = rest[overlap <= threshold]
+    return np.array(keep, dtype=np.int64)
+
+
+class TiledBoxes:
+    def __init__(self, xyxy: np.ndarray, cls: np.ndarray, conf: np.ndarray):
+        self.xyxy = xyxy
+        self.cls = cls
+        self.conf = conf
+
+
+class TiledResult:
+    """Merged detections in image coordinates, with the Results attributes the API reads."""
+
+    def __init__(self, img: np.ndarray, boxes: TiledBoxes, names: Dict[int, str],
+                 speed: Dict[str, float], tiles: int):
+        self.orig_img = img
+        self.boxes = boxes
+        self.names = names
+        self.speed = speed
+        self.tiles = tiles
+
+    def plot(self) -> np.ndarray:
+        import cv2
+
+        canvas = self.orig_img.copy()
+        thickness = max(2, round(max(canvas.shape[:2]) / 800))
+        scale = thickness / 3
+        for (x1, y1, x2, y2), c, p in zip(self.boxes.xyxy.astype(int).tolist(), self.boxes.cls.tolist(),
+                                          self.boxes.conf.tolist()):
+            cv2.rectangle(canvas, (x1, y1), (x2, y2), (0, 255, 0), thickness)
+            cv2.putText(canvas, f"{self.names[int(c)]} {p:.2f}", (x1, max(12, y1 - 4)),
+                        cv2.FONT_HERSHEY_SIMPLEX, scale, (0, 255, 0), max(1, thickness // 2))
+        return canvas
+
+
+def _as_numpy(value: Any) -> np.ndarray:
+    if hasattr(value, "cpu"):
+        value = value.cpu().numpy()
+    return np.asarray(value, dtype=np.float32)
+
+
+def merge_tile_results(img: np.ndarray, results: Sequence[Any], windows: Sequence[Window],
+                       nms_threshold: float = 0.5) -> TiledResult:
+    """
+    Shift each tile's boxes by its window origin and merge them with NMS.
+    ``results`` holds one Results per window, optionally followed by one for
+    the whole image (already in image coordinates).
+    """
+    all_xyxy, all_cls, all_conf = [], [], []
+    speed = {"preprocess": 0.0, "inference": 0.0, "postprocess": 0.0}
+    origins = list(windows) + [(0, 0, 0, 0)] * (len(results) - len(windows))
+    for result, (x0, y0, _, _) in zip(results, origins):
+        xyxy = _as_numpy(result.boxes.xyxy).reshape(-1, 4)
+        all_xyxy.append(xyxy + np.array([x0, y0, x0, y0], dtype=np.float32))
+        all_cls.append(_as_numpy(result.boxes.cls).reshape(-1))
+        all_conf.append(_as_numpy(result.boxes.conf).reshape(-1))
+        for key, value in (getattr(result, "speed", None) or {}).items():
+            if key in speed and value:
+                speed[key] += value
+
+    xyxy = np.concatenate(all_xyxy) if all_xyxy else np.zeros((0, 4), np.float32)
+    cls = np.concatenate(all_cls) if all_cls else np.zeros(0, np.float32)
+    conf = np.concatenate(all_conf) if all_conf else np.zeros(0, np.float32)
+    keep = nms(xyxy, conf, cls, nms_threshold)
+    names = results[0].names if results else {}
+    return TiledResult(img, TiledBoxes(xyxy[keep], cls[keep], conf[keep]), names, speed, len(windows))
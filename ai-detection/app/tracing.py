@@ -0,0 +1,251 @@
+"""
+Per-request traces.
+
+``TraceMiddleware`` gives every HTTP request a trace (W3C ``traceparent``
+is continued when present; the id is returned in ``X-Trace-Id``). Pipeline
+stages add child spans through ``record_span`` (``app.metrics.stage_timer``
+does this for every timed stage); the trace lives in a context variable,
+which ``InferenceExecutor`` copies into its worker threads.
+
+When the response is complete the trace becomes ONE log record on the
+``app.request`` logger (method, path, status, duration and per-stage
+milliseconds) instead of separate lines per event. Successful requests are
+sampled (``sample_rate``); errors and slow requests are always kept.
+Health/metrics probes are only logged when they fail.
+
+Optionally, sampled traces are also written as OTLP/JSON
+(``ExportTraceServiceRequest``, one per line) to a file that an
+OpenTelemetry collector can tail (``filelog`` / ``otlpjsonfile``
+receivers). The file is written by a background thread.
+"""
+import contextvars
+import json
+import logging
+import os
+import queue
+import random
+import re
+import time
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, List, Optional, Tuple
+
+request_logger = logging.getLogger("app.request")
+
+QUIET_PATHS = ("/livez", "/readyz", "/health", "/metrics")
+
+_TRACEPARENT = re.compile(r"^[0-9a-f]{2}-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+
+_current: "contextvars.ContextVar[Optional[Trace]]" = contextvars.ContextVar("trace", default=None)
+
+
+def _new_id(nbytes: int) -> str:
+    return os.urandom(nbytes).hex()
+
+
+class Trace:
+    def __init__(self, name: str, trace_id: Optional[str] = None, parent_span_id: Optional[str] = None):
+        self.name = name
+        self.trace_id = trace_id or _new_id(16)
+        self.span_id = _new_id(8)
+        self.parent_span_id = parent_span_id
+        self.start_ns = time.time_ns()
+        self._start = time.perf_counter()
+        self.end_ns = 0
+        self.spans: List[Tuple[str, int, int]] = []  # (name, start_ns, end_ns)
+        self.attributes: Dict[str, Any] = {}
+
+    def add_span(self, name: str, start: float, end: float) -> None:
+        """``start``/``end`` are ``time.perf_counter()`` values."""
+        self.spans.append((name, self.start_ns + int((start - self._start) * 1e9),
+                           self.start_ns + int((end - self._start) * 1e9)))
+
+    def finish(self) -> None:
+        self.end_ns = self.start_ns + int((time.perf_counter() - self._start) * 1e9)
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+    def stage_ms(self) -> Dict[str, float]:
+        """Milliseconds per span name (summed when a stage ran more than once)."""
+        totals: Dict[str, float] = {}
+        for name, start, end in self.spans:
+            totals[name] = totals.get(name, 0.0) + (end - start) / 1e6
+        return {name: round(ms, 2) for name, ms in totals.items()}
+
+
+def current_trace() -> Optional[Trace]:
+    return _current.get()
+
+
+def record_span(name: str, start: float, end: float) -> None:
+    """Attach a finished stage (``perf_counter`` bounds) to the current request, if any."""
+    trace = _current.get()
+    if trace is not None:
+        trace.add_span(name, start, end)
+
+
+def set_attribute(key: str, value: Any) -> None:
+    trace = _current.get()
+    if trace is not None:
+        trace.attributes[key] = value
+
+
+def parse_traceparent(header: Optional[str]) -> Tuple[Optional[str], Optional[str]]:
+    match = _TRACEPARENT.match(header.strip().lower()) if header else None
+    if not match or set(match.group(1)) == {"0"}:
+        return None, None
+    return match.group(1), match.group(2)
+
+
+def _attr(key: str, value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        wrapped = {"boolValue": value}
+    elif isinstance(value, int):
+        wrapped = {"intValue": str(value)}
+    elif isinstance(value, float):
+        wrapped = {"doubleValue": value}
+    else:
+        wrapped = {"stringValue": str(value)}
+    return {"key": key, "value": wrapped}
+
+
+def to_otlp(trace: Trace, service_name: str = "ai-detection") -> Dict[str, Any]:
+    """The trace as an OTLP/JSON ExportTraceServiceRequest (root span + one span per stage)."""
+    status = trace.attributes.get("http.status_code", 0)
+    root = {
+        "traceId": trace.trace_id,
+        "spanId": trace.span_id,
+        "name": trace.name,
+        "kind": 2,  # SERVER
+        "startTimeUnixNano": str(trace.start_ns),
+        "endTimeUnixNano": str(trace.end_ns or time.time_ns()),
+        "attributes": [_attr(k, v) for k, v in trace.attributes.items()],
+        "status": {"code": 2 if status >= 500 else 1},
+    }
+    if trace.parent_span_id:
+        root["parentSpanId"] = trace.parent_span_id
+    spans = [root] + [
+        {"traceId": trace.trace_id, "spanId": _new_id(8), "parentSpanId": trace.span_id, "name": name,
+         "kind": 1, "startTimeUnixNano": str(start), "endTimeUnixNano": str(end)}
+        for name, start, end in trace.spans
+    ]
+    return {"resourceSpans": [{
+        "resource": {"attributes": [_attr("service.name", service_name)]},
+        "scopeSpans": [{"scope": {"name": "app.tracing"}, "spans": spans}],
+    }]}
+
+
+class _OTLPFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        return json.dumps(to_otlp(record.trace), separators=(",", ":"))
+
+
+class OTLPFileExporter:
+    """Appends OTLP/JSON lines to ``path`` from a background thread."""
+
+    def __init__(self, path: str):
+        self.path = path
+        file_handler = logging.FileHandler(path, encoding="utf-8", delay=True)
+        file_handler.setFormatter(_OTLPFormatter())
+        self._file_handler = file_handler
+        self._handler = QueueHandler(queue.SimpleQueue())
+        # The record carries the Trace object; it is serialized on the listener thread
+        self._handler.prepare = lambda record: record
+        self._listener: Optional[QueueListener] = None
+        self._start()
+        # Same as app.logs: no fork while the writer thread is running
+        os.register_at_fork(before=self._stop, after_in_parent=self._start, after_in_child=self._start)
+
+    def _start(self) -> None:
+        if self._listener is None:
+            self._listener = QueueListener(self._handler.queue, self._file_handler)
+            self._listener.start()
+
+    def _stop(self) -> None:
+        if self._listener is not None:
+            self._listener.stop()
+            self._listener = None
+
+    def export(self, trace: Trace) -> None:
+        record = logging.LogRecord("app.tracing", logging.INFO, __file__, 0, "", None, None)
+        record.trace = trace
+        self._handler.emit(record)
+
+    def close(self) -> None:
+        """Write everything queued and stop the thread."""
+        self._stop()
+        self._file_handler.close()
+
+
+class TraceMiddleware:
+    """Pure ASGI middleware: one trace and at most one log record per HTTP request."""
+
+    def __init__(self, app: Any, sample_rate: float = 1.0, slow_ms: float = 2000.0,
+                 exporter: Optional[OTLPFileExporter] = None):
+        self.app = app
+        self.sample_rate = sample_rate
+        self.slow_ms = slow_ms
+        self.exporter = exporter
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope.get("headers") or [])
+        trace_id, parent = parse_traceparent(headers.get(b"traceparent", b"").decode("latin-1") or None)
+        path = scope.get("path", "")
+        trace = Trace(f"{scope.get('method', 'GET')} {path}", trace_id, parent)
+        client = scope.get("client")
+        trace.attributes.update({"http.method": scope.get("method", ""), "http.target": path,
+                                 "client.address": client[0] if client else "-"})
+        token = _current.set(trace)
+        status = 500
+
+        async def send_wrapper(message: Dict[str, Any]) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(b"x-trace-id", trace.trace_id.encode())]
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                trace.finish()  # streaming responses end with the last body chunk
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            if not trace.end_ns:
+                trace.finish()
+            trace.attributes["http.status_code"] = status
+            self.emit(trace, path, status)
+
+    def should_log(self, path: str, status: int, duration_ms: float) -> bool:
+        if status >= 400 or duration_ms >= self.slow_ms > 0:
+            return True
+        if path in QUIET_PATHS:
+            return False
+        return self.sample_rate >= 1.0 or random.random() < self.sample_rate
+
+    def emit(self, trace: Trace, path: str, status: int) -> None:
+        duration_ms = trace.duration_ms
+        if not self.should_log(path, status, duration_ms):
+            return
+        fields = {
+            "trace_id": trace.trace_id,
+            "method": trace.attributes.get("http.method"),
+            "path": path,
+            "status": status,
+            "duration_ms": round(duration_ms, 2),
+            "client": trace.attributes.get("client.address"),
+            "stages_ms": trace.stage_ms(),
+        }
+        extra = {k: v for k, v in trace.attributes.items() if not k.startswith(("http.", "client."))}
+        if extra:
+            fields["attributes"] = extra
+        level = logging.WARNING if status >= 500 else logging.INFO
+        request_logger.log(level, "%s %s -> %s (%.1f ms)", fields["method"], path, status, duration_ms,
+                           extra={"fields": fields})
+        if self.exporter is not None:
+            self.exporter.export(trace)
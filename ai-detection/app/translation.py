@@ -0,0 +1,74 @@
+"""
+English → Japanese phrase translation for captions and object names.
+
+The vocabulary is loaded once from a JSON data file and compiled into a
+single regular expression built from a character trie, so translating a
+caption is one left-to-right scan regardless of vocabulary size. Matching is
+word-boundary aware and prefers the longest phrase at each position
+("cars" never matches as "car" + "s", "hot dog" wins over "dog").
+"""
+import json
+import re
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+DEFAULT_DATA_PATH = Path(__file__).resolve().parent / "data" / "translations_ja.json"
+
+# Hiragana, katakana, CJK ideographs and full-width forms
+_CJK = "\u3000-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uff00-\uffef"
+_CJK_RE = re.compile(f"[{_CJK}]")
+_SPACE_NEAR_CJK = re.compile(f"\\s+(?=[{_CJK}])|(?<=[{_CJK}])\\s+")
+
+
+def _trie_regex(phrases: Iterable[str]) -> str:
+    """Regex alternation for ``phrases`` with shared prefixes factored out."""
+    trie: dict = {}
+    for phrase in phrases:
+        node = trie
+        for ch in phrase:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def build(node: dict) -> str:
+        alternatives = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not alternatives:
+            return ""
+        body = alternatives[0] if len(alternatives) == 1 else "(?:" + "|".join(alternatives) + ")"
+        # A phrase ends here: the rest is optional, tried first (greedy = longest match)
+        return f"(?:{body})?" if "" in node else body
+
+    return build(trie)
+
+
+class PhraseTranslator:
+    def __init__(self, phrases: Dict[str, str], objects: Optional[Dict[str, str]] = None):
+        self.objects = {k.lower(): v for k, v in (objects or {}).items()}
+        # Object names are also valid caption vocabulary; caption phrases win on conflict
+        self.table = {**self.objects, **{" ".join(k.lower().split()): v for k, v in phrases.items()}}
+        pattern = _trie_regex(self.table) if self.table else r"(?!x)x"
+        self._regex = re.compile(rf"(?<!\w)(?:{pattern})(?!\w)")
+
+    @classmethod
+    def from_file(cls, path: Optional[str] = None) -> "PhraseTranslator":
+        with open(path or DEFAULT_DATA_PATH, encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data.get("phrases", {}), data.get("objects", {}))
+
+    def translate(self, text: str) -> str:
+        """Translate known phrases; unknown words are kept as-is."""
+        normalized = " ".join(text.lower().split())
+        translated = self._regex.sub(lambda m: self.table[m.group(0)], normalized)
+        # Dropped phrases leave double spaces; Japanese does not separate words
+        return _SPACE_NEAR_CJK.sub("", " ".join(translated.split()))
+
+    def object_name(self, name: str) -> str:
+        """Japanese name of a YOLO class (falls back to the English name)."""
+        key = name.lower()
+        return self.objects.get(key) or self.table.get(key) or name
+
+    def __len__(self) -> int:
+        return len(self.table)
+
+
+def contains_japanese(text: str) -> bool:
+    return _CJK_RE.search(text) is not None
@@ -0,0 +1,278 @@
+"""
+Video decoding for /predict/video.
+
+Frames are decoded on a background thread and handed to the event loop
+through a small bounded buffer, so decoding the next frames overlaps with
+YOLO on the current ones while memory stays at a few frames regardless of
+clip length. Frames are downscaled to the serving size while decoding.
+
+Two decoders:
+
+  * ``ffmpeg`` (the binary, used when available): samples with the ``fps``
+    filter, or decodes keyframes only (``-skip_frame nokey``, non-keyframes
+    are never decoded); timestamps come from the ``showinfo`` filter.
+  * ``opencv`` (``cv2.VideoCapture``): rate sampling only; skipped frames
+    are grabbed but not converted.
+"""
+import asyncio
+import re
+import shutil
+import subprocess
+import threading
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple
+
+DECODERS = ("auto", "ffmpeg", "opencv")
+
+_PTS_TIME = re.compile(rb"pts_time:\s*(-?[0-9.]+)")
+
+
+class VideoError(Exception):
+    pass
+
+
+def probe_video(path: str) -> Dict[str, Any]:
+    """Size, frame rate and duration of the clip (raises VideoError if unreadable)."""
+    import cv2
+
+    cap = cv2.VideoCapture(path)
+    try:
+        if not cap.isOpened():
+            raise VideoError("Cannot open video")
+        fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+        frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH) or 0)
+        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT) or 0)
+    finally:
+        cap.release()
+    if not width or not height:
+        raise VideoError("Cannot read video stream")
+    return {"width": width, "height": height, "fps": round(fps, 3), "frame_count": frames,
+            "duration": round(frames / fps, 3) if fps else None}
+
+
+def output_size(width: int, height: int, max_side: int) -> Tuple[int, int]:
+    """Decode size: longest side at most ``max_side``, even dimensions (for ffmpeg)."""
+    ratio = min(1.0, max_side / max(width, height)) if max_side else 1.0
+    return max(2, int(width * ratio) // 2 * 2), max(2, int(height * ratio) // 2 * 2)
+
+
+def resolve_decoder(decoder: str) -> str:
+    if decoder not in DECODERS:
+        raise VideoError(f"Unknown video decoder '{decoder}' (expected one of {', '.join(DECODERS)})")
+    if decoder == "auto":
+        return "ffmpeg" if shutil.which("ffmpeg") else "opencv"
+    return decoder
+
+
+def iter_frames_opencv(path: str, sample_fps: float, max_side: int) -> Iterator[Tuple[float, Any]]:
+    """Yield ``(timestamp, BGR frame)`` every ``1 / sample_fps`` seconds."""
+    import cv2
+
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise VideoError("Cannot open video")
+    source_fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+    step = 1.0 / sample_fps
+    next_t = 0.0
+    index = 0
+    try:
+        while cap.grab():
+            t = index / source_fps if source_fps else cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+            index += 1
+            if t + 1e-6 < next_t:
+                continue  # grabbed (demuxed + decoded) but never converted to BGR
+            ok, frame = cap.retrieve()
+            if not ok:
+                continue
+            while next_t <= t + 1e-6:
+                next_t += step
+            h, w = frame.shape[:2]
+            if max_side and max(h, w) > max_side:
+                frame = cv2.resize(frame, output_size(w, h, max_side), interpolation=cv2.INTER_AREA)
+            yield t, frame
+    finally:
+        cap.release()
+
+
+def iter_frames_ffmpeg(path: str, width: int, height: int, sample_fps: float, keyframes: bool,
+                       max_side: int) -> Iterator[Tuple[float, Any]]:
+    """Yield ``(timestamp, BGR frame)`` decoded by an ffmpeg subprocess."""
+    import numpy as np
+
+    out_w, out_h = output_size(width, height, max_side)
+    filters = ["showinfo", f"scale={out_w}:{out_h}"]
+    cmd = ["ffmpeg", "-nostdin", "-hide_banner", "-loglevel", "info"]
+    if keyframes:
+        cmd += ["-skip_frame", "nokey"]
+    else:
+        filters.insert(0, f"fps={sample_fps}")
+    cmd += ["-i", path, "-an", "-sn", "-vf", ",".join(filters), "-vsync", "0",
+            "-f", "rawvideo", "-pix_fmt", "bgr24", "pipe:1"]
+
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    timestamps: List[float] = []
+    ts_ready = threading.Condition()
+    stderr_tail: List[bytes] = []
+
+    def read_stderr() -> None:
+        for line in proc.stderr:
+            match = _PTS_TIME.search(line)
+            if match:
+                with ts_ready:
+                    timestamps.append(float(match.group(1)))
+                    ts_ready.notify_all()
+            elif line.strip():
+                stderr_tail[:] = (stderr_tail + [line])[-5:]
+        with ts_ready:
+            ts_ready.notify_all()
+
+    reader = threading.Thread(target=read_stderr, daemon=True)
+    reader.start()
+    frame_bytes = out_w * out_h * 3
+    index = 0
+    try:
+        while True:
+            data = proc.stdout.read(frame_bytes)
+            if len(data) < frame_bytes:
+                break
+            with ts_ready:
+                # showinfo logs a frame before ffmpeg writes it out
+                ts_ready.wait_for(lambda: len(timestamps) > index or not reader.is_alive(), timeout=5)
+                t = timestamps[index] if len(timestamps) > index else index / sample_fps
+            index += 1
+            yield t, np.frombuffer(data, np.uint8).reshape(out_h, out_w, 3)
+        if proc.wait() != 0 and index == 0:
+            reader.join(timeout=1)
+            raise VideoError("ffmpeg failed: " + b"".join(stderr_tail).decode("utf-8", "replace").strip())
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+        reader.join(timeout=1)
+
+
+def open_frames(path: str, info: Dict[str, Any], decoder: str, sample_fps: float, keyframes: bool,
+                max_side: int) -> Callable[[], Iterator[Tuple[float, Any]]]:
+    """Frame iterator factory for the chosen decoder (validated before streaming starts)."""
+    decoder = resolve_decoder(decoder)
+    if decoder == "opencv":
+        if keyframes:
+            raise VideoError("keyframes=true needs the ffmpeg decoder")
+        return lambda: iter_frames_opencv(path, sample_fps, max_side)
+    return lambda: iter_frames_ffmpeg(path, info["width"], info["height"], sample_fps, keyframes, max_side)
+
+
+class BackgroundFrameReader:
+    """
+    Runs a frame iterator on its own thread; at most ``max_buffered`` decoded
+    frames wait for the consumer. Iterate with ``async for``; call ``stop()``
+    when done (also after an error or cancellation).
+    """
+
+    _DONE = object()
+
+    def __init__(self, frames: Callable[[], Iterator[Tuple[float, Any]]], max_buffered: int = 4):
+        self._frames = frames
+        self._slots = threading.Semaphore(max(1, max_buffered))
+        self._queue: "asyncio.Queue" = asyncio.Queue()
+        self._stop = threading.Event()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self.decoded = 0
+
+    def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._thread = threading.Thread(target=self._run, name="video-decode", daemon=True)
+        self._thread.start()
+
+    def _put(self, item: Any) -> None:
+        try:
+            self._loop.call_soon_threadsafe(self._queue.put_nowait, item)
+        except RuntimeError:
+            self._stop.set()  # event loop closed
+
+    def _run(self) -> None:
+        try:
+            for frame in self._frames():
+                while not self._slots.acquire(timeout=0.2):
+                    if self._stop.is_set():
+                        return
+                if self._stop.is_set():
+                    return
+                self.decoded += 1
+                self._put(frame)
+            self._put(self._DONE)
+        except Exception as e:
+            self._put(e)
+
+    def __aiter__(self) -> AsyncIterator[Tuple[float, Any]]:
+        return self._iterate()
+
+    async def _iterate(self) -> AsyncIterator[Tuple[float, Any]]:
+        if self._thread is None:
+            self.start()
+        while True:
+            item = await self._queue.get()
+            if item is self._DONE:
+                return
+            if isinstance(item, Exception):
+                raise item
+            self._slots.release()
+            yield item
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+
+class SegmentAccumulator:
+    """
+    Groups per-frame counts into fixed-length segments. A segment reports the
+    peak simultaneous count per class (``object_details``), how many sampled
+    frames contained each class, and a ``[t, counts]`` timeline.
+    """
+
+    def __init__(self, segment_seconds: float):
+        self.segment_seconds = segment_seconds
+        self.index = 0
+        self._frames: List[Tuple[float, Dict[str, int]]] = []
+        self.totals: Dict[str, int] = {}
+
+    def add(self, t: float, counts: Dict[str, int]) -> List[Dict[str, Any]]:
+        """Record a frame; returns the segments completed before ``t``."""
+        finished = []
+        index = int(t // self.segment_seconds)
+        if index > self.index:
+            if self._frames:
+                finished.append(self._emit())
+            # Segments with nothing sampled are skipped in one step, however long the gap
+            self.index = max(self.index, index)
+        self._frames.append((t, counts))
+        for name, n in counts.items():
+            self.totals[name] = max(self.totals.get(name, 0), n)
+        return finished
+
+    def flush(self) -> List[Dict[str, Any]]:
+        return [self._emit()] if self._frames else []
+
+    def _emit(self) -> Dict[str, Any]:
+        peak: Dict[str, int] = {}
+        present: Dict[str, int] = {}
+        for _, counts in self._frames:
+            for name, n in counts.items():
+                peak[name] = max(peak.get(name, 0), n)
+                present[name] = present.get(name, 0) + 1
+        segment = {
+            "type": "segment",
+            "index": self.index,
+            "start": round(self.index * self.segment_seconds, 3),
+            "end": round((self.index + 1) * self.segment_seconds, 3),
+            "frames": len(self._frames),
+            "object_details": peak,
+            "frames_with": present,
+            "timeline": [[round(t, 3), counts] for t, counts in self._frames],
+        }
+        self.index += 1
+        self._frames = []
+        return segment
@@ -0,0 +1,111 @@
+"""
+BLIPキャプション ベンチマークスクリプト
+
+従来の経路（fp32・1枚ずつ・max_length=50）と CaptionEngine の各設定
+（fp32 / int8 動的量子化、バッチ生成、生成長の上限）を比較し、
+1枚あたりのレイテンシと、従来経路のキャプションに対する品質（単語F1）を表示します。
+
+使い方:
+    python bench_caption.py [画像パス ...] [--batch 4] [--repeat 3]
+
+画像を指定しない場合は合成画像を使用します（レイテンシ測定のみ有意）。
+"""
+
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from app.captioning import CaptionEngine  # noqa: E402
+
+
+def load_images(paths, count):
+    import cv2
+    import numpy as np
+
+    images = [cv2.imread(p) for p in paths]
+    images = [img for img in images if img is not None]
+    if images:
+        return images
+    rng = np.random.default_rng(0)
+    return [rng.integers(0, 255, (480, 640, 3), dtype=np.uint8) for _ in range(count)]
+
+
+def legacy_captions(engine, images):
+    """従来の経路: 1枚ずつ max_length=50 で生成"""
+    import cv2
+    from PIL import Image
+
+    captions = []
+    for img in images:
+        pil_img = Image.fromarray(cv2.cvtColor(img, cv2.COLOR_BGR2RGB))
+        inputs = engine.processor(pil_img, return_tensors="pt")
+        out = engine.model.generate(**inputs, max_length=50)
+        captions.append(engine.processor.decode(out[0], skip_special_tokens=True))
+    return captions
+
+
+def word_f1(candidate, reference):
+    cand, ref = candidate.lower().split(), reference.lower().split()
+    if not cand or not ref:
+        return float(cand == ref)
+    common = sum(min(cand.count(w), ref.count(w)) for w in set(cand))
+    if common == 0:
+        return 0.0
+    precision, recall = common / len(cand), common / len(ref)
+    return 2 * precision * recall / (precision + recall)
+
+
+def timed(fn, repeat):
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    return result, statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="BLIP caption latency/quality benchmark")
+    parser.add_argument("images", nargs="*")
+    parser.add_argument("--batch", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--max-new-tokens", type=int, default=30)
+    args = parser.parse_args()
+
+    images = load_images(args.images, args.batch)
+    n = len(images)
+    print(f"📸 画像数: {n}  バッチ: {args.batch}  繰り返し: {args.repeat}")
+    print("-" * 72)
+
+    baseline_engine = CaptionEngine(variant="fp32")
+    baseline_engine.load()
+    reference, legacy_time = timed(lambda: legacy_captions(baseline_engine, images), args.repeat)
+    print(f"{'legacy fp32 (1枚ずつ, max_length=50)':<44} {legacy_time / n * 1000:8.1f} ms/枚  F1=1.000")
+
+    for variant in ("fp32", "int8"):
+        engine = CaptionEngine(variant=variant, max_new_tokens=args.max_new_tokens)
+        engine.load()
+        for batch in sorted({1, args.batch}):
+            def run():
+                out = []
+                for i in range(0, n, batch):
+                    out.extend(engine.caption_batch(images[i:i + batch]))
+                return out
+
+            captions, elapsed = timed(run, args.repeat)
+            f1 = statistics.mean(word_f1(c, r) for c, r in zip(captions, reference))
+            label = f"engine {variant} (batch={batch}, max_new_tokens={args.max_new_tokens})"
+            print(f"{label:<44} {elapsed / n * 1000:8.1f} ms/枚  F1={f1:.3f}")
+
+    print("-" * 72)
+    for i, caption in enumerate(reference[:5], 1):
+        print(f"{i}. {caption}")
+
+
+if __name__ == "__main__":
+    main()
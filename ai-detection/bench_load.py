@@ -0,0 +1,277 @@
+"""
+負荷テスト / ベンチマークハーネス
+
+決定的な合成画像（複数の解像度）を生成し、/predict/ に並行してリクエストを送り、
+スループット、レイテンシ（p50/p95/p99）、ピークRSS を表示します。
+結果をベースライン（JSON）として保存し、以降の実行と比較できます。
+
+モード:
+  * プロセス内（デフォルト）: app.main を直接読み込み、HTTPを経由せずASGIで呼び出し。
+    `--stub`（デフォルト）では MODEL_BACKEND=stub を使うため、重みファイルや
+    ネットワークなしで CI 上でも実行可能。
+  * リモート: `--url http://localhost:8000` で起動中のサーバーに送信。
+    ピークRSSはサーバーの /metrics から取得。
+
+使い方:
+    python bench_load.py --requests 200 --concurrency 8
+    python bench_load.py --real                       # 実際の MODEL_PATH を使用
+    python bench_load.py --url http://localhost:8000  # 起動中のサーバー
+    python bench_load.py --save-baseline bench/baseline.json
+    python bench_load.py --baseline bench/baseline.json --tolerance 0.2
+
+ベースラインより p95 が悪化、またはスループットが低下（許容率 `--tolerance` 超）した場合は
+終了コード 1 を返します。画像は毎回末尾のバイトを変えて送るため、結果キャッシュには
+ヒットしません（`--allow-cache` で無効化）。
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import resource
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+DEFAULT_RESOLUTIONS = ("320x240", "640x480", "1280x720", "1920x1080", "4032x3024")
+
+
+def synthetic_images(resolutions, seed: int = 0) -> List[Tuple[str, bytes]]:
+    """解像度ごとに決定的な JPEG を1枚生成（同じ seed なら同じバイト列）"""
+    import cv2
+    import numpy as np
+
+    images = []
+    for i, res in enumerate(resolutions):
+        w, h = (int(v) for v in res.lower().split("x"))
+        rng = np.random.default_rng(seed + i)
+        # 滑らかな背景 + 矩形（ノイズだけの画像より実写に近い圧縮率）
+        gx = np.linspace(0, 255, w, dtype=np.float32)
+        gy = np.linspace(0, 255, h, dtype=np.float32)[:, None]
+        img = np.dstack([np.broadcast_to(gx, (h, w)), np.broadcast_to(gy, (h, w)),
+                         np.full((h, w), 128, np.float32)]).astype(np.uint8)
+        for _ in range(12):
+            x1, y1 = int(rng.integers(0, w - 2)), int(rng.integers(0, h - 2))
+            x2, y2 = int(rng.integers(x1 + 1, w)), int(rng.integers(y1 + 1, h))
+            color = tuple(int(c) for c in rng.integers(0, 255, 3))
+            cv2.rectangle(img, (x1, y1), (x2, y2), color, -1)
+        ok, buf = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, 90])
+        if not ok:
+            raise RuntimeError(f"Cannot encode {res}")
+        images.append((res, buf.tobytes()))
+    return images
+
+
+def unique_variant(data: bytes, n: int) -> bytes:
+    """EOI 以降にバイトを追加（デコード結果は同じ、キャッシュキーだけ変わる）"""
+    return data + b"bench" + n.to_bytes(8, "big")
+
+
+def percentile(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * p / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def summarize(latencies: List[float]) -> Dict[str, float]:
+    return {
+        "count": len(latencies),
+        "mean_ms": round(statistics.mean(latencies) * 1000, 2) if latencies else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+    }
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """ベースラインに対する回帰の一覧（空なら合格）"""
+    regressions = []
+    base_tp, cur_tp = baseline["throughput_rps"], current["throughput_rps"]
+    if base_tp and cur_tp < base_tp * (1 - tolerance):
+        regressions.append(f"throughput {cur_tp:.2f} rps < baseline {base_tp:.2f} rps")
+    for key in ("p95_ms", "p99_ms"):
+        base, cur = baseline["latency"][key], current["latency"][key]
+        if base and cur > base * (1 + tolerance):
+            regressions.append(f"{key} {cur:.1f} > baseline {base:.1f}")
+    if current["errors"] > baseline.get("errors", 0):
+        regressions.append(f"errors {current['errors']} > baseline {baseline.get('errors', 0)}")
+    return regressions
+
+
+def _parse_rss(metrics_text: str) -> Optional[int]:
+    for line in metrics_text.splitlines():
+        if line.startswith("process_resident_memory_bytes "):
+            return int(float(line.split()[1]))
+    return None
+
+
+async def run_load(client, images, total: int, concurrency: int, warmup: int,
+                   allow_cache: bool, params: Dict[str, str], rss_probe=None) -> Dict[str, Any]:
+    """`client`（httpx.AsyncClient）で /predict/ に並行送信し、結果を集計"""
+    counter = iter(range(total + warmup))
+    latencies: List[float] = []
+    by_resolution: Dict[str, List[float]] = {res: [] for res, _ in images}
+    statuses: Dict[int, int] = {}
+    peak_rss = 0
+
+    async def send(n: int) -> Tuple[str, float, int]:
+        res, data = images[n % len(images)]
+        body = data if allow_cache else unique_variant(data, n)
+        start = time.perf_counter()
+        r = await client.post("/predict/", params=params,
+                              files={"file": (f"bench_{res}.jpg", body, "image/jpeg")})
+        return res, time.perf_counter() - start, r.status_code
+
+    for n in range(warmup):
+        await send(next(counter))
+
+    async def worker():
+        for n in counter:
+            res, elapsed, status = await send(n)
+            statuses[status] = statuses.get(status, 0) + 1
+            if status == 200:
+                latencies.append(elapsed)
+                by_resolution[res].append(elapsed)
+
+    async def sample_rss():
+        nonlocal peak_rss
+        while True:
+            rss = await rss_probe()
+            peak_rss = max(peak_rss, rss or 0)
+            await asyncio.sleep(0.5)
+
+    sampler = asyncio.ensure_future(sample_rss()) if rss_probe else None
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - start
+    if sampler:
+        sampler.cancel()
+        peak_rss = max(peak_rss, (await rss_probe()) or 0)
+
+    ok = statuses.get(200, 0)
+    return {
+        "requests": total,
+        "concurrency": concurrency,
+        "wall_seconds": round(wall, 3),
+        "throughput_rps": round(ok / wall, 2) if wall else 0.0,
+        "errors": total - ok,
+        "status_codes": {str(k): v for k, v in sorted(statuses.items())},
+        "latency": summarize(latencies),
+        "by_resolution": {res: summarize(v) for res, v in by_resolution.items() if v},
+        "peak_rss_mb": round(peak_rss / 1024 / 1024, 1) if peak_rss else None,
+    }
+
+
+async def start_in_process(app) -> None:
+    """startup フックを実行し、バックグラウンドのモデル読み込み・ウォームアップ完了まで待つ"""
+    import app.main as main
+
+    await app.router.startup()
+    if main._startup_task is not None:
+        await main._startup_task
+    if not main.app_ready:
+        await app.router.shutdown()
+        raise SystemExit("モデルの準備に失敗しました（ログを確認してください）")
+
+
+async def run_in_process(args, images, params) -> Dict[str, Any]:
+    if not args.real:
+        os.environ["MODEL_BACKEND"] = "stub"
+    if not args.allow_cache:
+        os.environ.setdefault("RESULT_CACHE_MAX_ENTRIES", "0")
+    import httpx
+    from app.main import app
+
+    await start_in_process(app)
+    try:
+        async with httpx.AsyncClient(app=app, base_url="http://bench", timeout=None) as client:
+            result = await run_load(client, images, args.requests, args.concurrency, args.warmup,
+                                    args.allow_cache, params)
+    finally:
+        await app.router.shutdown()
+    # ru_maxrss は Linux では KB 単位
+    result["peak_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    return result
+
+
+async def run_remote(args, images, params) -> Dict[str, Any]:
+    import httpx
+
+    async with httpx.AsyncClient(base_url=args.url.rstrip("/"), timeout=args.timeout) as client:
+        async def rss_probe():
+            try:
+                return _parse_rss((await client.get("/metrics")).text)
+            except Exception:
+                return None
+
+        return await run_load(client, images, args.requests, args.concurrency, args.warmup,
+                              args.allow_cache, params, rss_probe=rss_probe)
+
+
+def print_report(result: Dict[str, Any]) -> None:
+    lat = result["latency"]
+    print("=" * 72)
+    print(f"リクエスト: {result['requests']}  並行数: {result['concurrency']}  "
+          f"所要時間: {result['wall_seconds']}s  エラー: {result['errors']} {result['status_codes']}")
+    print(f"スループット: {result['throughput_rps']} req/s   ピークRSS: {result['peak_rss_mb']} MB")
+    print(f"レイテンシ: p50={lat['p50_ms']}ms  p95={lat['p95_ms']}ms  p99={lat['p99_ms']}ms  "
+          f"平均={lat['mean_ms']}ms")
+    print("-" * 72)
+    for res, s in result["by_resolution"].items():
+        print(f"  {res:<11} n={s['count']:<5} p50={s['p50_ms']:>8}ms  p95={s['p95_ms']:>8}ms  "
+              f"p99={s['p99_ms']:>8}ms")
+    print("=" * 72)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test for /predict/")
+    parser.add_argument("--url", help="起動中のサーバー（省略時はプロセス内）")
+    parser.add_argument("--real", action="store_true", help="プロセス内で実モデルを使用（stub を使わない）")
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--resolutions", default=",".join(DEFAULT_RESOLUTIONS))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--render", default="jpeg", help="/predict/ の render パラメータ")
+    parser.add_argument("--allow-cache", action="store_true", help="同じ画像を送り結果キャッシュを使う")
+    parser.add_argument("--timeout", type=float, default=180)
+    parser.add_argument("--output", help="結果をJSONで保存")
+    parser.add_argument("--save-baseline", help="結果をベースラインとして保存")
+    parser.add_argument("--baseline", help="比較するベースラインJSON")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="許容する悪化率（0.2 = 20%%）")
+    args = parser.parse_args()
+
+    images = synthetic_images(args.resolutions.split(","), args.seed)
+    params = {"render": args.render}
+    runner = run_remote if args.url else run_in_process
+    result = asyncio.run(runner(args, images, params))
+    result["mode"] = "remote" if args.url else ("in-process" if args.real else "in-process-stub")
+    print_report(result)
+
+    for path in (args.output, args.save_baseline):
+        if path:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            Path(path).write_text(json.dumps(result, indent=2, ensure_ascii=False))
+            print(f"💾 保存: {path}")
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())
+        regressions = compare(result, baseline, args.tolerance)
+        if regressions:
+            print("❌ ベースラインに対する回帰:")
+            for line in regressions:
+                print(f"  - {line}")
+            sys.exit(1)
+        print(f"✅ ベースライン内（許容率 {args.tolerance:.0%}）")
+
+
+if __name__ == "__main__":
+    main()
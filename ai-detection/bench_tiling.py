@@ -0,0 +1,113 @@
+"""
+ベンチマーク: タイル推論（tiled inference）と通常推論
+
+大きな合成画像を /predict/ に送り、`tile=off`（画像全体を imgsz に縮小して1回推論）と
+`tile=on`（重なりのあるタイルに分割してバッチ推論、NMS で統合）のレイテンシと
+メモリ使用量を比較します。メモリを正しく測るため、各モードは別プロセスで実行し、
+ピークRSS（ru_maxrss）と tracemalloc のピーク（numpy 配列を含む Python の確保量）を表示します。
+
+デフォルトは MODEL_BACKEND=stub（重み不要、1枚あたり STUB_MODEL_WORK_MS の CPU 負荷）。
+stub の検出結果は画素からの擬似乱数なので、検出数の比較には `--real` を使用してください。
+
+使い方:
+    python bench_tiling.py [--resolutions 3000x2000,6000x4000] [--repeat 3]
+    python bench_tiling.py --tile-size 640 --overlap 0.25
+    python bench_tiling.py --real                  # 実際の MODEL_PATH を使用
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from bench_load import start_in_process, synthetic_images  # noqa: E402
+
+
+async def measure(args) -> dict:
+    """1つのモードを計測（子プロセス内で実行）"""
+    if not args.real:
+        os.environ["MODEL_BACKEND"] = "stub"
+    os.environ["RESULT_CACHE_MAX_ENTRIES"] = "0"
+    import httpx
+    from app.main import app
+
+    images = synthetic_images(args.resolutions.split(","))
+    params = {"render": "none", "tile": args.worker, "tile_size": args.tile_size, "tile_overlap": args.overlap}
+    await start_in_process(app)
+    results = {}
+    try:
+        async with httpx.AsyncClient(app=app, base_url="http://bench", timeout=None) as client:
+            async def post(name, data):
+                resp = await client.post("/predict/", params=params, files={"file": (f"{name}.jpg", data, "image/jpeg")})
+                resp.raise_for_status()
+                return resp.json()
+
+            await post("warmup", images[0][1])
+            tracemalloc.start()
+            for res, data in images:
+                latencies = []
+                for _ in range(args.repeat):
+                    start = time.perf_counter()
+                    body = await post(res, data)
+                    latencies.append(time.perf_counter() - start)
+                results[res] = {"median_s": round(statistics.median(latencies), 3),
+                                "objects": body["object_count"], "tiles": body.get("tiles")}
+            _, traced_peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+    finally:
+        await app.router.shutdown()
+    return {
+        "by_resolution": results,
+        "traced_peak_mb": round(traced_peak / 1024 / 1024, 1),
+        # ru_maxrss は Linux では KB 単位
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def run_mode(args, mode: str) -> dict:
+    cmd = [sys.executable, __file__, "--worker", mode, "--resolutions", args.resolutions,
+           "--repeat", str(args.repeat), "--tile-size", str(args.tile_size), "--overlap", str(args.overlap)]
+    if args.real:
+        cmd.append("--real")
+    out = subprocess.run(cmd, check=True, stdout=subprocess.PIPE, text=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tiled vs plain inference benchmark")
+    parser.add_argument("--resolutions", default="3000x2000,6000x4000")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--tile-size", type=int, default=int(os.getenv("TILE_SIZE", "1024")))
+    parser.add_argument("--overlap", type=float, default=float(os.getenv("TILE_OVERLAP", "0.2")))
+    parser.add_argument("--real", action="store_true", help="実際のモデル（MODEL_PATH）を使用")
+    parser.add_argument("--worker", choices=("off", "on"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(asyncio.run(measure(args))))
+        return
+
+    plain = run_mode(args, "off")
+    tiled = run_mode(args, "on")
+    print(f"tile_size={args.tile_size} overlap={args.overlap} backend={'real' if args.real else 'stub'}")
+    print(f"{'解像度':<12}{'通常 (s)':>10}{'タイル (s)':>12}{'倍率':>8}{'タイル数':>10}{'検出数 通常/タイル':>22}")
+    for res in args.resolutions.split(","):
+        p, t = plain["by_resolution"][res], tiled["by_resolution"][res]
+        ratio = t["median_s"] / p["median_s"] if p["median_s"] else float("nan")
+        print(f"{res:<12}{p['median_s']:>10.3f}{t['median_s']:>12.3f}{ratio:>7.1f}x"
+              f"{t['tiles'] or 0:>10}{p['objects']:>12} / {t['objects']}")
+    print(f"ピークRSS (MB):       通常 {plain['peak_rss_mb']:>8.1f}   タイル {tiled['peak_rss_mb']:>8.1f}")
+    print(f"tracemalloc ピーク (MB): 通常 {plain['traced_peak_mb']:>8.1f}   タイル {tiled['traced_peak_mb']:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+ベンチマーク: キャプション翻訳エンジン
+
+従来の実装（呼び出しごとに辞書を作成し str.replace を語彙数だけ実行）と、
+起動時に一度だけコンパイルする翻訳エンジン（app/translation.py）を比較します。
+語彙を数千件に増やした場合のスケーリングも測定します。
+
+使い方:
+    python bench_translation.py [--iterations 2000] [--vocab 5000]
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from app.translation import DEFAULT_DATA_PATH, PhraseTranslator  # noqa: E402
+
+CAPTIONS = [
+    "a photo of a busy street with cars and people",
+    "a man walking in the park",
+    "a dog sitting on the beach",
+    "people and cars in the city",
+    "a busy road with cars",
+    "a woman riding a bicycle near a river with trees",
+]
+
+
+def load_phrases():
+    with open(DEFAULT_DATA_PATH, encoding="utf-8") as f:
+        data = json.load(f)
+    return {**data["objects"], **data["phrases"]}
+
+
+def legacy_translate(caption, phrases):
+    """従来方式: 毎回辞書をコピーし、語彙ごとに str.replace"""
+    translations = dict(phrases)
+    result = caption.lower().strip()
+    for en, ja in translations.items():
+        result = result.replace(en, ja)
+    return result
+
+
+def bench(label, fn, iterations):
+    start = time.perf_counter()
+    for i in range(iterations):
+        fn(CAPTIONS[i % len(CAPTIONS)])
+    elapsed = time.perf_counter() - start
+    print(f"{label:<40} {elapsed / iterations * 1e6:10.1f} µs/件")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Caption translation microbenchmark")
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--vocab", type=int, default=5000)
+    args = parser.parse_args()
+
+    phrases = load_phrases()
+    # 合成語彙: 実際の語彙に加えてダミーのフレーズを追加
+    large = dict(phrases)
+    large.update({f"synthetic phrase {i}": f"合成{i}" for i in range(args.vocab)})
+
+    print("=" * 60)
+    print(f"語彙数: {len(phrases)} / 拡張語彙数: {len(large)}  反復: {args.iterations}")
+    print("=" * 60)
+
+    start = time.perf_counter()
+    engine = PhraseTranslator(phrases)
+    print(f"{'エンジン構築 (標準語彙)':<40} {(time.perf_counter() - start) * 1000:10.1f} ms")
+    start = time.perf_counter()
+    large_engine = PhraseTranslator(large)
+    print(f"{'エンジン構築 (拡張語彙)':<40} {(time.perf_counter() - start) * 1000:10.1f} ms")
+    print("-" * 60)
+
+    bench("従来方式 (標準語彙)", lambda c: legacy_translate(c, phrases), args.iterations)
+    bench("エンジン (標準語彙)", engine.translate, args.iterations)
+    bench("従来方式 (拡張語彙)", lambda c: legacy_translate(c, large), max(1, args.iterations // 10))
+    bench("エンジン (拡張語彙)", large_engine.translate, args.iterations)
+
+
+if __name__ == "__main__":
+    main()
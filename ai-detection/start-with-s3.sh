@@ -1,33 +1,26 @@
 #!/bin/bash
 # ============================================================================
-# Download YOLOv8 model from S3 before starting the application
+# Start the service with the YOLOv8 model stored on S3
 # Set S3_MODEL_URI environment variable to use this feature
 # Example: S3_MODEL_URI=s3://my-bucket/models/yolov8s.pt
+#
+# The application fetches the model itself at startup (app/artifacts.py):
+# parallel ranged GETs via boto3 (already in requirements.txt), SHA-256
+# verification (S3_MODEL_SHA256 or the object's sha256 metadata) and a
+# content-addressed cache in ARTIFACT_CACHE_DIR, so restarts skip the
+# download. No AWS CLI install at boot anymore.
 # ============================================================================
 
 set -e
 
 echo "🚀 Starting AI Detection Service..."
 
-# Check if S3_MODEL_URI is set and model doesn't exist locally
-if [ ! -z "$S3_MODEL_URI" ] && [ ! -f "$MODEL_PATH" ]; then
-    echo "📦 Downloading model from S3: $S3_MODEL_URI"
-    
-    # Install AWS CLI if not present (only in container startup)
-    if ! command -v aws &> /dev/null; then
-        echo "Installing AWS CLI..."
-        pip install --quiet awscli
-    fi
-    
-    # Download model from S3
-    aws s3 cp "$S3_MODEL_URI" "$MODEL_PATH"
-    echo "✅ Model downloaded successfully"
+if [ -n "$S3_MODEL_URI" ]; then
+    echo "📦 Model will be resolved from S3: $S3_MODEL_URI (cache: ${ARTIFACT_CACHE_DIR:-models/.artifact-cache})"
+elif [ -f "$MODEL_PATH" ]; then
+    echo "✅ Using existing model at $MODEL_PATH"
 else
-    if [ -f "$MODEL_PATH" ]; then
-        echo "✅ Using existing model at $MODEL_PATH"
-    else
-        echo "⚠️  No model found. Please set S3_MODEL_URI or mount model at $MODEL_PATH"
-    fi
+    echo "⚠️  No model found. Please set S3_MODEL_URI or mount model at $MODEL_PATH"
 fi
 
 # Start the application with original start.sh
@@ -1,10 +1,20 @@
 #!/bin/sh
-# Start script: logs the PORT env var and starts uvicorn binding to it.
-# Reduced workers from 2 -> 1 to lower memory usage and reduce OOM/restart flaps.
+# Start script: logs the PORT env var and starts the server binding to it.
+# One worker (default): plain uvicorn. The app loads and warms the models in
+# the background, so /livez answers while they load and /readyz flips when done.
+# WEB_CONCURRENCY > 1: models are loaded once in a parent process and shared
+# copy-on-write by forked workers (app/serve.py), so extra workers cost little
+# memory; a supervisor restarts crashed workers. The port only opens once the
+# parent has loaded the models.
 # Increased timeout settings for BLIP-2 compatibility (120s → 180s).
 if [ -z "$PORT" ]; then
   echo "PORT not set, defaulting to 8000"
   PORT=8000
 fi
-echo "Starting uvicorn with PORT=${PORT}"
-exec uvicorn app.main:app --host 0.0.0.0 --port "$PORT" --workers 1 --timeout-keep-alive 180 --timeout-graceful-shutdown 15
+WORKERS="${WEB_CONCURRENCY:-1}"
+echo "Starting server with PORT=${PORT} WORKERS=${WORKERS}"
+if [ "$WORKERS" -le 1 ]; then
+  # Requests are logged by the app (TraceMiddleware), not uvicorn's access log
+  exec uvicorn app.main:app --host 0.0.0.0 --port "$PORT" --workers 1 --no-access-log --timeout-keep-alive 180 --timeout-graceful-shutdown 15
+fi
+exec python -m app.serve --host 0.0.0.0 --port "$PORT" --workers "$WORKERS" --timeout-keep-alive 180 --timeout-graceful-shutdown 15
@@ -2,27 +2,22 @@
 テスト: BLIP-2キャプションの日本語翻訳機能
 
 このスクリプトは翻訳関数をテストします。
+翻訳エンジン（app/translation.py）と語彙ファイル（app/data/translations_ja.json）を使用します。
 """
 
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from app.translation import PhraseTranslator  # noqa: E402
+
+translator = PhraseTranslator.from_file()
+
+
 def translate_caption_to_japanese(english_caption: str) -> str:
     """Dịch caption tiếng Anh sang tiếng Nhật"""
-    translations = {
-        "a photo of": "", "an image of": "", "a picture of": "",
-        "street": "通り", "road": "道路", "city": "都市", "town": "町",
-        "beach": "ビーチ", "ocean": "海", "mountain": "山", "forest": "森",
-        "park": "公園", "building": "建物", "house": "家",
-        "busy": "賑やかな", "crowded": "混雑した", "empty": "空の",
-        "people": "人々", "person": "人", "man": "男性", "woman": "女性",
-        "car": "車", "cars": "車", "bus": "バス", "truck": "トラック",
-        "dog": "犬", "cat": "猫", "bird": "鳥",
-        "walking": "歩いている", "running": "走っている", "sitting": "座っている",
-        " with ": "と", " and ": "と", " in ": "の中に",
-    }
-    
-    result = english_caption.lower().strip()
-    for en, ja in translations.items():
-        result = result.replace(en, ja)
-    return result.strip()
+    return translator.translate(english_caption)
 
 
 # テストケース
@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+
+
+class FakeBoxes:
+    def __init__(self, cls):
+        n = len(cls)
+        self.cls = np.array(cls, dtype=np.float32)
+        self.conf = np.linspace(0.9, 0.5, n, dtype=np.float32)
+        self.xyxy = np.array([[10.0 * i, 10.0 * i, 10.0 * i + 20, 10.0 * i + 30] for i in range(n)],
+                             dtype=np.float32).reshape(n, 4)
+
+
+class FakeResult:
+    """Minimal stand-in for ultralytics Results used by the API handlers."""
+
+    names = {0: "person", 2: "car"}
+
+    def __init__(self, img, cls=(0, 2, 2)):
+        self.orig_img = img
+        self.boxes = FakeBoxes(list(cls))
+        self.speed = {"preprocess": 1.0, "inference": 10.0, "postprocess": 1.0}
+
+    def plot(self):
+        return self.orig_img
+
+
+class FakeModel:
+    names = FakeResult.names
+
+    def __init__(self):
+        self.calls = 0
+
+    def predict(self, source, **kwargs):
+        self.calls += 1
+        images = source if isinstance(source, list) else [source]
+        return [FakeResult(img) for img in images]
+
+
+@pytest.fixture
+def fake_model(monkeypatch):
+    import app.main as main
+    from app.cache import ResultCache
+
+    fake = FakeModel()
+    monkeypatch.setattr(main, "model", fake)
+    # Results cached for another model must not leak between tests
+    monkeypatch.setattr(main, "result_cache", ResultCache())
+    return fake
+
+
+@pytest.fixture
+def stub_model(monkeypatch):
+    """Offline model used by MODEL_BACKEND=stub (real pixels in, deterministic boxes out)."""
+    import app.main as main
+    from app.cache import ResultCache
+    from app.stub_model import StubYOLO
+
+    stub = StubYOLO(work_ms=0)
+    monkeypatch.setattr(main, "model", stub)
+    monkeypatch.setattr(main, "result_cache", ResultCache())
+    return stub
+
+
+@pytest.fixture
+def jpeg_bytes():
+    import cv2
+
+    img = np.full((128, 128, 3), (137, 109, 73), dtype=np.uint8)
+    ok, buf = cv2.imencode(".jpg", img)
+    assert ok
+    return buf.tobytes()
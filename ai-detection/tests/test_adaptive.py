@@ -0,0 +1,101 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app.adaptive import AdaptivePolicy, Tier, parse_tiers
+from app.main import app
+
+client = TestClient(app)
+
+
+def make_policy(**kwargs):
+    tiers = parse_tiers("full=@640,reduced=@480,nano=models/yolov8n.pt@416", "models/yolov8s.pt")
+    params = dict(queue_high=4, queue_low=0, latency_high=2.0, latency_low=0.5, hold_seconds=10.0,
+                  step_seconds=1.0)
+    params.update(kwargs)
+    return AdaptivePolicy(tiers, **params)
+
+
+def test_parse_tiers():
+    tiers = parse_tiers("full=@640, nano=models/yolov8n.pt@416", "models/yolov8s.pt")
+    assert [t.as_dict() for t in tiers] == [
+        {"name": "full", "model": "models/yolov8s.pt", "imgsz": 640},
+        {"name": "nano", "model": "models/yolov8n.pt", "imgsz": 416},
+    ]
+    with pytest.raises(ValueError):
+        parse_tiers("full=models/yolov8s.pt", "x.pt")
+
+
+def test_policy_steps_down_under_queue_pressure_one_tier_per_step():
+    policy = make_policy()
+    assert policy.select(0, now=0.0).name == "full"
+    assert policy.select(5, now=1.0).name == "reduced"
+    assert policy.select(5, now=1.5).name == "reduced"  # at most one step per step_seconds
+    assert policy.select(5, now=2.5).name == "nano"
+    assert policy.select(9, now=10.0).name == "nano"  # already the cheapest tier
+
+
+def test_policy_recovers_only_after_hold_period():
+    policy = make_policy()
+    policy.select(5, now=0.0)
+    assert policy.level == 1
+    assert policy.select(1, now=5.0).name == "reduced"   # between thresholds: stay
+    assert policy.select(0, now=6.0).name == "reduced"   # calm starts
+    assert policy.select(0, now=12.0).name == "reduced"  # not calm long enough
+    assert policy.select(0, now=16.5).name == "full"
+    assert policy.switches == 2
+
+
+def test_policy_reacts_to_latency():
+    policy = make_policy()
+    policy.record(3.0)
+    assert policy.select(0, now=0.0).name == "reduced"
+    assert policy.latency == 0.0  # restarted for the new tier
+
+
+def test_policy_disabled_or_single_tier_never_switches():
+    assert make_policy(enabled=False).select(100, now=0.0).name == "full"
+    single = AdaptivePolicy([Tier("only", "m.pt", 640)], queue_high=1)
+    assert not single.enabled
+    policy = make_policy()
+    policy.drop_tier("nano")
+    assert [t.name for t in policy.tiers] == ["full", "reduced"]
+
+
+@pytest.mark.parametrize("env, enabled", [
+    ({}, False),  # an upgrade keeps full-resolution detections
+    ({"ADAPTIVE_TIERS": "full=@640,low=@320"}, True),
+    ({"ADAPTIVE_INFERENCE": "true"}, True),
+])
+def test_adaptive_inference_is_opt_in(env, enabled):
+    import os
+    import subprocess
+    import sys
+
+    clean = {k: v for k, v in os.environ.items() if not k.startswith("ADAPTIVE_")}
+    out = subprocess.run([sys.executable, "-c", "import app.main as m; print(m.ADAPTIVE_INFERENCE)"],
+                         env={**clean, **env}, capture_output=True, text=True, check=True)
+    assert out.stdout.strip().splitlines()[-1] == str(enabled)
+
+
+def post(params="", jpeg=None):
+    return client.post(f"/predict/?render=none{params}", files={"file": ("a.jpg", jpeg, "image/jpeg")})
+
+
+def test_response_reports_served_tier(stub_model, jpeg_bytes):
+    body = post(jpeg=jpeg_bytes).json()
+    assert body["served_tier"] == "full" and body["imgsz"] == 640
+    assert post("&imgsz=330", jpeg_bytes).json()["imgsz"] == 320  # multiple of 32
+    body = post("&tier=low", jpeg_bytes).json()
+    assert body["served_tier"] == "low" and body["imgsz"] == 320
+    assert post("&tier=bogus", jpeg_bytes).status_code == 400
+
+
+def test_overload_caps_the_imgsz_hint(stub_model, jpeg_bytes, monkeypatch):
+    import app.main as main
+
+    policy = AdaptivePolicy(main.adaptive_policy.tiers, queue_high=1, step_seconds=0.0, hold_seconds=60.0)
+    policy.level = 1
+    monkeypatch.setattr(main, "adaptive_policy", policy)
+    body = post("&imgsz=1280", jpeg_bytes).json()
+    assert body["served_tier"] == "reduced" and body["imgsz"] == 480
+    assert main.adaptive_policy.stats()["served"] == {"reduced": 1}
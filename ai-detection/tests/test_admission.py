@@ -0,0 +1,92 @@
+import asyncio
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+import app.main as main
+from app.admission import AdmissionController, AdmissionRejected, DeadlineExceeded
+
+client = TestClient(main.app)
+
+
+def test_bounded_queue_rejects_with_retry_after():
+    async def scenario():
+        adm = AdmissionController(max_concurrent=1, max_queue=1)
+        await adm.acquire()
+        adm.service_seconds = 2.5
+        queued = asyncio.ensure_future(adm.acquire())
+        await asyncio.sleep(0)
+        assert adm.queued == 1
+        with pytest.raises(AdmissionRejected) as e:
+            await adm.acquire()
+        assert e.value.retry_after == 5  # one queued ahead + the running one
+        adm.release()
+        await queued
+        assert (adm.active, adm.queued, adm.admitted, adm.rejected) == (1, 0, 2, 1)
+
+    asyncio.run(scenario())
+
+
+def test_queued_request_dropped_at_deadline():
+    async def scenario():
+        adm = AdmissionController(max_concurrent=1, max_queue=4)
+        await adm.acquire()
+        start = time.monotonic()
+        with pytest.raises(DeadlineExceeded):
+            await adm.acquire(deadline=time.monotonic() + 0.05)
+        assert time.monotonic() - start < 1
+        assert adm.queued == 0 and adm.expired == 1
+        adm.release()
+        assert adm.active == 0
+
+    asyncio.run(scenario())
+
+
+def test_deadline_that_cannot_be_met_is_rejected_upfront():
+    async def scenario():
+        adm = AdmissionController(max_concurrent=2, max_queue=4, ewma_alpha=0.5)
+        await adm.acquire()
+        adm.release(4.0)
+        assert adm.service_seconds == 2.0  # EWMA of recent service times
+        with pytest.raises(DeadlineExceeded):
+            await adm.acquire(deadline=time.monotonic() + 0.5)
+        await adm.acquire(deadline=time.monotonic() + 10)
+        assert adm.expired == 1
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_waiter_leaves_queue():
+    async def scenario():
+        adm = AdmissionController(max_concurrent=1, max_queue=4)
+        await adm.acquire()
+        waiter = asyncio.ensure_future(adm.acquire())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert adm.queued == 0
+        adm.release()
+        assert adm.active == 0
+
+    asyncio.run(scenario())
+
+
+def _post(jpeg_bytes, **headers):
+    return client.post("/predict/", files={"file": ("a.jpg", jpeg_bytes, "image/jpeg")}, headers=headers)
+
+
+def test_predict_returns_429_when_queue_full(fake_model, jpeg_bytes, monkeypatch):
+    adm = AdmissionController(max_concurrent=1, max_queue=0)
+    asyncio.run(adm.acquire())  # the only slot is busy
+    monkeypatch.setattr(main, "admission", adm)
+    r = _post(jpeg_bytes)
+    assert r.status_code == 429
+    assert int(r.headers["retry-after"]) >= 1
+    assert client.get("/stats").json()["admission"]["rejected"] == 1
+
+
+def test_invalid_deadline_header(fake_model, jpeg_bytes):
+    assert _post(jpeg_bytes, **{"X-Request-Timeout-Ms": "soon"}).status_code == 400
+    assert _post(jpeg_bytes, **{"X-Request-Timeout-Ms": "5000"}).status_code == 200
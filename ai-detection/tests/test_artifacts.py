@@ -0,0 +1,154 @@
+import base64
+import hashlib
+import io
+import os
+import threading
+
+import pytest
+
+from app.artifacts import ArtifactError, ArtifactFetcher, etag_md5, expected_sha256, link_artifact, parse_s3_uri
+
+URI = "s3://models-bucket/yolo/yolov8s.pt"
+
+
+class FakeS3:
+    """In-memory stand-in for the boto3 S3 client (head_object / ranged get_object)."""
+
+    def __init__(self):
+        self.objects = {}
+        self.ranges = []
+        self.heads = 0
+        self.fail_ranges = set()
+        self.offline = False
+        self._lock = threading.Lock()
+
+    def put(self, key, data, metadata=None, etag=None):
+        self.objects[key] = (data, etag or f'"{hashlib.md5(data).hexdigest()}"', metadata or {})
+
+    def head_object(self, Bucket, Key, **kwargs):
+        self.heads += 1
+        if self.offline:
+            raise ConnectionError("endpoint unreachable")
+        data, etag, metadata = self.objects[Key]
+        return {"ContentLength": len(data), "ETag": etag, "Metadata": metadata}
+
+    def get_object(self, Bucket, Key, Range=None, IfMatch=None):
+        data, etag, _ = self.objects[Key]
+        if IfMatch and IfMatch != etag:
+            raise RuntimeError("PreconditionFailed")
+        with self._lock:
+            self.ranges.append(Range)
+            if Range in self.fail_ranges:
+                self.fail_ranges.discard(Range)
+                raise ConnectionResetError("connection reset")
+        first, last = (int(x) for x in Range[len("bytes="):].split("-"))
+        return {"Body": io.BytesIO(data[first:last + 1])}
+
+
+@pytest.fixture
+def s3():
+    client = FakeS3()
+    client.put("yolo/yolov8s.pt", os.urandom(300 * 1024 + 17))
+    return client
+
+
+def fetcher(tmp_path, client, **kwargs):
+    return ArtifactFetcher(str(tmp_path / "cache"), client=client, part_size=64 * 1024, **kwargs)
+
+
+def test_parallel_ranged_download_is_content_addressed(tmp_path, s3):
+    data = s3.objects["yolo/yolov8s.pt"][0]
+    digest = hashlib.sha256(data).hexdigest()
+    path = fetcher(tmp_path, s3, concurrency=4).fetch(URI, digest)
+    assert path.read_bytes() == data
+    assert path == tmp_path / "cache" / "blobs" / "sha256" / digest
+    assert sorted(s3.ranges) == sorted(f"bytes={o}-{min(o + 65536, len(data)) - 1}"
+                                       for o in range(0, len(data), 65536))
+    assert not list((tmp_path / "cache" / "tmp").iterdir())
+
+
+def test_restart_uses_the_cache(tmp_path, s3):
+    fetcher(tmp_path, s3).fetch(URI)
+    downloads = len(s3.ranges)
+
+    again = fetcher(tmp_path, s3)
+    again.fetch(URI)
+    assert len(s3.ranges) == downloads and again.hits == 1  # one HEAD, no GET
+
+    digest = hashlib.sha256(s3.objects["yolo/yolov8s.pt"][0]).hexdigest()
+    heads = s3.heads
+    fetcher(tmp_path, s3).fetch(URI, digest)
+    assert s3.heads == heads  # known digest: no request at all
+
+    s3.offline = True
+    assert fetcher(tmp_path, s3).fetch(URI).name == digest
+
+
+def test_checksum_mismatch_discards_the_download(tmp_path, s3):
+    s3.put("yolo/bad.pt", b"x" * 1000, metadata={"sha256": "0" * 64})
+    with pytest.raises(ArtifactError, match="Checksum mismatch"):
+        fetcher(tmp_path, s3).fetch("s3://models-bucket/yolo/bad.pt")
+    assert not (tmp_path / "cache" / "blobs").exists()
+    assert not list((tmp_path / "cache" / "tmp").iterdir())
+
+
+def test_etag_md5_is_checked_without_a_sha256(tmp_path, s3):
+    s3.put("yolo/bad.pt", b"x" * 1000, etag=f'"{hashlib.md5(b"other").hexdigest()}"')
+    with pytest.raises(ArtifactError, match="ETag MD5"):
+        fetcher(tmp_path, s3).fetch("s3://models-bucket/yolo/bad.pt")
+    assert not (tmp_path / "cache" / "blobs").exists()
+
+
+def test_unverifiable_download_warns_or_fails(tmp_path, s3, caplog):
+    s3.put("yolo/multi.pt", b"x" * 1000, etag='"0123456789abcdef0123456789abcdef-2"')
+    with pytest.raises(ArtifactError, match="No checksum"):
+        fetcher(tmp_path, s3, require_checksum=True).fetch("s3://models-bucket/yolo/multi.pt")
+    assert fetcher(tmp_path, s3).fetch("s3://models-bucket/yolo/multi.pt").read_bytes() == b"x" * 1000
+    assert "Nothing to verify" in caplog.text
+
+
+def test_failed_part_is_retried(tmp_path, s3):
+    s3.fail_ranges.add("bytes=65536-131071")
+    path = fetcher(tmp_path, s3).fetch(URI)
+    assert path.read_bytes() == s3.objects["yolo/yolov8s.pt"][0]
+    assert s3.ranges.count("bytes=65536-131071") == 2
+
+
+def test_changed_object_is_fetched_again_and_relinked(tmp_path, s3):
+    target = tmp_path / "models" / "yolov8s.pt"
+    first = fetcher(tmp_path, s3).fetch(URI)
+    assert link_artifact(first, target) and target.read_bytes() == first.read_bytes()
+
+    s3.put("yolo/yolov8s.pt", b"new weights")
+    second = fetcher(tmp_path, s3).fetch(URI)
+    assert second != first and link_artifact(second, target)
+    assert target.read_bytes() == b"new weights"
+
+    mounted = tmp_path / "mounted.pt"
+    mounted.write_bytes(b"local")
+    assert not link_artifact(second, mounted) and mounted.read_bytes() == b"local"
+
+
+def test_expected_digest_sources():
+    digest = hashlib.sha256(b"abc").digest()
+    assert expected_sha256({"ChecksumSHA256": base64.b64encode(digest).decode()}) == digest.hex()
+    assert expected_sha256({"ChecksumSHA256": "AAAA-3"}) is None  # multipart composite
+    assert expected_sha256({"Metadata": {"sha256": "ABC"}}) == "abc"
+    md5 = hashlib.md5(b"abc").hexdigest()
+    assert etag_md5({"ETag": f'"{md5}"'}) == md5
+    assert etag_md5({"ETag": f'"{md5}-3"'}) is None
+    assert etag_md5({"ETag": f'"{md5}"', "ServerSideEncryption": "aws:kms"}) is None
+    assert parse_s3_uri("s3://b/k/x.pt") == ("b", "k/x.pt")
+    with pytest.raises(ArtifactError):
+        parse_s3_uri("https://b/k")
+
+
+def test_load_models_resolves_s3_model_uri(tmp_path, s3, monkeypatch):
+    import app.main as main
+
+    target = tmp_path / "models" / "yolov8s.pt"
+    monkeypatch.setattr(main, "S3_MODEL_URI", URI)
+    monkeypatch.setattr(main, "MODEL_PATH", str(target))
+    monkeypatch.setattr(main, "artifact_fetcher", fetcher(tmp_path, s3))
+    main.fetch_model_artifact()
+    assert target.is_symlink() and target.read_bytes() == s3.objects["yolo/yolov8s.pt"][0]
@@ -0,0 +1,61 @@
+import sys
+import types
+from pathlib import Path
+
+import pytest
+
+from app.backends import BackendError, artifact_path, load_yolo_model
+
+
+class FakeYOLO:
+    exports = []
+
+    def __init__(self, path, task=None):
+        self.path = str(path)
+
+    def export(self, format, imgsz, **kwargs):
+        FakeYOLO.exports.append(format)
+        out = Path(self.path).with_suffix(".onnx")
+        out.write_bytes(b"onnx")
+        return str(out)
+
+
+@pytest.fixture
+def fake_ultralytics(monkeypatch):
+    FakeYOLO.exports = []
+    module = types.ModuleType("ultralytics")
+    module.YOLO = FakeYOLO
+    monkeypatch.setitem(sys.modules, "ultralytics", module)
+    return FakeYOLO
+
+
+def test_artifact_names_encode_configuration():
+    assert artifact_path("models/yolov8s.pt", "onnx", "fp32", 640) == Path("models/yolov8s_640_fp32.onnx")
+    assert artifact_path("models/yolov8s.pt", "openvino", "int8", 320).name == "yolov8s_320_int8_openvino_model"
+    assert artifact_path("models/yolov8s.pt", "torch", "fp32", 640) == Path("models/yolov8s.pt")
+
+
+def test_onnx_export_is_cached_next_to_checkpoint(tmp_path, fake_ultralytics):
+    pt = tmp_path / "yolov8s.pt"
+    pt.write_bytes(b"weights")
+
+    model, info = load_yolo_model(str(pt), "onnx", "fp32", 640)
+    assert info["backend"] == "onnx"
+    assert model.path == str(tmp_path / "yolov8s_640_fp32.onnx")
+
+    load_yolo_model(str(pt), "onnx", "fp32", 640)
+    assert fake_ultralytics.exports == ["onnx"]
+
+
+def test_failed_export_falls_back_to_torch(tmp_path, fake_ultralytics, monkeypatch):
+    pt = tmp_path / "yolov8s.pt"
+    pt.write_bytes(b"weights")
+    monkeypatch.setattr(FakeYOLO, "export", lambda self, **kw: (_ for _ in ()).throw(RuntimeError("no onnx")))
+
+    model, info = load_yolo_model(str(pt), "onnx", "fp32", 640)
+    assert info == {"backend": "torch", "precision": "fp32", "artifact": str(pt)}
+
+
+def test_unknown_backend_rejected(fake_ultralytics):
+    with pytest.raises(BackendError):
+        load_yolo_model("m.pt", "tensorrt")
@@ -0,0 +1,99 @@
+import io
+import json
+import tarfile
+import zipfile
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+
+client = TestClient(app)
+
+
+def _lines(resp):
+    return [json.loads(line) for line in resp.text.splitlines() if line]
+
+
+def test_batch_streams_one_line_per_image(fake_model, jpeg_bytes):
+    files = [("files", (f"img{i}.jpg", jpeg_bytes, "image/jpeg")) for i in range(3)]
+    files.append(("files", ("broken.jpg", b"not an image", "image/jpeg")))
+    resp = client.post("/predict/batch", files=files)
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("application/x-ndjson")
+    lines = _lines(resp)
+    assert lines[-1] == {"done": True, "count": 4}
+    items = sorted(lines[:-1], key=lambda item: item["index"])
+    assert [item["filename"] for item in items] == ["img0.jpg", "img1.jpg", "img2.jpg", "broken.jpg"]
+    assert all(item["object_count"] == 3 for item in items[:3])
+    assert "image_base64" not in items[0]
+    assert "error" in items[3]
+
+
+def test_batch_accepts_zip_and_tar_archives(fake_model, jpeg_bytes):
+    zip_buf = io.BytesIO()
+    with zipfile.ZipFile(zip_buf, "w") as zf:
+        zf.writestr("set/a.jpg", jpeg_bytes)
+        zf.writestr("set/readme.txt", "ignored")
+        zf.writestr("set/b.jpg", jpeg_bytes)
+
+    tar_buf = io.BytesIO()
+    with tarfile.open(fileobj=tar_buf, mode="w:gz") as tf:
+        info = tarfile.TarInfo("c.jpg")
+        info.size = len(jpeg_bytes)
+        tf.addfile(info, io.BytesIO(jpeg_bytes))
+
+    counts = []
+    for name, payload in (("photos.zip", zip_buf.getvalue()), ("photos.tar.gz", tar_buf.getvalue())):
+        resp = client.post("/predict/batch", files={"files": (name, payload, "application/octet-stream")},
+                           params={"include_image": "true"})
+        lines = _lines(resp)
+        items = [line for line in lines if "index" in line]
+        assert all("error" not in item and item["image_base64"] for item in items)
+        assert lines[-1]["count"] == len(items)
+        counts.append(len(items))
+    assert counts == [2, 1]
+
+
+def test_oversized_archive_member_is_skipped_without_reading(fake_model, jpeg_bytes, monkeypatch):
+    import app.main as main
+    from app.archives import MemberTooLarge, iter_uploaded_images
+
+    zip_buf = io.BytesIO()
+    with zipfile.ZipFile(zip_buf, "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("bomb.jpg", b"\0" * 100_000)  # compresses to a few hundred bytes
+        zf.writestr("ok.jpg", jpeg_bytes)
+    zip_buf.seek(0)
+    (bomb, error), (name, data) = iter_uploaded_images([("photos.zip", zip_buf)], max_bytes=10_000)
+    assert bomb == "bomb.jpg" and isinstance(error, MemberTooLarge)
+    assert (name, data) == ("ok.jpg", jpeg_bytes)
+
+    monkeypatch.setattr(main, "MAX_UPLOAD_BYTES", 10_000)
+    resp = client.post("/predict/batch", files={"files": ("photos.zip", zip_buf.getvalue(), "application/zip")})
+    lines = _lines(resp)
+    items = {line["filename"]: line for line in lines if "index" in line}
+    assert "bomb.jpg" in items["bomb.jpg"]["error"]
+    assert "error" not in items["ok.jpg"] and items["ok.jpg"]["object_count"] == 3
+    assert lines[-1] == {"done": True, "count": 2}
+
+
+def test_zero_upload_limit_means_no_limit(fake_model, jpeg_bytes, monkeypatch):
+    import app.main as main
+    from app.archives import iter_uploaded_images
+
+    assert list(iter_uploaded_images([("a.jpg", io.BytesIO(b"xx"))], 0)) == [("a.jpg", b"xx")]
+    monkeypatch.setattr(main, "MAX_UPLOAD_BYTES", 0)
+    lines = _lines(client.post("/predict/batch", files={"files": ("a.jpg", jpeg_bytes, "image/jpeg")}))
+    assert lines[0]["object_count"] == 3 and lines[-1] == {"done": True, "count": 1}
+
+
+def test_batch_items_go_through_admission(fake_model, jpeg_bytes, monkeypatch):
+    import app.main as main
+    from app.admission import AdmissionController
+
+    adm = AdmissionController(max_concurrent=1, max_queue=0)
+    monkeypatch.setattr(main, "admission", adm)
+    files = [("files", (f"img{i}.jpg", jpeg_bytes, "image/jpeg")) for i in range(3)]
+    lines = _lines(client.post("/predict/batch", files=files))
+    assert lines[-1] == {"done": True, "count": 3}
+    assert all("error" not in item for item in lines[:-1])
+    assert adm.admitted == 3 and adm.active == 0
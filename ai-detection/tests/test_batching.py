@@ -0,0 +1,60 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+
+from app.batching import MicroBatcher
+from app.executor import InferenceExecutor
+from app.main import app
+
+
+def _double_all(items):
+    return [item * 2 for item in items]
+
+
+def test_concurrent_submissions_share_a_batch():
+    executor = InferenceExecutor(1)
+    batcher = MicroBatcher("test", _double_all, executor, stage="yolo",
+                           max_batch_size=4, max_wait_ms=50)
+
+    async def go():
+        futures = [batcher.submit(i) for i in range(6)]
+        results = await asyncio.gather(*futures)
+        await batcher.stop()
+        return results
+
+    try:
+        assert asyncio.run(go()) == [0, 2, 4, 6, 8, 10]
+    finally:
+        executor.shutdown()
+    stats = batcher.stats()
+    assert stats["batch_size_histogram"] == {"2": 1, "4": 1}
+    assert stats["items"] == 6
+
+
+def test_batch_failure_propagates_to_every_waiter():
+    def boom(items):
+        raise ValueError("bad batch")
+
+    executor = InferenceExecutor(1)
+    batcher = MicroBatcher("test", boom, executor, stage="yolo", max_wait_ms=1)
+
+    async def go():
+        futures = [batcher.submit(i) for i in range(2)]
+        results = await asyncio.gather(*futures, return_exceptions=True)
+        await batcher.stop()
+        return results
+
+    try:
+        results = asyncio.run(go())
+    finally:
+        executor.shutdown()
+    assert all(isinstance(r, ValueError) for r in results)
+
+
+def test_stats_endpoint_reports_batches(fake_model, jpeg_bytes):
+    client = TestClient(app)
+    resp = client.post("/predict/", files={"file": ("a.jpg", jpeg_bytes, "image/jpeg")})
+    assert resp.status_code == 200
+    stats = client.get("/stats").json()["yolo_batching"]
+    assert stats["batches"] >= 1
+    assert stats["max_batch_size"] >= 1
@@ -0,0 +1,87 @@
+import asyncio
+
+import httpx
+import numpy as np
+import pytest
+
+import bench_load
+from app.backends import load_yolo_model
+from app.main import app
+
+
+def test_synthetic_images_are_deterministic():
+    first = bench_load.synthetic_images(["64x48", "128x96"], seed=3)
+    again = bench_load.synthetic_images(["64x48", "128x96"], seed=3)
+    assert first == again
+    assert [res for res, _ in first] == ["64x48", "128x96"]
+    assert first[0][1][:2] == b"\xff\xd8"
+
+
+def test_percentile_interpolates():
+    values = [float(v) for v in range(1, 101)]
+    assert bench_load.percentile(values, 50) == pytest.approx(50.5)
+    assert bench_load.percentile(values, 99) == pytest.approx(99.01)
+    assert bench_load.percentile([], 95) == 0.0
+
+
+def test_compare_flags_regressions():
+    baseline = {"throughput_rps": 10.0, "errors": 0, "latency": {"p95_ms": 100.0, "p99_ms": 150.0}}
+    same = {"throughput_rps": 9.5, "errors": 0, "latency": {"p95_ms": 110.0, "p99_ms": 160.0}}
+    worse = {"throughput_rps": 7.0, "errors": 2, "latency": {"p95_ms": 130.0, "p99_ms": 150.0}}
+    assert bench_load.compare(same, baseline, tolerance=0.2) == []
+    assert len(bench_load.compare(worse, baseline, tolerance=0.2)) == 3
+
+
+def test_stub_backend_needs_no_ultralytics():
+    model, info = load_yolo_model("models/missing.pt", "stub")
+    assert info["backend"] == "stub"
+    assert model.names[0] == "person"
+    img = np.random.default_rng(0).integers(0, 255, (120, 160, 3), dtype=np.uint8)
+    a, b = model.predict([img, img.copy()], imgsz=64)
+    assert a.boxes.xyxy.tolist() == b.boxes.xyxy.tolist()
+
+
+def test_run_load_in_process(stub_model):
+    images = bench_load.synthetic_images(["96x64", "160x120"])
+
+    async def run():
+        async with httpx.AsyncClient(app=app, base_url="http://bench") as client:
+            return await bench_load.run_load(client, images, total=6, concurrency=2, warmup=1,
+                                             allow_cache=False, params={"render": "none"})
+
+    result = asyncio.run(run())
+    assert result["errors"] == 0
+    assert result["latency"]["count"] == 6
+    assert set(result["by_resolution"]) == {"96x64", "160x120"}
+    assert result["throughput_rps"] > 0
+
+
+def test_in_process_run_waits_for_background_model_load(monkeypatch):
+    import time
+
+    import app.main as main
+    from app.cache import ResultCache
+    from app.stub_model import StubYOLO
+
+    def slow_load():
+        time.sleep(0.5)
+        main.model = StubYOLO(work_ms=0)
+
+    monkeypatch.setattr(main, "model", None)
+    monkeypatch.setattr(main, "app_ready", False)
+    monkeypatch.setattr(main, "models_preloaded", False)
+    monkeypatch.setattr(main, "WARMUP_ITERATIONS", 0)
+    monkeypatch.setattr(main, "load_models", slow_load)
+    monkeypatch.setattr(main, "result_cache", ResultCache())
+
+    async def run():
+        await bench_load.start_in_process(app)
+        try:
+            async with httpx.AsyncClient(app=app, base_url="http://bench") as client:
+                return await bench_load.run_load(client, bench_load.synthetic_images(["96x64"]), total=3,
+                                                 concurrency=1, warmup=0, allow_cache=False,
+                                                 params={"render": "none"})
+        finally:
+            await app.router.shutdown()
+
+    assert asyncio.run(run())["status_codes"] == {"200": 3}
@@ -0,0 +1,126 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+
+from app.cache import BlobStore, ResultCache, make_cache_key
+from app.main import app
+
+
+def test_key_depends_on_bytes_and_params():
+    base = make_cache_key(b"img", model="a.pt")
+    assert base == make_cache_key(b"img", model="a.pt")
+    assert base != make_cache_key(b"img", model="b.pt")
+    assert base != make_cache_key(b"img2", model="a.pt")
+
+
+def test_lru_eviction_and_counters():
+    cache = ResultCache(max_entries=2)
+
+    async def go():
+        for key in ("a", "b", "a", "c"):
+            await cache.get_or_compute(key, _value(key))
+
+    asyncio.run(go())
+    stats = cache.stats()
+    assert stats["misses"] == 3
+    assert stats["memory_hits"] == 1
+    assert stats["memory_evictions"] == 1
+    # "b" was least recently used
+    assert cache._memory_get("b") is None and cache._memory_get("a") is not None
+
+
+def test_concurrent_identical_requests_are_collapsed():
+    cache = ResultCache()
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return {"v": 1}
+
+    async def go():
+        return await asyncio.gather(*(cache.get_or_compute("k", compute) for _ in range(5)))
+
+    results = asyncio.run(go())
+    assert len(calls) == 1
+    assert [hit for _, hit in results].count(False) == 1
+    assert cache.stats()["collapsed"] == 4
+
+
+def test_disk_tier_survives_restart(tmp_path):
+    async def first():
+        cache = ResultCache(disk_dir=str(tmp_path))
+        await cache.get_or_compute("k", _value("stored"))
+        # let the fire-and-forget disk write finish
+        await asyncio.sleep(0.1)
+
+    asyncio.run(first())
+    restarted = ResultCache(disk_dir=str(tmp_path))
+    value, hit = asyncio.run(restarted.get_or_compute("k", _value("recomputed")))
+    assert hit and value == {"v": "stored"}
+    assert restarted.stats()["disk_hits"] == 1
+
+
+def test_discard_drops_the_disk_copy(tmp_path):
+    async def first():
+        cache = ResultCache(disk_dir=str(tmp_path))
+        await cache.get_or_compute("k", _value("stored"))
+        await asyncio.sleep(0.1)
+        cache.discard("k")
+
+    asyncio.run(first())
+    restarted = ResultCache(disk_dir=str(tmp_path))
+    value, hit = asyncio.run(restarted.get_or_compute("k", _value("recomputed")))
+    assert not hit and value == {"v": "recomputed"}
+
+
+def test_image_url_is_recomputed_after_restart(fake_model, jpeg_bytes, tmp_path, monkeypatch):
+    import app.main as main
+
+    client = TestClient(app)
+
+    monkeypatch.setattr(main, "result_cache", ResultCache(disk_dir=str(tmp_path)))
+    client.post("/predict/?inline_image=false", files={"file": ("a.jpg", jpeg_bytes, "image/jpeg")})
+    asyncio.run(asyncio.sleep(0.1))
+    # Restart: empty memory tier and image store, disk tier kept
+    monkeypatch.setattr(main, "result_cache", ResultCache(disk_dir=str(tmp_path)))
+    monkeypatch.setattr(main, "annotated_images", BlobStore())
+    res = client.post("/predict/?inline_image=false", files={"file": ("a.jpg", jpeg_bytes, "image/jpeg")})
+    assert res.headers["X-Cache"] == "MISS"
+    assert client.get(res.json()["image_url"]).status_code == 200
+
+
+def test_blob_store_shares_blobs_through_disk(tmp_path, monkeypatch):
+    first, second = BlobStore(1000, str(tmp_path)), BlobStore(1000, str(tmp_path))
+
+    async def scenario():
+        await first.put("a", b"x" * 600, "image/jpeg")
+        assert await second.contains("a") and await second.get("a") == (b"x" * 600, "image/jpeg")
+        # Writes under the budget only update the running total, no directory scan
+        scans = []
+        monkeypatch.setattr(first, "_disk_files", lambda: scans.append(1) or BlobStore._disk_files(first))
+        await first.put("c", b"z" * 10, "image/jpeg")
+        assert scans == []
+        await first.put("b", b"y" * 600, "image/webp")  # over max_bytes: oldest files go
+        assert scans == [1]
+        assert not await second.contains("a") and (await second.get("b"))[1] == "image/webp"
+
+    asyncio.run(scenario())
+    assert first.stats()["disk_bytes"] <= 1000
+
+
+def test_predict_serves_repeat_upload_from_cache(fake_model, jpeg_bytes):
+    client = TestClient(app)
+    files = {"file": ("a.jpg", jpeg_bytes, "image/jpeg")}
+    first = client.post("/predict/", files=files)
+    second = client.post("/predict/", files={"file": ("b.jpg", jpeg_bytes, "image/jpeg")})
+    assert first.headers["X-Cache"] == "MISS"
+    assert second.headers["X-Cache"] == "HIT"
+    assert second.json()["filename"] == "b.jpg"
+    assert fake_model.calls == 1
+
+
+def _value(v):
+    async def compute():
+        return {"v": v}
+    return compute
@@ -0,0 +1,45 @@
+from fastapi.testclient import TestClient
+
+import app.main as main
+from app.captioning import CaptionEngine
+from app.main import app
+
+
+def test_engine_without_model_returns_empty_captions():
+    engine = CaptionEngine()
+    assert not engine.available
+    assert engine.caption_batch([object(), object()]) == ["", ""]
+    assert engine.info()["variant"] == "fp32"
+
+
+def test_captions_are_batched_and_translated(fake_model, jpeg_bytes, monkeypatch):
+    batches = []
+
+    def fake_caption_batch(images):
+        batches.append(len(images))
+        return ["a dog sitting in the park" for _ in images]
+
+    monkeypatch.setattr(main.caption_engine, "model", object())
+    monkeypatch.setattr(main.caption_engine, "processor", object())
+    monkeypatch.setattr(main.caption_batcher, "process_batch", fake_caption_batch)
+
+    client = TestClient(app)
+    data = client.post("/predict/", files={"file": ("a.jpg", jpeg_bytes, "image/jpeg")}).json()
+    assert "犬" in data["description"] and "公園" in data["description"]
+    assert batches == [1]
+
+
+def test_caption_failure_degrades_and_is_not_cached(fake_model, jpeg_bytes, monkeypatch):
+    def broken(images):
+        raise RuntimeError("out of memory")
+
+    monkeypatch.setattr(main.caption_engine, "model", object())
+    monkeypatch.setattr(main.caption_engine, "processor", object())
+    monkeypatch.setattr(main.caption_batcher, "process_batch", broken)
+
+    client = TestClient(app)
+    files = {"file": ("a.jpg", jpeg_bytes, "image/jpeg")}
+    first = client.post("/predict/", files=files)
+    assert first.status_code == 200
+    assert first.json()["object_count"] == 3
+    assert client.post("/predict/", files=files).headers["X-Cache"] == "MISS"
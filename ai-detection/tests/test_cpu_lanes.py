@@ -0,0 +1,120 @@
+import asyncio
+import os
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.cpu_lanes import CpuLanes, autotune, available_cpus, candidate_lane_counts, partition, plan_lanes
+from app.main import app
+
+client = TestClient(app)
+
+
+def test_partition_and_plan():
+    assert partition(range(8), 3) == [[0, 1, 2], [3, 4, 5], [6, 7]]
+    assert partition([0, 1], 4) == [[0], [1]]  # at most one lane per core
+    lanes, caption = plan_lanes(range(8), 2, caption_cores=2)
+    assert lanes == [[0, 1, 2], [3, 4, 5]] and caption == [6, 7]
+    assert plan_lanes([0], 1, caption_cores=2) == ([[0]], [])  # inference keeps a core
+
+
+def test_candidate_lane_counts():
+    assert candidate_lane_counts(8, 3) == [1, 2, 3]
+    assert candidate_lane_counts(8, 8) == [1, 2, 4, 8]
+    assert candidate_lane_counts(2, 8) == [1, 2]
+
+
+@pytest.mark.skipif(not hasattr(os, "sched_getaffinity"), reason="Linux only")
+def test_lane_threads_are_pinned_and_caption_gets_its_lane():
+    cpus = available_cpus() * 3  # pretend there are more cores than lanes need
+    lanes = CpuLanes(2, caption_cores=1, cpus=cpus)
+
+    async def main():
+        yolo = await lanes.run("yolo", lambda: (threading.current_thread().name, os.sched_getaffinity(0)))
+        caption = await lanes.run("caption", lambda: threading.current_thread().name)
+        return yolo, caption
+
+    try:
+        (name, affinity), caption_thread = asyncio.run(main())
+        stats = lanes.stats()
+        assert len(stats["lanes"]) == 2 and stats["caption_lane"]["cores"] == cpus[-1:]
+        assert name.startswith("lane") and affinity == set(cpus)
+        assert caption_thread.startswith("caption-lane")
+    finally:
+        lanes.shutdown()
+
+
+def test_torch_threads_are_set_once_for_the_process(monkeypatch):
+    import app.cpu_lanes as cpu_lanes
+
+    calls = []
+    monkeypatch.setattr(cpu_lanes, "set_torch_threads", lambda threads, interop=0: calls.append(threads))
+    lanes = CpuLanes(2, caption_cores=1, cpus=list(range(6)))  # lanes of 3 and 2 cores
+    try:
+        lanes.start()
+        lanes.submit("yolo", lambda: None).result(timeout=5)
+        lanes.submit("caption", lambda: None).result(timeout=5)
+        assert calls == [2]
+        assert {lane["torch_threads"] for lane in lanes.stats()["lanes"]} == {2}
+    finally:
+        lanes.shutdown()
+
+
+def test_calls_go_to_the_least_busy_lane():
+    lanes = CpuLanes(2, cpus=available_cpus() * 2)
+    release = threading.Event()
+    try:
+        first = lanes.submit("yolo", release.wait)
+        second = lanes.submit("yolo", lambda: threading.current_thread().name)
+        assert second.result(timeout=5).startswith("lane1")
+        release.set()
+        first.result(timeout=5)
+    finally:
+        release.set()
+        lanes.shutdown()
+
+
+def test_configure_while_serving_drains_the_old_lanes():
+    lanes = CpuLanes(1, cpus=available_cpus() * 2)
+    release = threading.Event()
+    try:
+        running = lanes.submit("yolo", release.wait)
+        queued = lanes.submit("yolo", lambda: "queued")
+        lanes.configure(2)
+        assert len(lanes.stats()["lanes"]) == 2
+        assert lanes.submit("yolo", lambda: "new").result(timeout=5) == "new"
+        release.set()
+        assert running.result(timeout=5) and queued.result(timeout=5) == "queued"
+    finally:
+        release.set()
+        lanes.shutdown()
+
+
+def test_autotune_prefers_throughput_within_latency_slack():
+    cpus = available_cpus() * 4
+
+    # Independent work (sleep releases the GIL): more lanes, same latency
+    lanes, results = autotune(lambda: time.sleep(0.01), [1, 2, 4], rounds=3, cpus=cpus)
+    assert lanes == 4 and [r["lanes"] for r in results] == [1, 2, 4]
+
+    # Shared cores: throughput stays flat, latency grows with concurrent calls
+    lock = threading.Lock()
+    active = [0]
+
+    def contended():
+        with lock:
+            active[0] += 1
+            running = active[0]
+        time.sleep(0.01 * running)
+        with lock:
+            active[0] -= 1
+
+    lanes, _ = autotune(contended, [1, 2, 4], rounds=3, cpus=cpus, latency_slack=1.5)
+    assert lanes == 1
+
+
+def test_stats_without_lanes():
+    body = client.get("/stats").json()
+    assert body["cpu_lanes"] is None and body["cpu_lane_autotune"] == []
@@ -0,0 +1,81 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.executor import ClientDisconnected, InferenceExecutor, StageTimeout
+from app.main import app
+
+
+def test_run_executes_off_event_loop():
+    executor = InferenceExecutor(2)
+
+    async def go():
+        return await executor.run("yolo", threading.get_ident)
+
+    try:
+        worker_thread = asyncio.run(go())
+    finally:
+        executor.shutdown()
+    assert worker_thread != threading.get_ident()
+
+
+def test_stage_timeout():
+    executor = InferenceExecutor(1, {"yolo": 0.05})
+
+    async def go():
+        await executor.run("yolo", time.sleep, 0.5)
+
+    try:
+        with pytest.raises(StageTimeout) as exc:
+            asyncio.run(go())
+    finally:
+        executor.shutdown()
+    assert exc.value.stage == "yolo"
+
+
+def test_stage_timeout_excludes_time_queued_in_pool():
+    executor = InferenceExecutor(1, {"render": 0.2})
+
+    async def go():
+        # The only worker is busy for longer than the render timeout
+        busy = asyncio.ensure_future(executor.run("yolo", time.sleep, 0.4))
+        await asyncio.sleep(0.01)
+        result = await executor.run("render", lambda: "ok")
+        await busy
+        return result
+
+    try:
+        assert asyncio.run(go()) == "ok"
+    finally:
+        executor.shutdown()
+
+
+def test_client_disconnect_abandons_stage():
+    class GoneRequest:
+        async def is_disconnected(self):
+            return True
+
+    executor = InferenceExecutor(1, poll_interval=0.01)
+
+    async def go():
+        await executor.run("caption", time.sleep, 0.5, request=GoneRequest())
+
+    try:
+        with pytest.raises(ClientDisconnected):
+            asyncio.run(go())
+    finally:
+        executor.shutdown()
+
+
+def test_predict_runs_pipeline_on_executor(fake_model, jpeg_bytes):
+    client = TestClient(app)
+    resp = client.post("/predict/", files={"file": ("test.jpg", jpeg_bytes, "image/jpeg")})
+    assert resp.status_code == 200
+    data = resp.json()
+    assert data["object_count"] == 3
+    assert data["object_details"] == {"person": 1, "car": 2}
+    assert data["image_base64"]
+    assert fake_model.calls == 1
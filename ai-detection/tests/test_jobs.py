@@ -0,0 +1,115 @@
+import asyncio
+import time
+
+from fastapi.testclient import TestClient
+
+import app.main as main
+from app.jobs import JobStore
+from app.main import app
+
+
+def test_store_bounds_and_expires_jobs():
+    store = JobStore(max_jobs=2, ttl_seconds=60)
+    first = store.create("a")
+    store.create("b")
+    store.create("c")
+    assert store.get(first["id"]) is None
+    assert store.find("a") is None and store.find("c") is not None
+
+    store.ttl_seconds = 0
+    time.sleep(0.01)
+    assert store.stats()["jobs"] == 2
+    assert store.get("missing") is None
+    assert store.stats()["jobs"] == 0
+
+
+def test_jobs_are_visible_to_other_workers_through_the_shared_dir(tmp_path):
+    owner = JobStore(ttl_seconds=60, disk_dir=str(tmp_path))
+    other = JobStore(ttl_seconds=60, disk_dir=str(tmp_path))
+
+    async def scenario():
+        job = owner.create("k")
+        owner.update(job["id"], status="running")
+        owner.update(job["id"], status="done", caption="a dog")
+        await owner.flush()
+        assert other.get(job["id"]) is None  # not this process's job
+        assert (await other.fetch(job["id"]))["caption"] == "a dog"
+
+        owner.max_jobs = 0  # evicted by its owner: gone everywhere
+        owner.create("other")
+        await owner.flush()
+        assert await other.fetch(job["id"]) is None and await other.fetch("../x") is None
+
+    asyncio.run(scenario())
+
+
+def _enable_fake_captioning(monkeypatch):
+    monkeypatch.setattr(main.caption_engine, "model", object())
+    monkeypatch.setattr(main.caption_engine, "processor", object())
+    monkeypatch.setattr(main.caption_batcher, "process_batch",
+                        lambda images: ["a man walking in the park" for _ in images])
+
+
+def test_async_caption_returns_detections_then_caption(fake_model, jpeg_bytes, monkeypatch):
+    _enable_fake_captioning(monkeypatch)
+    with TestClient(app) as client:
+        data = client.post("/predict/", files={"file": ("a.jpg", jpeg_bytes, "image/jpeg")},
+                           params={"caption": "async"}).json()
+        assert data["object_count"] == 3
+        assert "公園" not in data["description"]
+        job_id = data["caption_job_id"]
+        assert data["caption_status"] in ("pending", "running", "done")
+
+        events = client.get(f"/captions/{job_id}/events").text
+        assert "event: done" in events
+
+        job = client.get(f"/captions/{job_id}").json()
+        assert job["status"] == "done"
+        assert "公園" in job["description"]
+        assert "key" not in job
+
+
+def test_caption_job_queues_a_downscaled_image(fake_model, monkeypatch):
+    import cv2
+    import numpy as np
+
+    _enable_fake_captioning(monkeypatch)
+    sizes = []
+    monkeypatch.setattr(main.caption_batcher, "process_batch",
+                        lambda images: [sizes.append(img.shape[:2]) or "a dog" for img in images])
+    submitted = []
+    submit = main.caption_job_runner.submit
+    monkeypatch.setattr(main.caption_job_runner, "submit",
+                        lambda job, payload: submitted.append(payload) or submit(job, payload))
+    noise = np.random.default_rng(0).integers(0, 255, (1500, 2000, 3), dtype=np.uint8)
+    upload = cv2.imencode(".jpg", noise)[1].tobytes()
+    with TestClient(app) as client:
+        job_id = client.post("/predict/?render=none", files={"file": ("big.jpg", upload, "image/jpeg")},
+                             params={"caption": "async"}).json()["caption_job_id"]
+        assert "event: done" in client.get(f"/captions/{job_id}/events").text
+    image, _ = submitted[0]
+    assert len(image) < len(upload) / 10
+    assert sizes == [(288, 384)]
+
+
+def test_async_caption_disabled_without_model(fake_model, jpeg_bytes):
+    client = TestClient(app)
+    data = client.post("/predict/", files={"file": ("a.jpg", jpeg_bytes, "image/jpeg")},
+                       params={"caption": "async"}).json()
+    assert data["caption_status"] == "disabled"
+    assert data["caption_job_id"] is None
+    assert client.get("/captions/unknown").status_code == 404
+
+
+def test_caption_jobs_shed_when_queue_full(fake_model, jpeg_bytes, monkeypatch):
+    _enable_fake_captioning(monkeypatch)
+    store = JobStore()
+    monkeypatch.setattr(main, "caption_jobs", store)
+    monkeypatch.setattr(main.caption_job_runner, "store", store)
+    monkeypatch.setattr(main.caption_job_runner, "max_pending", 0)
+    client = TestClient(app)
+    data = client.post("/predict/", files={"file": ("a.jpg", jpeg_bytes, "image/jpeg")},
+                       params={"caption": "async"}).json()
+    assert data["object_count"] == 3
+    assert data["caption_status"] == "skipped"
+    assert main.caption_job_runner.stats()["shed"] >= 1
@@ -0,0 +1,69 @@
+import numpy as np
+from fastapi.testclient import TestClient
+
+import app.main as main
+from app.limits import BodySizeLimitMiddleware
+from app.main import app, decode_image
+
+client = TestClient(app)
+
+
+def _jpeg(width, height):
+    import cv2
+
+    img = np.zeros((height, width, 3), dtype=np.uint8)
+    img[:, : width // 2] = (0, 128, 255)
+    return cv2.imencode(".jpg", img)[1].tobytes()
+
+
+def test_declared_oversize_upload_rejected():
+    limit = BodySizeLimitMiddleware(app, max_bytes=1024)
+    small = TestClient(limit)
+    resp = small.post("/predict/", files={"file": ("a.jpg", b"x" * 4096, "image/jpeg")})
+    assert resp.status_code == 413
+
+
+def test_streamed_oversize_upload_rejected_without_content_length():
+    limit = BodySizeLimitMiddleware(app, max_bytes=1024)
+    small = TestClient(limit)
+
+    def chunks():
+        for _ in range(8):
+            yield b"x" * 512
+
+    # Multipart, so the endpoint actually streams the body through the form parser
+    resp = small.post("/predict/", content=chunks(), headers={"content-type": "multipart/form-data; boundary=b"})
+    assert resp.status_code == 413
+
+
+def test_path_specific_limit():
+    limit = BodySizeLimitMiddleware(app, max_bytes=1024, path_limits={"/predict/batch": 0})
+    assert limit.limit_for("/predict/") == 1024
+    assert limit.limit_for("/predict/batch") == 0
+
+
+def test_jpeg_decoded_at_reduced_resolution():
+    img, scale = decode_image(_jpeg(2600, 1300), max_side=640)
+    assert img.shape[:2] == (325, 650)
+    assert scale == 4.0
+
+    full, scale = decode_image(_jpeg(2600, 1300))
+    assert full.shape[:2] == (1300, 2600) and scale == 1.0
+
+
+def test_png_resized_to_max_side():
+    import cv2
+
+    png = cv2.imencode(".png", np.zeros((1000, 2000, 3), dtype=np.uint8))[1].tobytes()
+    img, scale = decode_image(png, max_side=500)
+    assert img.shape[:2] == (250, 500)
+    assert scale == 4.0
+
+
+def test_boxes_mapped_back_to_original_coordinates(fake_model):
+    resp = client.post("/predict/", files={"file": ("big.jpg", _jpeg(2600, 1300), "image/jpeg")},
+                       params={"render": "none"})
+    data = resp.json()
+    # fake box #1 is [10, 10, 30, 40] in decoded pixels; image was decoded at 1/4
+    assert data["boxes"][1]["xyxy"] == [40.0, 40.0, 120.0, 160.0]
+    assert main.MODEL_IMGSZ == 640
@@ -0,0 +1,39 @@
+import pytest
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+
+from app.main import app
+
+client = TestClient(app)
+
+
+def _sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def test_predict_records_stage_histograms(fake_model, jpeg_bytes):
+    stages = ("upload", "queue_wait", "decode", "yolo", "yolo_inference", "plot", "encode", "base64", "total")
+    before = {s: _sample("ai_detection_stage_seconds_count", stage=s) for s in stages}
+    inference_sum = _sample("ai_detection_stage_seconds_sum", stage="yolo_inference")
+    misses = _sample("ai_detection_predict_requests_total", outcome="miss")
+
+    r = client.post("/predict/", files={"file": ("a.jpg", jpeg_bytes, "image/jpeg")})
+    assert r.status_code == 200
+
+    for stage in stages:
+        assert _sample("ai_detection_stage_seconds_count", stage=stage) == before[stage] + 1, stage
+    # ultralytics reports ms; histograms are in seconds
+    assert _sample("ai_detection_stage_seconds_sum", stage="yolo_inference") - inference_sum == pytest.approx(0.01)
+    assert _sample("ai_detection_predict_requests_total", outcome="miss") == misses + 1
+    assert _sample("ai_detection_requests_in_flight") == 0
+    assert _sample("ai_detection_requests_queued") == 0
+
+
+def test_metrics_endpoint_exposition(fake_model, jpeg_bytes):
+    client.post("/predict/", files={"file": ("a.jpg", jpeg_bytes, "image/jpeg")})
+    r = client.get("/metrics")
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/plain")
+    assert 'ai_detection_stage_seconds_bucket{le="0.01",stage="decode"}' in r.text
+    assert "ai_detection_requests_in_flight" in r.text
+    assert "process_resident_memory_bytes" in r.text
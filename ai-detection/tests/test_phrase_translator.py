@@ -0,0 +1,37 @@
+from app.main import generate_scene_description, translate_caption_to_japanese
+from app.translation import PhraseTranslator, contains_japanese
+
+
+def test_longest_match_with_word_boundaries():
+    t = PhraseTranslator({"car": "車", "cars": "車たち", "hot dog": "ホットドッグ", "dog": "犬"})
+    assert t.translate("cars") == "車たち"
+    # spaces next to Japanese text are dropped
+    assert t.translate("a hot dog and a dog") == "aホットドッグand a犬"
+    # no substring matches inside other words
+    assert t.translate("carpet") == "carpet"
+    assert t.translate("scary dogma") == "scary dogma"
+
+
+def test_bundled_vocabulary_translates_captions():
+    assert translate_caption_to_japanese("a photo of a busy street with cars and people") == "賑やかな通りと車と人々"
+    assert translate_caption_to_japanese("A   Dog sitting on the BEACH") == "犬座っているの上にビーチ"
+
+
+def test_untranslatable_caption_kept_in_english():
+    assert translate_caption_to_japanese("  xylophone recital ") == "xylophone recital"
+    assert not contains_japanese("xylophone")
+
+
+def test_object_names_share_the_engine():
+    description = generate_scene_description(None, {"dining table": 1, "unicorn": 2}, caption=("", ""))
+    assert "ダイニングテーブルが1つ" in description
+    assert "unicornが2個" in description
+
+
+def test_vocabulary_loaded_from_file(tmp_path):
+    path = tmp_path / "vocab.json"
+    path.write_text('{"phrases": {"sea otter": "ラッコ"}, "objects": {"otter": "カワウソ"}}', encoding="utf-8")
+    t = PhraseTranslator.from_file(str(path))
+    assert t.translate("sea otter") == "ラッコ"
+    assert t.object_name("otter") == "カワウソ"
+    assert len(t) == 2
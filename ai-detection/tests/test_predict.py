@@ -1,4 +1,5 @@
 import io
+import pytest
 from fastapi.testclient import TestClient
 from app.main import app
 
@@ -20,14 +21,83 @@ def create_test_image():
     return buf
 
 
-def test_predict_smoke():
+def test_predict_smoke(stub_model):
     image_buf = create_test_image()
     files = {"file": ("test.jpg", image_buf, "image/jpeg")}
     resp = client.post("/predict/", files=files)
-    # Accept 200 (success), 503 (model not loaded), or 500 (server error) as valid smoke-test outcomes.
-    assert resp.status_code in (200, 500, 503)
-    if resp.status_code == 200:
-        data = resp.json()
-        assert "image_base64" in data
-        assert "filename" in data
-        assert data["filename"] == "test.jpg"
+    assert resp.status_code == 200
+    data = resp.json()
+    assert "image_base64" in data
+    assert "filename" in data
+    assert data["filename"] == "test.jpg"
+    assert data["object_count"] == len(data["boxes"])
+
+
+def test_predict_without_model_is_503():
+    files = {"file": ("test.jpg", create_test_image(), "image/jpeg")}
+    assert client.post("/predict/", files=files).status_code == 503
+
+
+def _jpeg(width, height):
+    from PIL import Image
+
+    img = Image.new("RGB", (width, height), color=(40, 90, 160))
+    img.paste((230, 200, 40), (width // 4, height // 4, width // 2, height // 2))
+    buf = io.BytesIO()
+    img.save(buf, format="JPEG")
+    return buf.getvalue()
+
+
+def test_presized_upload_boxes_in_original_coordinates(fake_model, monkeypatch):
+    import app.main as main
+    from app.cache import ResultCache
+
+    # Cache disabled: both uploads share the same bytes and must each run the model
+    monkeypatch.setattr(main, "result_cache", ResultCache(max_entries=0))
+
+    def post(params, data):
+        files = {"file": ("a.jpg", data, "image/jpeg")}
+        return client.post(f"/predict/?render=none{params}", files=files)
+
+    small = post("", _jpeg(640, 480)).json()
+    # Same pixels, declared as a 4x smaller version of a 2560x1920 photo
+    presized = post("&orig_width=2560&orig_height=1920", _jpeg(640, 480)).json()
+    assert presized["object_count"] == small["object_count"] > 0
+    for a, b in zip(small["boxes"], presized["boxes"]):
+        assert b["xyxy"] == pytest.approx([v * 4 for v in a["xyxy"]], rel=1e-3)
+
+
+def test_presized_upload_larger_than_serving_size_is_still_capped(fake_model, monkeypatch):
+    import app.main as main
+    from app.cache import ResultCache
+
+    monkeypatch.setattr(main, "result_cache", ResultCache(max_entries=0))
+    decoded = []
+    decode_image = main.decode_image
+    monkeypatch.setattr(main, "decode_image", lambda data, side: decoded.append(side) or decode_image(data, side))
+
+    def boxes(params, data):
+        files = {"file": ("a.jpg", data, "image/jpeg")}
+        return client.post(f"/predict/?render=none{params}", files=files).json()["boxes"]
+
+    expected = boxes("&orig_width=2560&orig_height=1920", _jpeg(640, 480))
+    # Declared pre-sized but sent at twice the serving size: decoded reduced, scales combined
+    oversized = boxes("&orig_width=2560&orig_height=1920", _jpeg(1280, 960))
+    assert decoded == [main.MODEL_IMGSZ] * 2
+    for a, b in zip(expected, oversized):
+        assert b["xyxy"] == pytest.approx(a["xyxy"], rel=2e-2)
+
+
+def test_presized_dimensions_are_validated(stub_model):
+    def status(params):
+        files = {"file": ("a.jpg", _jpeg(640, 480), "image/jpeg")}
+        return client.post(f"/predict/?render=none{params}", files=files).status_code
+
+    assert status("&orig_width=2560") == 400                      # height missing
+    assert status("&orig_width=2560&orig_height=2560") == 400     # aspect ratio differs
+    assert status("&orig_width=320&orig_height=240") == 400       # smaller than the upload
+    assert status("&orig_width=1281&orig_height=961") == 200      # rounding tolerated
+
+
+def test_health_reports_serving_resolution():
+    assert client.get("/health").json()["model_imgsz"] == 640
@@ -0,0 +1,126 @@
+import os
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.registry import ModelRegistry, UnknownModel
+
+client = TestClient(app)
+
+
+class Loaded:
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self.content = f.read()
+
+
+def make_registry(tmp_path, sizes=None, **kwargs):
+    for name, size in (sizes or {"a": 10, "b": 10, "c": 10}).items():
+        (tmp_path / f"{name}.pt").write_bytes(b"x" * size)
+    (tmp_path / "notes.txt").write_text("ignored")
+    loaded = []
+
+    def loader(path):
+        loaded.append(os.path.basename(path))
+        return Loaded(path)
+
+    kwargs.setdefault("check_interval", 0.0)
+    return ModelRegistry(str(tmp_path), loader, **kwargs), loaded
+
+
+def test_available_and_unknown_names(tmp_path):
+    registry, _ = make_registry(tmp_path)
+    assert registry.available() == ["a", "b", "c"]
+    for name in ("missing", "notes", "../a", ""):
+        with pytest.raises(UnknownModel):
+            registry.get(name)
+
+
+def test_lru_eviction_by_count(tmp_path):
+    registry, loaded = make_registry(tmp_path, max_models=2)
+    registry.get("a")
+    registry.get("b")
+    registry.get("a")  # b is now the least recently used
+    registry.get("c")
+    assert "b" not in registry and "a" in registry and "c" in registry
+    assert registry.evictions == 1
+    registry.get("b")
+    assert loaded == ["a.pt", "b.pt", "c.pt", "b.pt"]
+
+
+def test_lru_eviction_by_bytes(tmp_path):
+    registry, _ = make_registry(tmp_path, {"a": 600, "b": 600, "big": 2000}, max_models=10, max_bytes=1500)
+    registry.get("a")
+    registry.get("b")
+    assert registry.resident_bytes == 1200
+    # A model over budget on its own still loads; everything else is evicted
+    registry.get("big")
+    assert [e["name"] for e in registry.stats()["resident"]] == ["big"]
+
+
+def test_changed_checkpoint_is_reloaded(tmp_path):
+    registry, loaded = make_registry(tmp_path)
+    assert registry.get("a").content == b"x" * 10
+    version = registry.version("a")
+    (tmp_path / "a.pt").write_bytes(b"y" * 12)
+    later = time.time() + 5
+    os.utime(tmp_path / "a.pt", (later, later))
+    assert registry.get("a").content == b"y" * 12
+    assert registry.version("a") != version
+    assert registry.reloads == 1 and registry.loads == 1
+
+
+def test_failed_reload_keeps_the_resident_model(tmp_path):
+    registry, _ = make_registry(tmp_path)
+    first = registry.get("a")
+    load = registry.loader
+
+    def broken(path):
+        raise RuntimeError("truncated checkpoint")
+
+    registry.loader = broken
+    (tmp_path / "a.pt").write_bytes(b"y")
+    assert registry.get("a") is first
+    assert registry.reload_failures == 1
+    with pytest.raises(RuntimeError):
+        registry.get("b")  # first load: nothing to fall back to
+
+    registry.loader = load  # fixed on the next check
+    assert registry.get("a").content == b"y" and registry.reloads == 1
+
+
+def test_concurrent_requests_share_one_load(tmp_path):
+    registry, loaded = make_registry(tmp_path)
+    slow = registry.loader
+    registry.loader = lambda path: (time.sleep(0.1), slow(path))[1]
+    threads = [threading.Thread(target=registry.get, args=("a",)) for _ in range(5)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert loaded == ["a.pt"]
+
+
+def test_predict_with_model_selection(stub_model, jpeg_bytes, tmp_path, monkeypatch):
+    import app.main as main
+    from app.stub_model import StubYOLO
+
+    (tmp_path / "custom.pt").write_bytes(b"weights")
+    registry = ModelRegistry(str(tmp_path), lambda path: StubYOLO(work_ms=0), max_models=1)
+    monkeypatch.setattr(main, "model_registry", registry)
+
+    resp = client.post("/predict/?render=none&model=custom", files={"file": ("a.jpg", jpeg_bytes, "image/jpeg")})
+    assert resp.status_code == 200
+    assert resp.json()["model"] == "custom"
+    assert "custom" in registry
+
+    resp = client.post("/predict/?render=none&model=nope", files={"file": ("a.jpg", jpeg_bytes, "image/jpeg")})
+    assert resp.status_code == 404
+
+    listing = client.get("/models").json()
+    assert listing["available"] == ["custom"]
+    assert [m["name"] for m in listing["resident"]] == ["custom"]
@@ -0,0 +1,43 @@
+import base64
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+
+client = TestClient(app)
+
+
+def _post(jpeg_bytes, **params):
+    return client.post("/predict/", files={"file": ("a.jpg", jpeg_bytes, "image/jpeg")}, params=params)
+
+
+def test_response_includes_structured_boxes(fake_model, jpeg_bytes):
+    data = _post(jpeg_bytes).json()
+    assert [b["class_name"] for b in data["boxes"]] == ["person", "car", "car"]
+    assert data["boxes"][1]["xyxy"] == [10.0, 10.0, 30.0, 40.0]
+    assert 0 < data["boxes"][0]["confidence"] <= 1
+    assert base64.b64decode(data["image_base64"])[:2] == b"\xff\xd8"
+
+
+def test_render_none_skips_image(fake_model, jpeg_bytes):
+    data = _post(jpeg_bytes, render="none").json()
+    assert data["image_base64"] == ""
+    assert data["image_url"] is None
+    assert data["object_count"] == 3
+
+
+def test_webp_fetched_from_binary_url(fake_model, jpeg_bytes):
+    data = _post(jpeg_bytes, render="webp", quality=60, max_size=64, inline_image="false").json()
+    assert data["image_base64"] == ""
+    image = client.get(data["image_url"])
+    assert image.status_code == 200
+    assert image.headers["content-type"] == "image/webp"
+    assert image.content[8:12] == b"WEBP"
+
+
+def test_unknown_image_id_is_404():
+    assert client.get("/predict/images/missing").status_code == 404
+
+
+def test_invalid_render_mode_rejected(fake_model, jpeg_bytes):
+    assert _post(jpeg_bytes, render="gif").status_code == 422
@@ -0,0 +1,66 @@
+import email
+
+import msgpack
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.responses import JSON, MSGPACK, MULTIPART, dumps_json, negotiate
+
+client = TestClient(app)
+
+
+def test_negotiate():
+    assert negotiate(None) == JSON
+    assert negotiate("*/*") == JSON
+    assert negotiate("application/msgpack") == MSGPACK
+    assert negotiate("application/x-msgpack, */*;q=0.1") == MSGPACK
+    assert negotiate("application/json;q=0.5, multipart/mixed") == MULTIPART
+    assert negotiate("multipart/mixed;q=0, application/json") == JSON
+    assert negotiate("text/html") == JSON
+
+
+def test_dumps_json_handles_numpy_scalars():
+    import numpy as np
+
+    assert dumps_json({"x": np.float32(0.5), "n": np.int64(3), "ja": "人"}) == '{"x":0.5,"n":3,"ja":"人"}'.encode()
+
+
+def post(jpeg, accept=None, params=""):
+    headers = {"Accept": accept} if accept else {}
+    return client.post(f"/predict/{params}", files={"file": ("a.jpg", jpeg, "image/jpeg")}, headers=headers)
+
+
+def test_json_is_default(stub_model, jpeg_bytes):
+    resp = post(jpeg_bytes)
+    assert resp.headers["content-type"] == "application/json"
+    body = resp.json()
+    assert body["image_base64"] and body["caption_status"] is None
+    assert resp.headers["X-Cache"] == "MISS"
+
+
+def test_msgpack_carries_raw_image(stub_model, jpeg_bytes):
+    resp = post(jpeg_bytes, "application/msgpack")
+    assert resp.headers["content-type"] == "application/msgpack"
+    body = msgpack.unpackb(resp.content, raw=False)
+    assert "image_base64" not in body
+    assert body["image"][:2] == b"\xff\xd8" and body["image_media_type"] == "image/jpeg"
+    assert body["object_count"] == len(body["boxes"])
+    assert client.get(body["image_url"]).content == body["image"]
+
+
+def test_multipart_mixed_has_json_and_image_parts(stub_model, jpeg_bytes):
+    resp = post(jpeg_bytes, "multipart/mixed", "?render=webp")
+    assert resp.headers["content-type"].startswith("multipart/mixed; boundary=")
+    assert resp.headers["vary"] == "Accept"
+    message = email.message_from_bytes(
+        b"Content-Type: " + resp.headers["content-type"].encode() + b"\r\n\r\n" + resp.content)
+    meta, image = message.get_payload()
+    assert meta.get_content_type() == "application/json"
+    assert image.get_content_type() == "image/webp"
+    assert image.get_payload(decode=True)[:4] == b"RIFF"
+    assert len(resp.content) < len(post(jpeg_bytes, params="?render=webp").content)
+
+
+def test_binary_format_without_image(stub_model, jpeg_bytes):
+    body = msgpack.unpackb(post(jpeg_bytes, "application/msgpack", "?render=none").content, raw=False)
+    assert body["image"] is None and body["image_url"] is None
@@ -0,0 +1,83 @@
+import os
+import subprocess
+import threading
+import time
+
+from app.serve import Supervisor
+
+
+def _wait_for(predicate, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def _starts(path):
+    return path.read_text().splitlines() if path.exists() else []
+
+
+def test_supervisor_restarts_crashed_worker(tmp_path):
+    marker = tmp_path / "starts"
+
+    def target(slot):
+        with open(marker, "a") as f:
+            f.write(f"{slot}\n")
+        if len(_starts(marker)) < 3:
+            os._exit(3)  # first two starts crash
+        time.sleep(30)
+
+    exited = []
+    supervisor = Supervisor(target, workers=1, graceful_timeout=5, on_exit=exited.append, min_uptime=0)
+    thread = threading.Thread(target=supervisor.run, kwargs={"poll_interval": 0.02})
+    thread.start()
+    try:
+        assert _wait_for(lambda: len(_starts(marker)) == 3)
+    finally:
+        supervisor.stop()
+        thread.join(10)
+    assert not thread.is_alive()
+    assert supervisor.restarts == 2
+    assert supervisor.children == {}
+    # two crashes + the worker stopped on shutdown
+    assert len(exited) == 3
+
+
+def test_crash_loop_backs_off(tmp_path):
+    marker = tmp_path / "starts"
+
+    def target(slot):
+        with open(marker, "a") as f:
+            f.write("x\n")
+        os._exit(1)
+
+    supervisor = Supervisor(target, workers=1, graceful_timeout=1, min_uptime=60)
+    thread = threading.Thread(target=supervisor.run, kwargs={"poll_interval": 0.02})
+    thread.start()
+    try:
+        time.sleep(0.5)
+        # Crashed immediately: the restart waits at least a second
+        assert len(_starts(marker)) == 1
+        assert _wait_for(lambda: len(_starts(marker)) == 2, timeout=3)
+    finally:
+        supervisor.stop()
+        thread.join(10)
+    assert supervisor._backoff[0] >= 1.0
+
+
+def test_start_script_uses_plain_uvicorn_for_one_worker(tmp_path):
+    # Stand-ins for uvicorn / python that print how they were called
+    for name in ("uvicorn", "python"):
+        stub = tmp_path / name
+        stub.write_text(f'#!/bin/sh\necho {name} "$@"\n')
+        stub.chmod(0o755)
+    script = os.path.join(os.path.dirname(__file__), "..", "start.sh")
+
+    def run(workers):
+        env = {"PATH": f"{tmp_path}:/usr/bin:/bin", "PORT": "9000", "WEB_CONCURRENCY": workers}
+        return subprocess.run(["sh", script], env=env, capture_output=True, text=True).stdout.splitlines()[-1]
+
+    assert run("1").startswith("uvicorn app.main:app --host 0.0.0.0 --port 9000")
+    assert run("3").startswith("python -m app.serve --host 0.0.0.0 --port 9000 --workers 3")
@@ -0,0 +1,42 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+
+import app.main as main
+
+client = TestClient(main.app)
+
+
+def test_single_health_route():
+    assert [r.path for r in main.app.routes].count("/health") == 1
+
+
+def test_livez_is_up_before_ready(monkeypatch):
+    monkeypatch.setattr(main, "app_ready", False)
+    assert client.get("/livez").status_code == 200
+    r = client.get("/readyz")
+    assert r.status_code == 503
+    assert r.json()["status"] == "starting"
+    assert client.get("/health").json()["ready"] is False
+
+
+def test_warmup_flips_readiness(stub_model, monkeypatch):
+    monkeypatch.setattr(main, "app_ready", False)
+    monkeypatch.setattr(main, "models_preloaded", True)
+    monkeypatch.setattr(main, "startup_timings", {})
+
+    asyncio.run(main.prepare_models())
+
+    r = client.get("/readyz")
+    assert r.status_code == 200
+    timing = r.json()["startup_timing"]
+    assert {"warmup_decode", "warmup_yolo", "warmup_render", "prepare"} <= set(timing)
+    assert "warmup_caption" not in timing  # captioning disabled
+
+
+def test_not_ready_without_model(monkeypatch):
+    monkeypatch.setattr(main, "app_ready", False)
+    monkeypatch.setattr(main, "models_preloaded", True)
+    monkeypatch.setattr(main, "model", None)
+    asyncio.run(main.prepare_models())
+    assert client.get("/readyz").status_code == 503
@@ -0,0 +1,103 @@
+import asyncio
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+import app.main as main
+from app.streaming import LatestFrameSlot, RateMeter
+
+client = TestClient(main.app)
+
+
+def test_slot_keeps_only_newest_frame():
+    async def scenario():
+        slot = LatestFrameSlot()
+        for i in range(3):
+            slot.put(i)
+        assert await slot.get() == 2
+        assert (slot.received, slot.dropped) == (3, 2)
+        slot.close()
+        assert await slot.get() is None
+
+    asyncio.run(scenario())
+
+
+def test_rate_meter():
+    meter = RateMeter(window=5)
+    assert meter.rate() == 0.0
+    for _ in range(3):
+        meter.tick()
+        time.sleep(0.01)
+    assert meter.rate() > 10
+
+
+def _receive_until_frame(ws, frame):
+    while True:
+        message = ws.receive_json()
+        if message.get("frame") == frame:
+            return message
+
+
+def test_stream_returns_compact_detections(fake_model, jpeg_bytes):
+    with client.websocket_connect("/ws/detect") as ws:
+        hello = ws.receive_json()
+        assert hello["type"] == "hello"
+        assert hello["names"]["0"] == "person"
+        ws.send_bytes(jpeg_bytes)
+        message = ws.receive_json()
+    assert message["type"] == "detections"
+    assert message["frame"] == 0
+    assert message["counts"] == {"person": 1, "car": 2}
+    assert message["boxes"][1] == [10.0, 10.0, 30.0, 40.0, 2, pytest.approx(0.7, abs=1e-3)]
+    assert (message["received"], message["processed"], message["dropped"]) == (1, 1, 0)
+
+
+def test_stale_frames_are_dropped(fake_model, jpeg_bytes, monkeypatch):
+    original = fake_model.predict
+
+    def slow_predict(source, **kwargs):
+        time.sleep(0.2)
+        return original(source, **kwargs)
+
+    monkeypatch.setattr(fake_model, "predict", slow_predict)
+    with client.websocket_connect("/ws/detect") as ws:
+        ws.receive_json()
+        for _ in range(5):
+            ws.send_bytes(jpeg_bytes)
+        last = _receive_until_frame(ws, 4)
+    assert last["received"] == 5
+    assert last["dropped"] >= 1
+    assert last["processed"] + last["dropped"] == 5
+
+
+def test_failed_frame_reports_an_error_and_the_stream_continues(fake_model, jpeg_bytes, monkeypatch):
+    original = fake_model.predict
+    calls = []
+
+    def flaky_predict(source, **kwargs):
+        calls.append(1)
+        if len(calls) == 1:
+            raise RuntimeError("model exploded")
+        return original(source, **kwargs)
+
+    monkeypatch.setattr(fake_model, "predict", flaky_predict)
+    with client.websocket_connect("/ws/detect") as ws:
+        ws.receive_json()
+        ws.send_bytes(jpeg_bytes)
+        failed = _receive_until_frame(ws, 0)
+        ws.send_bytes(jpeg_bytes)
+        ok = _receive_until_frame(ws, 1)
+    assert "model exploded" in failed["error"]
+    assert ok["counts"] == {"person": 1, "car": 2}
+
+
+def test_oversized_frame_closes_stream(fake_model, jpeg_bytes, monkeypatch):
+    monkeypatch.setattr(main, "MAX_STREAM_FRAME_BYTES", 16)
+    with client.websocket_connect("/ws/detect") as ws:
+        ws.receive_json()
+        ws.send_bytes(jpeg_bytes)
+        with pytest.raises(WebSocketDisconnect) as e:
+            ws.receive_json()
+    assert e.value.code == 1009
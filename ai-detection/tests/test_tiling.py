@@ -0,0 +1,86 @@
+import numpy as np
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.tiling import TiledBoxes, TiledResult, merge_tile_results, nms, tile_windows
+
+client = TestClient(app)
+
+
+def test_tile_windows_cover_image_with_overlap():
+    windows = tile_windows(2500, 1000, 1024, 0.2)
+    assert all(x1 - x0 <= 1024 and y1 - y0 <= 1024 for x0, y0, x1, y1 in windows)
+    assert max(x1 for _, _, x1, _ in windows) == 2500
+    assert max(y1 for _, _, _, y1 in windows) == 1000
+    xs = sorted({x0 for x0, _, _, _ in windows})
+    assert xs == [0, 819, 1476]
+    assert tile_windows(500, 400, 1024, 0.2) == [(0, 0, 500, 400)]
+
+
+def test_nms_suppresses_partial_duplicates_per_class():
+    xyxy = np.array([[0, 0, 100, 100], [0, 0, 60, 100], [0, 0, 60, 100], [200, 200, 250, 250]], np.float32)
+    conf = np.array([0.9, 0.8, 0.7, 0.6], np.float32)
+    cls = np.array([0, 0, 1, 0], np.float32)
+    # The partial box (IoU 0.6, IoS 1.0) is a duplicate; the other class is kept
+    assert nms(xyxy, conf, cls, 0.5).tolist() == [0, 2, 3]
+    assert nms(xyxy, conf, cls, 0.7, metric="iou").tolist() == [0, 1, 2, 3]
+
+
+def test_merge_shifts_tile_boxes_to_image_coordinates():
+    img = np.zeros((100, 200, 3), np.uint8)
+    names = {0: "person", 2: "car"}
+    speed = {"preprocess": 1.0, "inference": 10.0, "postprocess": 1.0}
+    tile = TiledResult(img, TiledBoxes(np.array([[0, 0, 20, 30]], np.float32), np.array([2.0]), np.array([0.9])),
+                       names, speed, 1)
+    whole = TiledResult(img, TiledBoxes(np.zeros((0, 4)), np.zeros(0), np.zeros(0)), names, speed, 1)
+    merged = merge_tile_results(img, [tile, tile, whole], [(0, 0, 100, 100), (100, 0, 200, 100)])
+    assert merged.tiles == 2
+    assert merged.boxes.xyxy.tolist() == [[0, 0, 20, 30], [100, 0, 120, 30]]
+    assert merged.speed["inference"] == 30.0
+    assert merged.plot().shape == img.shape
+
+
+def _large_jpeg(width=3200, height=1800):
+    import cv2
+
+    rng = np.random.default_rng(0)
+    img = rng.integers(0, 255, (height // 8, width // 8, 3), dtype=np.uint8)
+    img = cv2.resize(img, (width, height), interpolation=cv2.INTER_NEAREST)
+    ok, buf = cv2.imencode(".jpg", img)
+    assert ok
+    return buf.tobytes()
+
+
+def test_predict_tiles_large_images_automatically(stub_model):
+    data = _large_jpeg()
+    resp = client.post("/predict/?render=none", files={"file": ("big.jpg", data, "image/jpeg")})
+    assert resp.status_code == 200
+    body = resp.json()
+    assert body["tiles"] == len(tile_windows(3200, 1800, 1024, 0.2))
+    assert body["object_count"] == len(body["boxes"])
+    for box in body["boxes"]:
+        x1, y1, x2, y2 = box["xyxy"]
+        assert 0 <= x1 < x2 <= 3200 and 0 <= y1 < y2 <= 1800
+
+    plain = client.post("/predict/?render=none&tile=off", files={"file": ("big.jpg", data, "image/jpeg")})
+    assert plain.status_code == 200
+    assert plain.json()["tiles"] is None
+
+
+def test_predict_tile_params_per_request(stub_model, jpeg_bytes):
+    resp = client.post("/predict/?render=none&tile=on&tile_size=512&tile_overlap=0",
+                       files={"file": ("big.jpg", _large_jpeg(1024, 512), "image/jpeg")})
+    assert resp.status_code == 200
+    assert resp.json()["tiles"] == 2
+    # Small images are never tiled
+    small = client.post("/predict/?render=none&tile=on", files={"file": ("small.jpg", jpeg_bytes, "image/jpeg")})
+    assert small.json()["tiles"] is None
+
+
+def test_predict_rejects_too_many_tiles(stub_model, monkeypatch):
+    import app.main as main
+
+    monkeypatch.setattr(main, "TILE_MAX_TILES", 4)
+    resp = client.post("/predict/?render=none&tile=on&tile_size=256",
+                       files={"file": ("big.jpg", _large_jpeg(), "image/jpeg")})
+    assert resp.status_code == 400
@@ -0,0 +1,100 @@
+import io
+import json
+import logging
+
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+
+from app.logs import JsonFormatter
+from app.main import app
+from app.tracing import OTLPFileExporter, Trace, TraceMiddleware, parse_traceparent, record_span
+
+client = TestClient(app)
+
+
+def request_records(caplog):
+    return [r for r in caplog.records if r.name == "app.request"]
+
+
+def test_predict_logs_one_record_with_stage_spans(stub_model, jpeg_bytes, caplog, monkeypatch):
+    import app.main as main
+    from app.cache import ResultCache
+
+    # Cache disabled: the pipeline always runs, whatever earlier tests stored
+    monkeypatch.setattr(main, "result_cache", ResultCache(max_entries=0))
+    caplog.set_level(logging.INFO, logger="app.request")
+    res = client.post("/predict/?render=none", files={"file": ("a.jpg", jpeg_bytes, "image/jpeg")})
+    assert res.status_code == 200
+    records = request_records(caplog)
+    assert len(records) == 1
+    fields = records[0].fields
+    assert fields["trace_id"] == res.headers["x-trace-id"]
+    assert fields["status"] == 200 and fields["path"] == "/predict/"
+    assert {"queue_wait", "decode", "yolo"} <= set(fields["stages_ms"])
+    assert fields["attributes"]["cache"] == "miss"
+
+
+def test_traceparent_is_continued(caplog):
+    trace_id = "4bf92f3577b34da6a3ce929d0e0e4736"
+    res = client.get("/livez", headers={"traceparent": f"00-{trace_id}-00f067aa0ba902b7-01"})
+    assert res.headers["x-trace-id"] == trace_id
+    assert parse_traceparent("00-" + "0" * 32 + "-00f067aa0ba902b7-01") == (None, None)
+    assert parse_traceparent("garbage") == (None, None)
+
+
+def make_app(**kwargs):
+    inner = FastAPI()
+
+    @inner.get("/ok")
+    async def ok():
+        return {"ok": True}
+
+    @inner.get("/fail")
+    async def fail():
+        raise HTTPException(status_code=503, detail="down")
+
+    inner.add_middleware(TraceMiddleware, **kwargs)
+    return TestClient(inner)
+
+
+def test_sampling_keeps_errors_and_drops_probes(caplog):
+    caplog.set_level(logging.INFO, logger="app.request")
+    sampled = make_app(sample_rate=0.0)
+    sampled.get("/ok")
+    sampled.get("/fail")
+    records = request_records(caplog)
+    assert [r.fields["path"] for r in records] == ["/fail"]
+    assert records[0].levelno == logging.WARNING
+
+    caplog.clear()
+    client.get("/livez")
+    assert request_records(caplog) == []
+
+
+def test_otlp_file_exporter(tmp_path):
+    exporter = OTLPFileExporter(str(tmp_path / "traces.jsonl"))
+    trace = Trace("POST /predict/")
+    trace.add_span("yolo", trace._start, trace._start + 0.01)
+    trace.attributes["http.status_code"] = 200
+    trace.finish()
+    exporter.export(trace)
+    exporter.close()
+    line = json.loads((tmp_path / "traces.jsonl").read_text().splitlines()[0])
+    spans = line["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    assert [s["name"] for s in spans] == ["POST /predict/", "yolo"]
+    assert spans[1]["parentSpanId"] == spans[0]["spanId"] and spans[0]["traceId"] == trace.trace_id
+
+
+def test_record_span_outside_a_request_is_ignored():
+    record_span("decode", 0.0, 1.0)  # no current trace: no error
+
+
+def test_json_formatter_merges_fields():
+    stream = io.StringIO()
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(JsonFormatter())
+    record = logging.LogRecord("app.request", logging.INFO, __file__, 1, "GET %s", ("/x",), None)
+    record.fields = {"status": 200, "stages_ms": {"yolo": 1.5}}
+    handler.emit(record)
+    entry = json.loads(stream.getvalue())
+    assert entry["msg"] == "GET /x" and entry["status"] == 200 and entry["stages_ms"] == {"yolo": 1.5}
@@ -0,0 +1,97 @@
+import json
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+import app.main as main
+from app.video import SegmentAccumulator, iter_frames_opencv, output_size, probe_video
+
+client = TestClient(main.app)
+
+
+@pytest.fixture
+def video_path(tmp_path):
+    """3 s clip, 10 fps, 160x120; frame i is filled with gray level 8*i."""
+    import cv2
+
+    path = tmp_path / "clip.mp4"
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"mp4v"), 10, (160, 120))
+    if not writer.isOpened():
+        pytest.skip("OpenCV cannot write mp4 here")
+    for i in range(30):
+        writer.write(np.full((120, 160, 3), 8 * i, dtype=np.uint8))
+    writer.release()
+    return str(path)
+
+
+def test_probe_and_sample_with_opencv(video_path):
+    info = probe_video(video_path)
+    assert (info["width"], info["height"], info["frame_count"]) == (160, 120, 30)
+    frames = list(iter_frames_opencv(video_path, sample_fps=2, max_side=80))
+    assert [round(t, 2) for t, _ in frames] == [0.0, 0.5, 1.0, 1.5, 2.0, 2.5]
+    assert frames[0][1].shape == (60, 80, 3)
+
+
+def test_output_size_is_even_and_bounded():
+    assert output_size(1920, 1080, 640) == (640, 360)
+    assert output_size(101, 75, 0) == (100, 74)
+
+
+def test_segments_report_peak_counts_and_timeline():
+    acc = SegmentAccumulator(segment_seconds=1.0)
+    assert acc.add(0.0, {"car": 1}) == []
+    assert acc.add(0.5, {"car": 3, "person": 1}) == []
+    # nothing sampled in [1, 2): that segment is skipped
+    done = acc.add(2.2, {"person": 2})
+    assert len(done) == 1
+    assert done[0]["object_details"] == {"car": 3, "person": 1}
+    assert done[0]["frames_with"] == {"car": 2, "person": 1}
+    assert done[0]["timeline"] == [[0.0, {"car": 1}], [0.5, {"car": 3, "person": 1}]]
+    last = acc.flush()[0]
+    assert (last["index"], last["start"], last["end"]) == (2, 2.0, 3.0)
+    assert acc.totals == {"car": 3, "person": 2}
+
+
+def test_long_gap_skips_empty_segments_at_once():
+    acc = SegmentAccumulator(segment_seconds=0.5)
+    acc.add(0.1, {"car": 1})
+    done = acc.add(1e9, {"car": 2})  # e.g. a bogus timestamp: no per-segment loop
+    assert [s["index"] for s in done] == [0]
+    assert acc.flush()[0]["index"] == int(1e9 // 0.5)
+
+
+def test_segment_seconds_has_a_floor(fake_model, video_path):
+    with open(video_path, "rb") as f:
+        r = client.post("/predict/video", params={"segment_seconds": 0.001},
+                        files={"file": ("clip.mp4", f, "video/mp4")})
+    assert r.status_code == 422
+
+
+def test_video_endpoint_streams_segments(fake_model, video_path, monkeypatch):
+    monkeypatch.setattr(main, "VIDEO_DECODER", "opencv")
+    with open(video_path, "rb") as f:
+        r = client.post("/predict/video", params={"sample_fps": 4, "segment_seconds": 1},
+                        files={"file": ("clip.mp4", f, "video/mp4")})
+    assert r.status_code == 200
+    lines = [json.loads(line) for line in r.text.splitlines()]
+    assert lines[0]["type"] == "info" and lines[0]["frame_count"] == 30
+    segments = [line for line in lines if line["type"] == "segment"]
+    assert [s["index"] for s in segments] == [0, 1, 2]
+    assert [s["frames"] for s in segments] == [4, 4, 4]
+    assert segments[0]["object_details"] == {"person": 1, "car": 2}
+    summary = lines[-1]
+    assert summary["type"] == "summary" and summary["frames_analyzed"] == 12
+
+
+def test_keyframes_need_ffmpeg(fake_model, video_path, monkeypatch):
+    monkeypatch.setattr(main, "VIDEO_DECODER", "opencv")
+    with open(video_path, "rb") as f:
+        r = client.post("/predict/video", params={"keyframes": "true"},
+                        files={"file": ("clip.mp4", f, "video/mp4")})
+    assert r.status_code == 400
+
+
+def test_not_a_video(fake_model):
+    r = client.post("/predict/video", files={"file": ("clip.mp4", b"not a video", "video/mp4")})
+    assert r.status_code == 400